@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+import argparse
+import time
+
+import numpy as np
+
+from audioout import BlockPlayer, NullSink
+from chirp3 import lchirp
+from chirpgen import chirp
+from sweepcore import sweeps, sweep_wave, snap_delay, SAMPLERATE, AMPLITUDE, DELAY_STEPS
+
+# ----- Sub-sample start alignment between generator units
+# Units sharing a clock (PTP, GPS) line their bursts up by starting each
+# sweep at the output frame due at an agreed time. The frame index comes out
+# fractional: the whole frames are silence before the sweep (BlockPlayer
+# play_at) and the fraction is a start delay rendered into the sweep itself,
+# analytically, by evaluating the chirp on a shifted time grid (chirpgen.chirp
+# and chirp3.lchirp delay=). Delays are snapped to 1/DELAY_STEPS sample, so
+# each unit caches at most DELAY_STEPS versions of a sweep.
+#
+# The check measures the delays back by cross-correlation with the undelayed
+# sweep, upsampled in the frequency domain and refined with a parabola.
+#
+#   python3 align.py --selftest
+
+UPSAMPLE = 64  # cross-correlation resolution, 1/UPSAMPLE sample before refining
+
+
+# --Define a function to split a fractional frame index into (start frame, delay)
+# the delay is snapped to 1/DELAY_STEPS sample, rounding up into the next frame
+def split_frame(frame):
+    start = int(np.floor(frame))
+    delay = snap_delay(frame - start)
+    if delay >= 1:
+        start, delay = start + 1, 0.0
+    return start, delay
+
+
+# --Define a function to measure how many samples x lags ref (fractional)
+def measure_delay(ref, x, up=UPSAMPLE):
+    n = 1 << int(np.ceil(np.log2(len(ref) + len(x))))
+    spectrum = np.fft.rfft(x, n) * np.conj(np.fft.rfft(ref, n))
+    cc = np.fft.irfft(spectrum, n * up) * up  # zero padded: the correlation at 1/up sample
+    i = int(np.argmax(cc))
+    a, b, c = cc[i - 1], cc[i], cc[(i + 1) % len(cc)]
+    peak = i + 0.5 * (a - c) / (a - 2 * b + c)
+    lag = peak / up
+    return lag - n if lag > n - len(ref) else lag  # x leading ref wraps round the end
+
+
+# --Define a function to capture what the player hands the sink, in real time
+class _CaptureSink(NullSink):
+    def __init__(self, samplerate=SAMPLERATE, channels=2):
+        super().__init__(samplerate, channels)
+        self.blocks = []
+
+    def consume(self, block):
+        if block is not None:
+            self.blocks.append(block.copy())  # the player re-uses its ring buffers
+
+
+# Every sweep delayed by fractions of a sample must measure back within
+# 0.02 sample, by both chirp generators; then a sweep scheduled with play_at
+# at a fractional frame must come out within half a delay step of it.
+def selftest(samplerate=SAMPLERATE, tolerance=0.02):
+    ok = True
+    for index, (fmin, fmax, T, kind) in sweeps.items():
+        N = int(samplerate * T)
+        ref = chirp(N, tmin=0, tmax=T, fmin=fmin, fmax=fmax, kind=kind, zero_phase_tmin=True, cos=False)
+        errors = []
+        for delay in (0.1, 0.25, 0.5, 0.77, 3.3):
+            x = chirp(N, tmin=0, tmax=T, fmin=fmin, fmax=fmax, kind=kind, zero_phase_tmin=True, cos=False,
+                      delay=delay)
+            errors.append(measure_delay(ref, x) - delay)
+            if kind == "lin":
+                x = lchirp(N, tmin=0, tmax=T, fmin=fmin, fmax=fmax, cos=False, delay=delay)
+                errors.append(measure_delay(ref, x) - delay)
+        worst = np.max(np.abs(errors))
+        good = worst < tolerance
+        ok = ok and good
+        print("sweep %d %s worst delay error %.4f samples %s" % (index, kind, worst, "OK" if good else "FAILED"))
+
+    entry = sweeps[1]
+    _, ref = sweep_wave(entry, samplerate, AMPLITUDE)
+    sink = _CaptureSink(samplerate)
+    player = BlockPlayer.preset(sink, "lowlatency")
+    player.start()
+    while player.clock is None:
+        time.sleep(0.001)
+    frame = player.frame_at(time.monotonic_ns() + 50_000_000) + 0.37  # 50 ms ahead
+    start, delay = split_frame(frame)
+    _, y = sweep_wave(entry, samplerate, AMPLITUDE, delay=delay)
+    player.play_at(y, start)
+    player.drain(1.0)
+    time.sleep(4 * player.latency())
+    player.close()
+    out = np.concatenate(sink.blocks)[:, 0].astype(float)
+    got = measure_delay(ref[:, 0].astype(float), out)
+    error = got - frame
+    good = abs(error) <= 0.5 / DELAY_STEPS + tolerance
+    ok = ok and good
+    print("play_at frame %.4f, found at %.4f, error %.4f samples %s"
+          % (frame, got, error, "OK" if good else "FAILED"))
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sub-sample sweep start alignment")
+    parser.add_argument("--rate", type=float, default=SAMPLERATE)
+    parser.add_argument("--selftest", action="store_true", help="fractional delay and scheduled start check")
+    args = parser.parse_args()
+    if args.selftest:
+        raise SystemExit(0 if selftest(args.rate) else 1)
+    parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/python3
+import argparse
+import collections
+import itertools
+import queue
+import threading
+import time
+import wave
+
+import numpy as np
+
+from sweepcore import sweeps, sweep_wave, SAMPLERATE, AMPLITUDE
+
+# ----- Block streaming audio output
+# An alternative to pygame.mixer: a producer thread cuts the waveform (or any
+# iterable of int16 blocks) into periods and queues them; the sink takes one
+# period at a time, from the sound device callback or from its own paced
+# thread. The period and number of queued periods set the latency:
+#   latency = period * buffers / samplerate
+# A sink that finds the queue empty while the producer is still running plays
+# silence and counts an underrun; a sink that is itself late (a device xrun,
+# or a paced thread waking more than a period late) counts an xrun.
+#
+# The player counts the frames handed to the sink (position) and the sink
+# tells it when each period will be heard, so a start time can be turned into
+# a frame index (frame_at) and play_at can start a waveform exactly on it:
+# whole periods before it are silence and the rest is zero padding in front
+# of the waveform. With marks=True, play() also notes the frame each pass of
+# the waveform starts on as the sink takes it (passes), and time_at gives
+# when that is heard, so every loop pass can be logged.
+#
+#   python3 audioout.py --sweep 1 --seconds 2 --preset lowlatency --wav out.wav
+#   python3 audioout.py --selftest
+
+PRESETS = {
+    "lowlatency": (256, 2),  # (period frames, buffers): 2.7 ms at 192 kHz
+    "throughput": (4096, 4),  # 85 ms, survives long stalls of the producer
+}
+
+
+# --Sink with no hardware: takes one period every period time and drops it
+class NullSink:
+    realtime = True  # False consumes as fast as the producer allows
+
+    def __init__(self, samplerate=SAMPLERATE, channels=2):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.xruns = 0
+        self.thread = None
+        self.running = False
+
+    def start(self, pull, period):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, args=(pull, period), daemon=True)
+        self.thread.start()
+
+    def _run(self, pull, period):
+        interval = period / self.samplerate
+        deadline = time.monotonic()
+        while self.running:
+            if self.realtime:
+                deadline += interval
+                late = time.monotonic() - deadline
+                if late > interval:  # woke a whole period late: a sink xrun
+                    self.xruns += 1
+                    deadline = time.monotonic()
+                elif late < 0:
+                    time.sleep(-late)
+            # a paced period is heard at its deadline
+            block = pull(period, wait=not self.realtime, t_play=int(deadline * 1e9) if self.realtime else None)
+            if block is None and not self.realtime:
+                time.sleep(interval)  # nothing to write yet
+            self.consume(block)
+
+    def consume(self, block):
+        pass
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        self.stop()
+
+
+# --Sink writing what would have been played to a 16 bit WAV file
+class WavSink(NullSink):
+    def __init__(self, path, samplerate=SAMPLERATE, channels=2, realtime=False):
+        super().__init__(samplerate, channels)
+        self.realtime = realtime
+        self.file = wave.open(path, "wb")
+        self.file.setnchannels(channels)
+        self.file.setsampwidth(2)
+        self.file.setframerate(int(samplerate))
+
+    def consume(self, block):
+        if block is not None:
+            self.file.writeframes(block.astype("<i2", copy=False).tobytes())
+
+    def close(self):
+        self.stop()
+        self.file.close()
+
+
+# --Sink on the sound device; the PortAudio callback pulls each period
+# Needs the sounddevice package, which is only imported here
+class DeviceSink:
+    def __init__(self, samplerate=SAMPLERATE, channels=2, device=None):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.device = device
+        self.xruns = 0
+        self.stream = None
+
+    def start(self, pull, period):
+        import sounddevice
+
+        def callback(outdata, frames, time_info, status):
+            if status.output_underflow:
+                self.xruns += 1
+            # when the first frame reaches the DAC, on the monotonic clock
+            t_play = time.monotonic_ns() + int((time_info.outputBufferDacTime - time_info.currentTime) * 1e9)
+            block = pull(frames, t_play=t_play)
+            if block is None:
+                outdata.fill(0)
+            else:
+                outdata[:] = block
+
+        self.stream = sounddevice.OutputStream(
+            samplerate=self.samplerate, blocksize=period, device=self.device,
+            channels=self.channels, dtype="int16", callback=callback, latency="low",
+        )
+        self.stream.start()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+    def close(self):
+        self.stop()
+
+
+# --Define a function to cut a waveform into blocks, once or looped forever
+# marks=True yields None before each pass, for the player to note where it starts
+def wave_blocks(wave_data, loop=False, blocksize=65536, marks=False):
+    while True:
+        if marks:
+            yield None
+        for start in range(0, len(wave_data), blocksize):
+            yield wave_data[start : start + blocksize]
+        if not loop:
+            return
+
+
+class BlockPlayer:
+    def __init__(self, sink, period=1024, buffers=3, channels=2):
+        self.sink = sink
+        self.period = period
+        self.buffers = buffers
+        self.channels = channels
+        self.queue = queue.Queue(maxsize=buffers)
+        # periods in the queue, one being filled and one being played never overlap
+        self.ring = np.zeros((buffers + 2, period, channels), dtype=np.int16)
+        self.silence = np.zeros((period, channels), dtype=np.int16)
+        self.feeding = False  # True while the producer has more to give
+        self.halt = threading.Event()
+        self.producer = None
+        self.blocks = 0  # periods played from the queue
+        self.underruns = 0
+        self.started = False
+        self.position = 0  # frames handed to the sink, silence included
+        self.clock = None  # (position, monotonic ns that frame is heard), from the sink
+        self.gate = None  # position play_at's waveform starts in; silence until then
+        self.passes = collections.deque(maxlen=4096)  # positions marked passes start on
+
+    @classmethod
+    def preset(cls, sink, name, channels=2):
+        period, buffers = PRESETS[name]
+        return cls(sink, period, buffers, channels)
+
+    # --Seconds from a sample being queued to it being played, at most
+    def latency(self):
+        return self.period * self.buffers / self.sink.samplerate
+
+    # --Called by the sink for each period; never blocks unless wait is True
+    # t_play is when the period will be heard (monotonic ns), if the sink knows
+    def pull(self, frames, wait=False, t_play=None):
+        if t_play is not None:
+            self.clock = (self.position, t_play)
+        if self.gate is not None:
+            if self.position < self.gate:  # waiting for a scheduled start
+                self.position += frames
+                return self.silence[:frames]
+            self.gate = None
+        try:
+            block = self.queue.get(block=wait and self.feeding, timeout=0.5 if wait else None)
+        except queue.Empty:
+            block = None
+        if block is None:
+            if self.feeding:
+                self.underruns += 1
+            if wait:
+                return None
+            self.position += frames
+            return self.silence[:frames]
+        block, marks = block
+        for offset in marks:
+            self.passes.append(self.position + offset)
+        self.blocks += 1
+        self.position += frames
+        return block[:frames]
+
+    # --Return the (fractional) frame index heard at monotonic time t_ns
+    def frame_at(self, t_ns):
+        if self.clock is None:
+            raise ValueError("the sink has not said when its frames are heard")
+        position, t = self.clock
+        return position + (t_ns - t) * self.sink.samplerate / 1e9
+
+    # --Return the monotonic ns frame index `frame` is heard at (see frame_at)
+    def time_at(self, frame):
+        if self.clock is None:
+            raise ValueError("the sink has not said when its frames are heard")
+        position, t = self.clock
+        return t + int((frame - position) * 1e9 / self.sink.samplerate)
+
+    # --Play a waveform once with its first frame at frame index start
+    # (see frame_at); it must be more than the queued latency away
+    def play_at(self, wave_data, start):
+        self.stop_feed()
+        self.start()
+        position = self.position
+        earliest = position + self.period * (self.buffers + 2)
+        if start < earliest:
+            raise ValueError("start frame %d is too soon, the earliest is %d" % (start, earliest))
+        # the sink takes whole periods from position on
+        pad = (start - position) % self.period
+        silence = np.zeros((pad, self.channels), dtype=np.int16)
+        self.stream(itertools.chain((silence,), wave_blocks(wave_data)), gate=start - pad)
+
+    # --Play a waveform (frames, channels), looped until stop() if loop is True
+    # marks=True notes where each pass starts in passes
+    def play(self, wave_data, loop=False, marks=False):
+        self.stream(wave_blocks(wave_data, loop, marks=marks))
+
+    # --Play an iterable of int16 blocks of any length (from position gate on, if given)
+    def stream(self, blocks, gate=None):
+        self.stop_feed()
+        self.gate = gate
+        self.halt.clear()
+        self.feeding = True
+        self.producer = threading.Thread(target=self._feed, args=(blocks,), daemon=True)
+        self.producer.start()
+        self.start()
+
+    # --Start the sink (silence until something is played), so its clock runs
+    def start(self):
+        if not self.started:
+            self.sink.start(self.pull, self.period)
+            self.started = True
+
+    # --Producer: re-block into ring periods and queue them
+    def _feed(self, blocks):
+        slot, fill = 0, 0
+        buf = self.ring[slot]
+        marks = []  # offsets in buf where a marked pass starts
+        for block in blocks:
+            if block is None:
+                marks.append(fill)
+                continue
+            pos = 0
+            while pos < len(block):
+                n = min(self.period - fill, len(block) - pos)
+                buf[fill : fill + n] = block[pos : pos + n]
+                fill += n
+                pos += n
+                if fill == self.period:
+                    if not self._put((buf, marks)):
+                        return
+                    slot = (slot + 1) % len(self.ring)
+                    buf, fill, marks = self.ring[slot], 0, []
+        if fill:  # pad the last period with silence
+            buf[fill:] = 0
+            self._put((buf, marks))
+        self.feeding = False
+
+    def _put(self, item):
+        while not self.halt.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    # --Stop the producer and drop what it had queued; the sink keeps running
+    def stop_feed(self):
+        self.halt.set()
+        if self.producer is not None:
+            self.producer.join()
+            self.producer = None
+        self.feeding = False
+        self.gate = None
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+    # --Wait until everything queued has been played
+    def drain(self, timeout=None):
+        end = None if timeout is None else time.monotonic() + timeout
+        while self.feeding or not self.queue.empty():
+            if end is not None and time.monotonic() > end:
+                return False
+            time.sleep(self.period / self.sink.samplerate)
+        return True
+
+    def stop(self):
+        self.stop_feed()
+
+    def close(self):
+        self.stop_feed()
+        self.sink.close()
+        self.started = False
+
+    def stats(self):
+        return {
+            "period": self.period,
+            "buffers": self.buffers,
+            "latency_ms": self.latency() * 1e3,
+            "blocks": self.blocks,
+            "underruns": self.underruns,
+            "xruns": self.sink.xruns,
+            "queued": self.queue.qsize(),
+        }
+
+
+# --Define a function to check the player on the null sink
+# A producer faster than real time must give no underruns; one that stalls
+# for longer than the queued latency must be counted.
+def selftest(samplerate=SAMPLERATE, seconds=0.5):
+    _, out = sweep_wave(sweeps[1], samplerate, AMPLITUDE)
+    ok = True
+    for name in PRESETS:
+        player = BlockPlayer.preset(NullSink(samplerate), name)
+        player.play(out, loop=True)
+        time.sleep(seconds)
+        clean = player.stats()
+        player.stop_feed()
+
+        def stalling():
+            for i, block in enumerate(wave_blocks(out, loop=True, blocksize=player.period)):
+                if i == 8:
+                    time.sleep(4 * player.latency() + 0.05)
+                yield block
+
+        player.stream(stalling())
+        time.sleep(seconds)
+        stalled = player.stats()
+        player.close()
+        good = clean["underruns"] == 0 and stalled["underruns"] > clean["underruns"]
+        print(name, "clean", clean)
+        print(name, "stall", stalled, "OK" if good else "FAILED")
+        ok = ok and good
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a sweep through the block player")
+    parser.add_argument("--sweep", type=int, default=0, help="sweeps table entry")
+    parser.add_argument("--rate", type=float, default=SAMPLERATE)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="lowlatency")
+    parser.add_argument("--period", type=int, help="frames per period (overrides the preset)")
+    parser.add_argument("--buffers", type=int, help="periods queued (overrides the preset)")
+    parser.add_argument("--wav", help="write to a WAV file instead of the device")
+    parser.add_argument("--null", action="store_true", help="play to the null sink")
+    parser.add_argument("--selftest", action="store_true", help="underrun accounting check")
+    args = parser.parse_args()
+    if args.selftest:
+        raise SystemExit(0 if selftest(args.rate) else 1)
+    if args.wav:
+        sink = WavSink(args.wav, args.rate)
+    elif args.null:
+        sink = NullSink(args.rate)
+    else:
+        sink = DeviceSink(args.rate)
+    period, buffers = PRESETS[args.preset]
+    player = BlockPlayer(sink, args.period or period, args.buffers or buffers)
+    _, out = sweep_wave(sweeps[args.sweep], args.rate, AMPLITUDE)
+    frames = int(args.seconds * args.rate)
+    looped = np.resize(out, (frames, 2))  # repeats the sweep up to the length asked for
+    player.play(looped)
+    player.drain()
+    player.close()  # the sink finishes the period it has taken
+    print(player.stats())
+
+
+if __name__ == "__main__":
+    main()
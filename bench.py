@@ -0,0 +1,227 @@
+#!/usr/bin/python3
+# ----- Headless benchmark of the generation, quantization and rendering paths
+# Runs on any Linux box: SDL uses its dummy video/audio drivers and RPi.GPIO is
+# replaced by a stub when it is not installed. Every entry of the sweeps table
+# is timed at each sample rate; wall time (min/median over the repeats) and peak
+# traced memory are written to a JSON file so runs can be compared.
+#
+#   python3 bench.py -o bench_results.json
+#   python3 bench.py -o new.json --compare bench_results.json
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import types
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+
+# --Define a function to install a do-nothing RPi.GPIO when the real one is missing
+def stub_gpio():
+    try:
+        import RPi.GPIO  # noqa: F401
+        return False
+    except ImportError:
+        pass
+    gpio = types.ModuleType("RPi.GPIO")
+    gpio.BCM = 11
+    gpio.IN = 1
+    gpio.PUD_UP = 22
+    gpio.FALLING = 32
+    for name in ("setmode", "setup", "add_event_detect", "remove_event_detect", "cleanup"):
+        setattr(gpio, name, lambda *args, **kwargs: None)
+    rpi = types.ModuleType("RPi")
+    rpi.GPIO = gpio
+    sys.modules["RPi"] = rpi
+    sys.modules["RPi.GPIO"] = gpio
+    return True
+
+
+stubbed = stub_gpio()
+
+import numpy as np  # noqa: E402
+import pygame  # noqa: E402
+
+import sweep_gen as sg  # noqa: E402
+from chirp3 import lchirp  # noqa: E402
+from chirpgen import chirp  # noqa: E402
+from multichan import array_chirp  # noqa: E402
+from dds import dds_chirp, snr_db, reference  # noqa: E402
+
+
+# --Define a function to time fn() over repeats, then trace its peak memory once
+# setup() runs before every call and is not timed
+def measure(fn, repeats, setup=None):
+    times = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "wall_min": min(times),
+        "wall_median": statistics.median(times),
+        "repeats": repeats,
+        "peak_bytes": peak,
+    }
+
+
+def bench_sweep(index, rate, repeats):
+    fmin, fmax, T, kind = sg.sweeps[index]
+    N = int(rate * T)
+    sg.sweep = index
+    sg.samplerate = rate
+    stages = {}
+
+    stages["lchirp"] = measure(
+        lambda: lchirp(N, tmin=0, tmax=T, fmin=fmin, fmax=fmax, zero_phase_tmin=True, cos=False),
+        repeats,
+    )
+    stages["chirpgen"] = measure(
+        lambda: chirp(N, tmin=0, tmax=T, fmin=fmin, fmax=fmax, kind=kind, zero_phase_tmin=True, cos=False),
+        repeats,
+    )
+    # int16 samples: the old lchirp, scale and cast against the DDS engine
+    amplitude = sg.g_amplitude
+    stages["lchirp_int16"] = measure(
+        lambda: (lchirp(N, tmin=0, tmax=T, fmin=fmin, fmax=fmax, zero_phase_tmin=True, cos=False)
+                 * amplitude).astype(np.int16),
+        repeats,
+    )
+    ref = reference(sg.sweeps[index], rate, amplitude)
+    for name, interpolate in (("dds", False), ("dds_interp", True)):
+        def run():
+            return dds_chirp(N, 0, T, fmin, fmax, kind, amplitude, cos=False, interpolate=interpolate)
+
+        stages[name] = measure(run, repeats)
+        stages[name]["snr_db"] = snr_db(run(), ref)
+    # array output against one delayed chirp per channel, scaled and cast the same way
+    for channels in (4, 16):
+        delays = np.arange(channels) * 0.37
+        stages["array_chirp_%d" % channels] = measure(
+            lambda: array_chirp(N, tmin=0, tmax=T, fmin=fmin, fmax=fmax, kind=kind, delays=delays,
+                                amplitude=amplitude),
+            repeats,
+        )
+        stages["chirp_x%d" % channels] = measure(
+            lambda: [np.rint(chirp(N, tmin=0, tmax=T, fmin=fmin, fmax=fmax, kind=kind, zero_phase_tmin=True,
+                                   cos=False, delay=d) * amplitude).astype(np.int16)
+                     for d in delays],
+            repeats,
+        )
+    # a cache miss is the full synthesis, quantization and Sound creation
+    stages["sweep_gen"] = measure(sg.sweep_gen, repeats, setup=sg.wave_cache.clear)
+    stages["sweep_gen_cached"] = measure(sg.sweep_gen, repeats)
+
+    def new_graph():
+        if sg.graph is not None:
+            sg.graph.key = None
+
+    stages["make_graph"] = measure(sg.make_graph, repeats, setup=new_graph)
+
+    def new_screen():
+        sg.graph_shown = None
+
+    stages["show_graph"] = measure(sg.show_graph, repeats, setup=new_screen)
+
+    def new_spectro():
+        sg.graph_shown = None
+        sg.wave_cache.clear()
+
+    stages["show_spectro"] = measure(sg.show_spectro, repeats, setup=new_spectro)
+    stages["show_spectro_cached"] = measure(sg.show_spectro, repeats, setup=new_screen)
+
+    def full_menu():
+        sg.Lcd_lines = []
+
+    stages["show_text_menu"] = measure(sg.show_menu, repeats, setup=full_menu)
+
+    def tick():
+        sg.Secx = (sg.Secx + 1) % 60
+
+    stages["show_text_menu_tick"] = measure(sg.show_menu, repeats, setup=tick)
+
+    results = []
+    for stage, r in stages.items():
+        r.update(
+            stage=stage, sweep=index, samplerate=rate, fmin=fmin, fmax=fmax,
+            duration=T, kind=kind, samples=N,
+        )
+        results.append(r)
+    return results
+
+
+# --Define a function to print the median time ratio new/old for matching stages
+def compare(new, old):
+    def key(r):
+        return (r["stage"], r["sweep"], r["samplerate"])
+
+    before = {key(r): r for r in old["results"]}
+    print("%-22s %5s %8s %10s %10s %7s" % ("stage", "sweep", "rate", "old ms", "new ms", "ratio"))
+    for r in new["results"]:
+        o = before.get(key(r))
+        if o is None:
+            continue
+        print(
+            "%-22s %5d %8d %10.3f %10.3f %7.2f"
+            % (r["stage"], r["sweep"], r["samplerate"], o["wall_median"] * 1e3,
+               r["wall_median"] * 1e3, r["wall_median"] / o["wall_median"])
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sweep_gen stages headless")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="JSON result file")
+    parser.add_argument("-r", "--repeats", type=int, default=5, help="timed runs per stage")
+    parser.add_argument("--rates", type=float, nargs="+", default=[192000.0, 384000.0])
+    parser.add_argument("--compare", help="earlier JSON result file to compare against")
+    args = parser.parse_args()
+
+    pygame.init()
+    sg.Lcd = pygame.display.set_mode(sg.LCD_SIZE)
+    sg.Debugprt = False
+
+    results = []
+    for rate in args.rates:
+        # the mixer must run at the rate the Sounds are made for
+        pygame.mixer.quit()
+        pygame.mixer.init(frequency=int(rate), size=-16, channels=2, buffer=sg.blocksize)
+        for index in sg.sweeps:
+            results.extend(bench_sweep(index, rate, args.repeats))
+            print("sweep %d at %d done" % (index, rate))
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pygame": pygame.version.ver,
+            "machine": platform.machine(),
+            "gpio_stub": stubbed,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    print("wrote", args.output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
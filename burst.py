@@ -0,0 +1,66 @@
+import time
+from collections import deque
+
+import numpy as np
+
+# ----- Sample-accurate burst repetition for Brush mode
+# One repetition period (the burst followed by silence) is rendered into a
+# buffer, repeated enough times to span at least min_seconds. The player loops
+# that buffer, so the burst spacing is set by the sample clock and not by
+# whenever the event loop gets round to calling sound.play().
+
+
+# --Define a function to render bursts at a repetition rate (bursts per second)
+# wave is the (N, channels) int16 burst. Returns (buffer, periods, period)
+# where period is the repetition interval in samples (rounded to whole samples).
+def burst_buffer(wave, samplerate, rate, min_seconds=0.5):
+    period = int(round(samplerate / rate))
+    if period < len(wave):
+        raise ValueError(
+            "burst of %d samples does not fit a %.4f s period" % (len(wave), period / samplerate)
+        )
+    periods = max(1, int(np.ceil(min_seconds * samplerate / period)))
+    buf = np.zeros((periods * period,) + wave.shape[1:], dtype=wave.dtype)
+    buf.reshape((periods, period) + wave.shape[1:])[:, : len(wave)] = wave
+    return buf, periods, period
+
+
+# --Measure the spacing of repeated events against their nominal interval
+# mark() is called once per looped buffer; intervals are divided by the number
+# of periods in the buffer to give the measured burst repetition interval.
+# Marks are taken as the event loop sees them, so the figures are an upper
+# bound on the jitter of the audio itself.
+class JitterMeter:
+    def __init__(self, nominal, periods=1, size=256):
+        self.nominal = nominal  # nominal burst interval in s
+        self.periods = periods  # bursts between two marks
+        self.intervals = deque(maxlen=size)
+        self.last = None
+
+    def reset(self, nominal=None, periods=None):
+        if nominal is not None:
+            self.nominal = nominal
+        if periods is not None:
+            self.periods = periods
+        self.intervals.clear()
+        self.last = None
+
+    def mark(self, t=None):
+        t = time.monotonic() if t is None else t
+        if self.last is not None:
+            self.intervals.append((t - self.last) / self.periods)
+        self.last = t
+
+    # --Return count, mean interval, rms and peak deviation from nominal (s)
+    def stats(self):
+        if not self.intervals:
+            return {"count": 0, "nominal": self.nominal}
+        iv = np.array(self.intervals)
+        dev = iv - self.nominal
+        return {
+            "count": len(iv),
+            "nominal": self.nominal,
+            "mean": float(iv.mean()),
+            "rms": float(np.sqrt(np.mean(dev ** 2))),
+            "peak": float(np.max(np.abs(dev))),
+        }
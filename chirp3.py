@@ -1,41 +1,140 @@
-import numpy as np
-import matplotlib.pyplot as plt
-
-def _lchirp(N, tmin=0, tmax=1, fmin=0, fmax=None):
-    fmax = fmax if fmax is not None else N / 2
-    t = np.linspace(tmin, tmax, N, endpoint=True)
-
-    a = (fmin - fmax) / (tmin - tmax)
-    b = (fmin*tmax - fmax*tmin) / (tmax - tmin)
-
-    phi = (a/2)*(t**2 - tmin**2) + b*(t - tmin)
-    phi *= (2*np.pi)
-    return phi
-
-def lchirp(N, tmin=0, tmax=1, fmin=0, fmax=None, zero_phase_tmin=True, cos=True):
-    phi = _lchirp(N, tmin, tmax, fmin, fmax)
-    if zero_phase_tmin:
-        phi *= ( (phi[-1] - phi[-1] % (2*np.pi)) / phi[-1] )
-    else:
-        phi -= (phi[-1] % (2*np.pi))
-    fn = np.cos if cos else np.sin
-    return fn(phi)
-
-f0 = 7000
-f1 = 17000
-samplerate = 192000
-T = .004
-
-N = int(samplerate * T)
-tmin = 0
-tmax = T
-
-t = np.linspace(tmin, tmax, N, endpoint=True)
-for zero_phase_min in (True, False):
-    for cos in (True, False):
-        x = lchirp(N=int(samplerate * T), tmin=tmin, tmax=tmax, fmin=f0, fmax=f1,
-                   zero_phase_tmin=zero_phase_min, cos=cos)
-        plt.plot(t, x)
-        plt.title("cos={}, zero_phase_tmin={}".format(cos, zero_phase_min),
-                  weight='bold', fontsize=17, loc='left')
-        plt.show()
\ No newline at end of file
+import numpy as np
+
+def _phase(t, tmin, tmax, fmin, fmax):
+    a = (fmin - fmax) / (tmin - tmax)
+    b = (fmin*tmax - fmax*tmin) / (tmax - tmin)
+
+    phi = (a/2)*(t**2 - tmin**2) + b*(t - tmin)
+    phi *= (2*np.pi)
+    return phi
+
+def _lchirp(N, tmin=0, tmax=1, fmin=0, fmax=None):
+    fmax = fmax if fmax is not None else N / 2
+    t = np.linspace(tmin, tmax, N, endpoint=True)
+    return _phase(t, tmin, tmax, fmin, fmax)
+
+# delay (in samples, may be fractional) starts the sweep that much later: sample
+# n is evaluated analytically at n - delay samples into the sweep, with the end
+# phase correction of the undelayed sweep. The N + ceil(delay) samples returned
+# hold the whole sweep and are silent outside it.
+def lchirp(N, tmin=0, tmax=1, fmin=0, fmax=None, zero_phase_tmin=True, cos=True, delay=0.0):
+    phi = _lchirp(N, tmin, tmax, fmin, fmax)
+    end = phi[-1]
+    silent = None
+    if delay:
+        if delay < 0 or N < 2:
+            raise ValueError("delay must be positive, on a sweep of 2 samples or more")
+        step = (tmax - tmin) / (N - 1)
+        t = (np.arange(N + int(np.ceil(delay))) - delay) * step
+        eps = step * 1e-6  # rounding allowance at the ends of the sweep
+        silent = (t < -eps) | (t > tmax - tmin + eps)
+        np.clip(t, 0, tmax - tmin, out=t)
+        t += tmin
+        phi = _phase(t, tmin, tmax, fmin, fmax if fmax is not None else N / 2)
+    if zero_phase_tmin:
+        phi *= ( (end - end % (2*np.pi)) / end )
+    else:
+        phi -= (end % (2*np.pi))
+    fn = np.cos if cos else np.sin
+    out = fn(phi)
+    if silent is not None:
+        out[silent] = 0
+    return out
+
+# Streaming version of lchirp: yields the same samples in blocks of blocksize,
+# so only one block of time/phase values is held in memory at any moment.
+# The time of sample n is computed as np.linspace does (n*step + tmin, last
+# sample pinned to tmax), and the end phase used for the zero phase
+# correction is evaluated up front from the closed form at tmax.
+def lchirp_blocks(N, tmin=0, tmax=1, fmin=0, fmax=None, zero_phase_tmin=True, cos=True,
+                  blocksize=4096):
+    fmax = fmax if fmax is not None else N / 2
+    a = (fmin - fmax) / (tmin - tmax)
+    b = (fmin*tmax - fmax*tmin) / (tmax - tmin)
+    step = (tmax - tmin) / (N - 1) if N > 1 else 0.0
+
+    # phase at the last sample, exactly as _lchirp would compute it
+    t_end = np.array([tmax if N > 1 else tmin], dtype=float)
+    phi_end = ((a/2)*(t_end**2 - tmin**2) + b*(t_end - tmin)) * (2*np.pi)
+    phi_end = phi_end[0]
+    if zero_phase_tmin:
+        scale = (phi_end - phi_end % (2*np.pi)) / phi_end
+    else:
+        offset = phi_end % (2*np.pi)
+    fn = np.cos if cos else np.sin
+
+    for start in range(0, N, blocksize):
+        stop = min(start + blocksize, N)
+        t = np.arange(start, stop, dtype=float)
+        t *= step
+        t += tmin
+        if stop == N and N > 1:
+            t[-1] = tmax
+        phi = (a/2)*(t**2 - tmin**2) + b*(t - tmin)
+        phi *= (2*np.pi)
+        if zero_phase_tmin:
+            phi *= scale
+        else:
+            phi -= offset
+        yield fn(phi, out=phi)
+
+# Batched version of lchirp: one call for many sweeps. N, tmin, tmax, fmin and
+# fmax may be scalars or arrays (broadcast against each other), one row per
+# sweep. Rows are computed as lchirp computes them, on a common padded time
+# grid; the end phase correction is a per-row column broadcast over the rows.
+# Returns a zero padded (rows, max N) array and the row lengths, or with
+# ragged=True a list of per-row views into that array.
+def lchirp_batch(N, tmin=0, tmax=1, fmin=0, fmax=None, zero_phase_tmin=True, cos=True,
+                 ragged=False):
+    fmax = fmax if fmax is not None else np.asarray(N) / 2
+    N, tmin, tmax, fmin, fmax = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(v, dtype=float)) for v in (N, tmin, tmax, fmin, fmax)))
+    lengths = N.astype(int)
+    tmin, tmax, fmin, fmax = (v[:, None] for v in (tmin, tmax, fmin, fmax))
+    a = (fmin - fmax) / (tmin - tmax)
+    b = (fmin*tmax - fmax*tmin) / (tmax - tmin)
+    step = np.where(lengths > 1, (tmax[:, 0] - tmin[:, 0]) / np.maximum(lengths - 1, 1), 0.0)
+
+    # time grid as np.linspace makes it, last sample of each row pinned to tmax
+    t = np.arange(lengths.max(), dtype=float) * step[:, None]
+    t += tmin
+    rows = np.arange(len(lengths))
+    last = np.maximum(lengths - 1, 0)
+    t[rows, last] = np.where(lengths > 1, tmax[:, 0], tmin[:, 0])
+    phi = (a/2)*(t**2 - tmin**2) + b*(t - tmin)
+    phi *= (2*np.pi)
+
+    phi_end = phi[rows, last][:, None]
+    if zero_phase_tmin:
+        phi *= ( (phi_end - phi_end % (2*np.pi)) / phi_end )
+    else:
+        phi -= (phi_end % (2*np.pi))
+    fn = np.cos if cos else np.sin
+    out = fn(phi, out=phi)
+    out[np.arange(out.shape[1]) >= lengths[:, None]] = 0  # padding
+    if ragged:
+        return [out[r, :n] for r, n in enumerate(lengths)]
+    return out, lengths
+
+# Demo: plot the four phase/function combinations (only when run directly)
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
+    f0 = 7000
+    f1 = 17000
+    samplerate = 192000
+    T = .004
+
+    N = int(samplerate * T)
+    tmin = 0
+    tmax = T
+
+    t = np.linspace(tmin, tmax, N, endpoint=True)
+    for zero_phase_min in (True, False):
+        for cos in (True, False):
+            x = lchirp(N=int(samplerate * T), tmin=tmin, tmax=tmax, fmin=f0, fmax=f1,
+                       zero_phase_tmin=zero_phase_min, cos=cos)
+            plt.plot(t, x)
+            plt.title("cos={}, zero_phase_tmin={}".format(cos, zero_phase_min),
+                      weight='bold', fontsize=17, loc='left')
+            plt.show()
@@ -0,0 +1,208 @@
+import numpy as np
+
+# ----- Vectorized chirp engine: linear, logarithmic and hyperbolic sweeps
+# Same time grid and end-phase handling as lchirp in chirp3.py:
+# sample n is at tmin + n*(tmax - tmin)/(N - 1), the phase is zero at tmin and,
+# with zero_phase_tmin, the whole phase is scaled so it ends on a multiple of 2*pi.
+#
+# The output is a single float32 buffer. The phase is evaluated in small
+# float64 chunks, reduced to one cycle and only then handed to a float32
+# sin/cos written straight into the output, so long sweeps keep their
+# phase accuracy and the peak allocation stays at about one output buffer.
+
+SWEEP_TYPES = ("lin", "log", "hyp")
+CHUNK = 4096  # samples per chunk of phase evaluation
+
+
+# --Define a function to give the phase in cycles at relative time tau (in place)
+# tau is a float64 array of times since tmin, T the sweep duration; T, fmin
+# and fmax may also be arrays broadcasting against tau (see chirp_batch)
+def phase_cycles(kind, tau, T, fmin, fmax):
+    if kind == "lin" or np.all(fmin == fmax):
+        # c = fmin*tau + (fmax - fmin)/(2T)*tau^2
+        k = (fmax - fmin) / (2 * T)
+        tmp = tau * k
+        tmp += fmin
+        tau *= tmp
+    elif kind == "log":
+        # exponential sweep: f = fmin*(fmax/fmin)**(tau/T)
+        lr = np.log(fmax / fmin)
+        tau *= lr / T
+        np.expm1(tau, out=tau)
+        tau *= fmin * T / lr
+    elif kind == "hyp":
+        # hyperbolic sweep: 1/f moves linearly from 1/fmin to 1/fmax
+        d = fmin - fmax
+        tau *= d / (fmax * T)
+        np.log1p(tau, out=tau)
+        tau *= fmin * fmax * T / d
+    else:
+        raise ValueError("unknown sweep type: " + str(kind))
+    return tau
+
+
+# --Define a function to give the phase in cycles at the end of the sweep
+def end_cycles(kind, T, fmin, fmax):
+    if kind == "lin" or np.all(fmin == fmax):
+        return T * (fmin + fmax) / 2
+    if kind == "log":
+        return T * (fmax - fmin) / np.log(fmax / fmin)
+    if kind == "hyp":
+        return fmin * fmax * T / (fmin - fmax) * np.log(fmin / fmax)
+    raise ValueError("unknown sweep type: " + str(kind))
+
+
+# --Define a function to give the instantaneous frequency at relative time tau
+def inst_freq(kind, tau, T, fmin, fmax):
+    tau = np.asarray(tau, dtype=float)
+    if kind == "lin" or np.all(fmin == fmax):
+        return fmin + (fmax - fmin) * tau / T
+    if kind == "log":
+        return fmin * (fmax / fmin) ** (tau / T)
+    if kind == "hyp":
+        return fmin * fmax * T / (fmax * T + (fmin - fmax) * tau)
+    raise ValueError("unknown sweep type: " + str(kind))
+
+
+# delay (in samples, may be fractional) starts the sweep that much later, as in
+# chirp3.lchirp: the phase is evaluated at the delayed time, no resampling, and
+# N + ceil(delay) samples are returned, silent outside the sweep.
+def chirp(N, tmin=0, tmax=1, fmin=0, fmax=None, kind="lin", zero_phase_tmin=True,
+          cos=True, out=None, delay=0.0):
+    fmax = fmax if fmax is not None else N / 2
+    if kind not in SWEEP_TYPES:
+        raise ValueError("unknown sweep type: " + str(kind))
+    if kind != "lin" and (fmin <= 0 or fmax <= 0):
+        raise ValueError(kind + " sweep needs fmin and fmax above 0 Hz")
+    if delay and (delay < 0 or N < 2):
+        raise ValueError("delay must be positive, on a sweep of 2 samples or more")
+    frames = N + int(np.ceil(delay))
+    if out is None:
+        out = np.empty(frames, dtype=np.float32)
+    T = tmax - tmin
+    step = T / (N - 1) if N > 1 else 0.0
+    shift = delay * step  # s
+    eps = step * 1e-6  # rounding allowance at the ends of the sweep
+
+    c_end = end_cycles(kind, T, fmin, fmax)
+    if zero_phase_tmin:
+        scale = np.floor(c_end) / c_end if c_end else 1.0
+        offset = 0.0
+    else:
+        scale = 1.0
+        offset = c_end - np.floor(c_end)
+    fn = np.cos if cos else np.sin
+
+    tau = np.empty(min(frames, CHUNK))
+    ph = np.empty(min(frames, CHUNK), dtype=np.float32)
+    for start in range(0, frames, CHUNK):
+        stop = min(start + CHUNK, frames)
+        n = stop - start
+        t = tau[:n]
+        t[:] = np.arange(start, stop)
+        t *= step
+        silent = None
+        if delay:
+            t -= shift
+            if t[0] < -eps or t[-1] > T + eps:  # a chunk at either end of the sweep
+                silent = (t < -eps) | (t > T + eps)
+                np.clip(t, 0, T, out=t)
+        elif stop == N and N > 1:
+            t[-1] = T
+        phase_cycles(kind, t, T, fmin, fmax)
+        if scale != 1.0:
+            t *= scale
+        if offset:
+            t -= offset
+        # keep only the fraction of a cycle, then go to float32 radians
+        t -= np.floor(t)
+        t *= 2 * np.pi
+        p = ph[:n]
+        p[:] = t
+        fn(p, out=out[start:stop])
+        if silent is not None:
+            out[start:stop][silent] = 0
+    return out
+
+
+# Batched version of chirp for one sweep type: N, tmin, tmax, fmin and fmax may
+# be scalars or arrays (broadcast against each other), one row per sweep. Each
+# row is computed exactly as chirp computes it, so rows are bit-identical to
+# separate calls; the zero phase scale (or end offset) is a per-row column
+# broadcast over each block of columns, sized to stay in cache. Returns a zero padded float32
+# (rows, max N) array and the row lengths, or with ragged=True a list of
+# per-row views into that array.
+def chirp_batch(N, tmin=0, tmax=1, fmin=0, fmax=None, kind="lin", zero_phase_tmin=True,
+                cos=True, ragged=False):
+    fmax = fmax if fmax is not None else np.asarray(N) / 2
+    if kind not in SWEEP_TYPES:
+        raise ValueError("unknown sweep type: " + str(kind))
+    N, tmin, tmax, fmin, fmax = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(v, dtype=float)) for v in (N, tmin, tmax, fmin, fmax)))
+    if kind != "lin" and (np.any(fmin <= 0) or np.any(fmax <= 0)):
+        raise ValueError(kind + " sweep needs fmin and fmax above 0 Hz")
+    lengths = N.astype(int)
+    rows = len(lengths)
+    out = np.zeros((rows, lengths.max(initial=0)), dtype=np.float32)
+    T = tmax - tmin
+    step = np.where(lengths > 1, T / np.maximum(lengths - 1, 1), 0.0)
+
+    # rows with fmin == fmax are tones, computed as linear sweeps
+    flat = fmin == fmax
+    if flat.all() or not flat.any():  # usually: one group, worked on in place
+        groups = [(slice(None), "lin" if flat.all() else kind)]
+    else:
+        groups = [(flat, "lin"), (~flat, kind)]
+    c_end = np.zeros(rows)
+    for g, k in groups:
+        c_end[g] = end_cycles(k, T[g], fmin[g], fmax[g])
+    if zero_phase_tmin:
+        scale = np.ones(rows)
+        nz = c_end != 0
+        scale[nz] = np.floor(c_end[nz]) / c_end[nz]
+        offset = np.zeros(rows)
+    else:
+        scale = np.ones(rows)
+        offset = c_end - np.floor(c_end)
+    fn = np.cos if cos else np.sin
+    last = lengths - 1
+
+    cols = max(256, CHUNK // max(rows, 1))  # a block of phase is about CHUNK values
+    T_col, step_col = T[:, None], step[:, None]
+    scale_col = scale[:, None] if np.any(scale != 1.0) else None
+    offset_col = offset[:, None] if np.any(offset) else None
+    shortest = lengths.min() if rows else 0
+    buf = np.empty((rows, min(cols, out.shape[1])))
+    fl = np.empty(buf.shape)
+    ph = np.empty(buf.shape, dtype=np.float32)
+    for start in range(0, out.shape[1], cols):
+        stop = min(start + cols, out.shape[1])
+        t, p = buf[:, : stop - start], ph[:, : stop - start]
+        np.multiply(np.arange(start, stop, dtype=float), step_col, out=t)
+        if stop >= shortest:  # some row ends in or before this block
+            # pin each row's last sample to T, as chirp does, and keep the
+            # padding past a row's end in range
+            ends = np.flatnonzero((last >= start) & (last < stop) & (lengths > 1))
+            t[ends, last[ends] - start] = T[ends]
+            np.minimum(t, T_col, out=t)
+        for g, k in groups:
+            if isinstance(g, slice):
+                phase_cycles(k, t, T_col, fmin[:, None], fmax[:, None])
+            else:
+                t[g] = phase_cycles(k, t[g], T[g, None], fmin[g, None], fmax[g, None])
+        if scale_col is not None:
+            t *= scale_col
+        if offset_col is not None:
+            t -= offset_col
+        # keep only the fraction of a cycle, then go to float32 radians
+        whole = fl[:, : stop - start]
+        np.floor(t, out=whole)
+        t -= whole
+        t *= 2 * np.pi
+        p[:] = t
+        fn(p, out=out[:, start:stop])
+    if shortest < out.shape[1]:
+        out[np.arange(out.shape[1]) >= lengths[:, None]] = 0  # padding
+    if ragged:
+        return [out[r, :n] for r, n in enumerate(lengths)]
+    return out, lengths
@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+# ----- Local control socket for scripted sweep triggering
+# A server thread takes text commands, one per line, on a UNIX domain socket
+# (or TCP on localhost) and hands them to the event loop through post(),
+# normally fastevent.post of a pygame event, the same way the GPIO buttons do.
+# Everything a client has sent that has arrived is posted as one batch, so a
+# script pipelining many commands costs one event, not one each; the event
+# loop answers the whole batch at once with one JSON line per command, in
+# order. Commands:
+#   select N                      use sweeps entry N
+#   define N fmin fmax T kind     add or replace sweeps entry N
+#   arm                           get the selected sweep ready to play
+#   fire                          play the selected sweep once
+#   offset D                      start sweeps D samples late (>= 0, fractional)
+#   fire_at T                     play the selected sweep once at wall clock T
+#   state                         report the current settings and fire latency
+# The reply to fire includes latency_ms, from the command arriving to the
+# play call. fire_at starts the sweep at the output frame due at T (Unix
+# seconds, read exactly to the nanosecond: a float would only resolve about
+# 240 ns this century), with the sweep rendered to 1/64 sample of it. How
+# closely units line up then rests on how well their clocks agree. It needs
+# the stream output backend.
+#
+#   python3 control.py select 1 arm fire state
+
+SOCKET_PATH = "/tmp/sweep_gen.sock"
+REPLY_TIMEOUT = 5.0  # seconds to wait for the event loop to answer a batch
+
+
+# --Define a function to read Unix seconds with up to 9 decimals as integer ns, exactly
+def wall_ns(text):
+    seconds, _, fraction = text.partition(".")
+    if not seconds.isdigit() or not (fraction.isdigit() or fraction == "") or len(fraction) > 9:
+        raise ValueError("need Unix seconds with at most 9 decimals: " + text)
+    return int(seconds) * 1_000_000_000 + int(fraction.ljust(9, "0"))
+
+
+COMMANDS = {  # name -> argument types
+    "select": (int,),
+    "define": (int, float, float, float, str),
+    "arm": (),
+    "fire": (),
+    "offset": (float,),
+    "fire_at": (wall_ns,),
+    "state": (),
+}
+
+
+# --Define a function to turn a command line into (name, args)
+def parse_command(line):
+    words = line.split()
+    if not words:
+        raise ValueError("empty command")
+    name, args = words[0].lower(), words[1:]
+    types = COMMANDS.get(name)
+    if types is None:
+        raise ValueError("unknown command: " + name)
+    if len(args) != len(types):
+        raise ValueError("%s takes %d arguments" % (name, len(types)))
+    return name, tuple(t(a) for t, a in zip(types, args))
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server.control
+        if self.request.family != socket.AF_UNIX:
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        pending = b""
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                return
+            t = time.monotonic_ns()  # receipt of every command in this chunk
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()  # an incomplete last line waits for the rest
+            batch = []
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    batch.append(parse_command(line.decode("ascii", "replace")))
+                except ValueError as e:
+                    batch.append(("error", (str(e),)))
+            if not batch:
+                continue
+            replies = server.run(batch, t)
+            self.request.sendall(b"".join(json.dumps(r).encode() + b"\n" for r in replies))
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ControlServer:
+    def __init__(self, post, path=SOCKET_PATH, port=None):
+        self.post = post  # post(commands, reply queue, receipt ns), called on client threads
+        self.path = path
+        self.port = port  # TCP on localhost instead of the UNIX socket if set
+        self.server = None
+        self.thread = None
+        self.batches = 0
+        self.commands = 0
+
+    def start(self):
+        if self.port is not None:
+            self.server = _TCPServer(("127.0.0.1", self.port), _Handler)
+        else:
+            if os.path.exists(self.path):
+                os.unlink(self.path)  # left over from a previous run
+            self.server = _UnixServer(self.path, _Handler)
+        self.server.control = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name="control", daemon=True)
+        self.thread.start()
+
+    # --Hand a batch to the event loop and wait for its replies
+    def run(self, batch, t):
+        self.batches += 1
+        self.commands += len(batch)
+        reply = queue.Queue(maxsize=1)
+        self.post(batch, reply, t)
+        try:
+            return reply.get(timeout=REPLY_TIMEOUT)
+        except queue.Empty:
+            return [{"ok": False, "error": "no answer from the event loop"}] * len(batch)
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            if self.port is None and os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+# --Define a function to send commands, pipelined, and return the replies
+def send(commands, path=SOCKET_PATH, port=None):
+    if port is not None:
+        s = socket.create_connection(("127.0.0.1", port))
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    else:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.connect(path)
+    with s, s.makefile("rb") as f:
+        s.sendall(b"".join(c.encode() + b"\n" for c in commands))
+        return [json.loads(f.readline()) for _ in commands]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send commands to a running sweep_gen")
+    parser.add_argument("words", nargs="+", help="commands; a command name starts a new command")
+    parser.add_argument("--path", default=SOCKET_PATH)
+    parser.add_argument("--port", type=int, help="TCP port on localhost instead of the UNIX socket")
+    parser.add_argument("--repeat", type=int, default=1, help="send the commands this many times")
+    args = parser.parse_args()
+    commands = []
+    for word in args.words:
+        if word.lower() in COMMANDS or not commands:
+            commands.append(word)
+        else:
+            commands[-1] += " " + word
+    t = time.perf_counter()
+    replies = send(commands * args.repeat, args.path, args.port)
+    elapsed = time.perf_counter() - t
+    for reply in replies:
+        print(json.dumps(reply))
+    print("%d commands in %.2f ms" % (len(replies), elapsed * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/python3
+import argparse
+import time
+
+import numpy as np
+
+from chirp3 import lchirp
+from chirpgen import SWEEP_TYPES, phase_cycles, end_cycles
+from sweepcore import sweeps, clamp_amplitude, SAMPLERATE, AMPLITUDE
+
+# ----- Fixed-point DDS (direct digital synthesis) chirp engine
+# The phase is a 64 bit accumulator in cycles: the top 32 bits are the phase
+# word, the low 32 bits keep the fraction of the increment so the chirp rate
+# stays exact over long sweeps. A linear sweep starts with increment I0 and
+# adds dI every sample, so the accumulator of sample n has the closed form
+#   acc(n) = n*I0 + n(n-1)/2 * dI   (mod 2^64)
+# which is evaluated for a whole block at once in uint64 arithmetic (wrapping
+# is the modulo). The top TABLE_BITS of the phase word index a sine table
+# scaled to the amplitude; with interpolate the next bits interpolate linearly
+# between table entries. Samples come out as int16 with no float waveform.
+#
+# Same time grid and zero phase handling as lchirp/chirpgen: sample n is at
+# n*T/(N-1) and, with zero_phase_tmin, I0 and dI are scaled so the sweep ends
+# on a whole number of cycles. Log and hyperbolic sweeps have no integer
+# increment recurrence; their phase is evaluated in float64 (chirpgen) and only
+# the table lookup and int16 output are shared.
+#
+# Accuracy against lchirp scaled and rounded to int16 (selftest, 4096 entries):
+#   table lookup                 SNR >= 60 dB
+#   table lookup + interpolation SNR >= 85 dB (int16 rounding dominates)
+#
+#   python3 dds.py --selftest
+
+TABLE_BITS = 12  # 4096 entry sine table
+CHUNK = 4096  # samples per block
+FRAC_BITS = 24  # accumulator bits below the table index used to interpolate
+SNR_MIN = 60.0  # dB, table lookup
+SNR_MIN_INTERP = 85.0  # dB, with linear interpolation
+
+_tables = {}  # (amplitude, bits, interpolate) -> sine table
+_ramp = np.arange(CHUNK, dtype=np.uint64)  # j, sample within a block
+_tri = _ramp * (_ramp - np.uint64(1)) // np.uint64(2)  # j(j-1)/2, 0 at j = 0
+_tri[0] = 0
+
+
+# --Define a function to give the cached sine table for an amplitude
+# Plain tables are rounded to int16 so the lookup is the output; interpolated
+# tables are float32 (value, slope to the next entry) pairs, one gather each.
+def sine_table(amplitude, bits=TABLE_BITS, interpolate=False):
+    key = (amplitude, bits, interpolate)
+    table = _tables.get(key)
+    if table is None:
+        size = 1 << bits
+        table = amplitude * np.sin(2 * np.pi * np.arange(size + 1) / size)
+        if interpolate:
+            table = np.stack((table[:size], np.diff(table)), axis=1).astype(np.float32)
+        else:
+            table = np.rint(table[:size]).astype(np.int16)
+        _tables[key] = table
+    return table
+
+
+# --Define a function to turn a number of cycles into a 64 bit accumulator value
+# (a Python int, so sums and products of them can be reduced exactly)
+def _fixed(cycles):
+    return int(round(cycles * 2.0**64)) % (1 << 64)
+
+
+def dds_chirp(N, tmin=0, tmax=1, fmin=0, fmax=None, kind="lin", amplitude=AMPLITUDE,
+              zero_phase_tmin=True, cos=True, interpolate=True, bits=TABLE_BITS, out=None):
+    fmax = fmax if fmax is not None else N / 2
+    if kind not in SWEEP_TYPES:
+        raise ValueError("unknown sweep type: " + str(kind))
+    if kind != "lin" and (fmin <= 0 or fmax <= 0):
+        raise ValueError(kind + " sweep needs fmin and fmax above 0 Hz")
+    if out is None:
+        out = np.empty(N, dtype=np.int16)
+    amplitude = clamp_amplitude(amplitude)
+    table = sine_table(amplitude, bits, interpolate)
+    T = tmax - tmin
+    step = T / (N - 1) if N > 1 else 0.0
+
+    c_end = end_cycles(kind, T, fmin, fmax)
+    if zero_phase_tmin:
+        scale = np.floor(c_end) / c_end if c_end else 1.0
+        offset = 0.0
+    else:
+        scale = 1.0
+        offset = c_end - np.floor(c_end)
+    start_word = (0.25 if cos else 0.0) - offset  # cos is sin a quarter cycle on
+    acc0 = _fixed(start_word % 1.0)
+    linear = kind == "lin" or fmin == fmax
+    if linear:
+        k = (fmax - fmin) / (2 * T) if T else 0.0
+        I0 = _fixed(scale * (fmin * step + k * step * step))
+        dI = _fixed(scale * 2 * k * step * step)
+
+    acc = np.empty(min(N, CHUNK), dtype=np.uint64)
+    tmp = np.empty(min(N, CHUNK), dtype=np.uint64)
+    shift = np.uint64(64 - bits)
+    if interpolate:
+        fshift = np.uint64(64 - bits - FRAC_BITS)
+        fmask = np.uint64((1 << FRAC_BITS) - 1)
+        frac = np.empty(min(N, CHUNK), dtype=np.float32)
+        vs = np.empty((min(N, CHUNK), 2), dtype=np.float32)
+    for start in range(0, N, CHUNK):
+        stop = min(start + CHUNK, N)
+        m = stop - start
+        a, t = acc[:m], tmp[:m]
+        if linear:
+            # restart the recurrence at the block: sample start + j has
+            # acc = acc(start) + j*I(start) + j(j-1)/2 * dI
+            M = 1 << 64
+            I_s = (I0 + start * dI) % M
+            acc_s = (acc0 + start * I0 + start * (start - 1) // 2 * dI) % M
+            np.multiply(_ramp[:m], np.uint64(I_s), out=a)
+            np.multiply(_tri[:m], np.uint64(dI), out=t)
+            a += t
+            a += np.uint64(acc_s)
+        else:
+            tau = np.arange(start, stop, dtype=float)
+            tau *= step
+            if stop == N and N > 1:
+                tau[-1] = T
+            phase_cycles(kind, tau, T, fmin, fmax)
+            tau *= scale
+            tau += start_word
+            tau -= np.floor(tau)
+            tau *= 2.0**63
+            a[:] = tau
+            a <<= np.uint64(1)
+        if interpolate:
+            f, g = frac[:m], vs[:m]
+            np.right_shift(a, fshift, out=t)
+            t &= fmask
+            f[:] = t
+            f *= np.float32(1.0 / (1 << FRAC_BITS))
+            np.right_shift(a, shift, out=t)
+            np.take(table, t.view(np.int64), axis=0, out=g)  # index < 2^bits
+            v = g[:, 1]
+            v *= f
+            v += g[:, 0]
+            np.rint(v, out=v)
+            out[start:stop] = v
+        else:
+            np.right_shift(a, shift, out=t)
+            np.take(table, t.view(np.int64), out=out[start:stop])
+    return out
+
+
+# --Define a function to render a sweep table entry as differential int16 stereo
+# The DDS counterpart of sweepcore.sweep_wave (no dither or taper)
+def dds_sweep_wave(entry, samplerate, amplitude, interpolate=True, out=None):
+    fmin, fmax, T, kind = entry
+    N = int(samplerate * T)
+    chirp_x = np.arange(0, N) / samplerate
+    if out is None:
+        out = np.empty((N, 2), dtype=np.int16)
+    left = dds_chirp(N, tmin=0, tmax=T, fmin=fmin, fmax=fmax, kind=kind, amplitude=amplitude,
+                     zero_phase_tmin=True, cos=False, interpolate=interpolate)
+    out[:, 0] = left
+    np.negative(left, out=out[:, 1])  # amplitude <= 32767, so no -32768 to wrap
+    return chirp_x, out
+
+
+# --Define a function to give the SNR in dB of x against a reference signal
+def snr_db(x, ref):
+    ref = np.asarray(ref, dtype=np.float64)
+    err = np.asarray(x, dtype=np.float64) - ref
+    noise = np.dot(err, err)
+    if noise == 0:
+        return float("inf")
+    return float(10 * np.log10(np.dot(ref, ref) / noise))
+
+
+# --Define a function to give the lchirp reference for an entry, scaled to int16 counts
+def reference(entry, samplerate, amplitude):
+    fmin, fmax, T, kind = entry
+    N = int(samplerate * T)
+    if kind == "lin":
+        w = lchirp(N, tmin=0, tmax=T, fmin=fmin, fmax=fmax, zero_phase_tmin=True, cos=False)
+    else:  # lchirp is linear only; chirpgen agrees with it to float32 precision
+        from chirpgen import chirp
+
+        w = chirp(N, tmin=0, tmax=T, fmin=fmin, fmax=fmax, kind=kind, zero_phase_tmin=True,
+                  cos=False).astype(np.float64)
+    return w * clamp_amplitude(amplitude)
+
+
+# --Define a function to check the SNR bounds and time DDS against lchirp
+def selftest(samplerate=SAMPLERATE, amplitude=AMPLITUDE, repeats=20):
+    ok = True
+    for index, entry in sweeps.items():
+        fmin, fmax, T, kind = entry
+        N = int(samplerate * T)
+        ref = reference(entry, samplerate, amplitude)
+        for interpolate, bound in ((False, SNR_MIN), (True, SNR_MIN_INTERP)):
+            y = dds_chirp(N, 0, T, fmin, fmax, kind, amplitude, cos=False, interpolate=interpolate)
+            snr = snr_db(y, ref)
+            good = snr >= bound
+            ok = ok and good
+            print("sweep %d %s %-6s SNR %6.1f dB (>= %.0f) %s"
+                  % (index, kind, "interp" if interpolate else "lookup", snr, bound,
+                     "OK" if good else "FAILED"))
+        # long linear sweeps keep their phase: about 1 s (not exactly, so the
+        # end phase is not a whole number of cycles, where lchirp's float
+        # modulo may drop a cycle)
+        if kind == "lin":
+            T1 = 1.0001
+            M = int(samplerate * T1)
+            w = lchirp(M, tmin=0, tmax=T1, fmin=fmin, fmax=fmax, zero_phase_tmin=True, cos=False)
+            y = dds_chirp(M, 0, T1, fmin, fmax, "lin", amplitude, cos=False)
+            snr = snr_db(y, w * clamp_amplitude(amplitude))
+            ok = ok and snr >= SNR_MIN_INTERP
+            print("sweep %d 1 s      SNR %6.1f dB %s" % (index, snr, "OK" if snr >= SNR_MIN_INTERP else "FAILED"))
+    # speed on the longest sweep: lchirp then scale and cast, as sweep_gen used to
+    fmin, fmax, T, kind = sweeps[1]
+    N = int(samplerate) // 4
+    for name, fn in (
+        ("lchirp+int16", lambda: (lchirp(N, 0, 0.25, fmin, fmax, True, False) * amplitude).astype(np.int16)),
+        ("dds lookup", lambda: dds_chirp(N, 0, 0.25, fmin, fmax, "lin", amplitude, cos=False, interpolate=False)),
+        ("dds interp", lambda: dds_chirp(N, 0, 0.25, fmin, fmax, "lin", amplitude, cos=False)),
+    ):
+        times = []
+        for _ in range(repeats):
+            t = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t)
+        print("%-13s %d samples %8.3f ms" % (name, N, min(times) * 1e3))
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fixed-point DDS chirp engine")
+    parser.add_argument("--rate", type=float, default=SAMPLERATE)
+    parser.add_argument("--amplitude", type=int, default=AMPLITUDE)
+    parser.add_argument("--selftest", action="store_true", help="SNR bounds and timing")
+    args = parser.parse_args()
+    if args.selftest:
+        raise SystemExit(0 if selftest(args.rate, args.amplitude) else 1)
+    parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
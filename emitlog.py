@@ -0,0 +1,206 @@
+#!/usr/bin/python3
+import argparse
+import collections
+import csv
+import os
+import threading
+import time
+
+import numpy as np
+
+# ----- Emission log: when each sweep went out, in a fixed-size binary ring
+# Every burst or sweep started is one fixed-size record:
+#   header  (magic, version, record size, capacity, records written)
+#   records capacity RECORD slots; record n is in slot n % capacity
+# The file is preallocated and np.memmap'ed, so it never grows: the oldest
+# records are overwritten once it is full. emit() only takes the timestamps
+# and appends to a queue; a background thread writes the queued records into
+# the map in batches, so logging never waits on the disk. The monotonic and
+# wall clock timestamps let emissions be lined up with receivers logging
+# separately.
+#
+#   python3 emitlog.py /tmp/emissions.log --last 20
+#   python3 emitlog.py /tmp/emissions.log --since 1700000000 --csv pings.csv --npy pings.npy
+
+MAGIC = b"SWPEMIT1"
+VERSION = 1
+CAPACITY = 65536  # records in a new log, 2.5 MB
+FLUSH_INTERVAL = 0.5  # seconds between background writes
+
+MODES = ("continuous", "brush", "fire")  # how the sweep was started, by record "mode"
+
+HEADER = np.dtype(
+    [("magic", "S8"), ("version", "<u4"), ("record", "<u4"), ("capacity", "<u8"), ("count", "<u8")]
+)
+RECORD = np.dtype(
+    [
+        ("mono_ns", "<i8"),  # time.monotonic_ns() at the play call, or the scheduled start
+        ("wall_ns", "<i8"),  # time.time_ns() at the play call
+        ("seq", "<u8"),  # record number since the log was created
+        ("fmin", "<f4"),
+        ("fmax", "<f4"),
+        ("duration", "<f4"),  # seconds
+        ("amplitude", "<i2"),
+        ("sweep", "<i1"),  # sweeps table entry, -1 for the playlist
+        ("mode", "u1"),  # index into MODES
+    ]
+)
+
+
+class EmitLog:
+    def __init__(self, path, capacity=CAPACITY, interval=FLUSH_INTERVAL):
+        self.path = path
+        self.interval = interval
+        if not os.path.exists(path) or os.path.getsize(path) < HEADER.itemsize:
+            with open(path, "wb") as f:
+                header = np.zeros(1, dtype=HEADER)
+                header["magic"], header["version"] = MAGIC, VERSION
+                header["record"], header["capacity"] = RECORD.itemsize, capacity
+                f.write(header.tobytes())
+                f.truncate(HEADER.itemsize + capacity * RECORD.itemsize)
+        self.mm, self.header, self.records = _open(path, "r+")
+        self.capacity = len(self.records)
+        self.count = int(self.header["count"])  # records written, carried on from the file
+        self.queue = collections.deque()  # (mono_ns, wall_ns, fmin, fmax, duration, amplitude, sweep, mode)
+        self.wake = threading.Event()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="emitlog", daemon=True)
+        self.thread.start()
+
+    # --Record an emission now, or at monotonic ns `at` if it is scheduled; never blocks
+    def emit(self, sweep, fmin, fmax, duration, amplitude, mode, at=None):
+        mono, wall = time.monotonic_ns(), time.time_ns()
+        if at is not None:
+            mono, wall = at, wall + (at - mono)
+        self.queue.append((mono, wall, fmin, fmax, duration, amplitude, sweep, MODES.index(mode)))
+
+    def _run(self):
+        while self.running:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            self.flush()
+
+    # --Write the queued records into the ring (on the log thread, or at close)
+    def flush(self):
+        batch = []
+        while self.queue:
+            batch.append(self.queue.popleft())
+        if not batch:
+            return 0
+        recs = np.zeros(len(batch), dtype=RECORD)
+        cols = list(zip(*batch))
+        for name, col in zip(("mono_ns", "wall_ns", "fmin", "fmax", "duration", "amplitude", "sweep", "mode"), cols):
+            recs[name] = col
+        recs["seq"] = np.arange(self.count, self.count + len(batch))
+        slots = recs["seq"] % self.capacity
+        self.records[slots] = recs  # a batch larger than the ring keeps its newest records
+        self.count += len(batch)
+        self.header["count"] = self.count  # after the records, so readers never see unwritten slots
+        return len(batch)
+
+    def stats(self):
+        return {"written": self.count, "queued": len(self.queue), "capacity": self.capacity}
+
+    def close(self):
+        self.running = False
+        self.wake.set()
+        self.thread.join()
+        self.flush()
+        self.mm.flush()
+
+
+# --Define a function to map a log file: (map, header, records)
+def _open(path, mode):
+    mm = np.memmap(path, dtype=np.uint8, mode=mode)
+    header = mm[: HEADER.itemsize].view(HEADER)
+    if header["magic"][0] != MAGIC or header["version"][0] != VERSION or header["record"][0] != RECORD.itemsize:
+        raise ValueError(path + " is not a version %d emission log" % VERSION)
+    capacity = int(header["capacity"][0])
+    records = mm[HEADER.itemsize : HEADER.itemsize + capacity * RECORD.itemsize].view(RECORD)
+    return mm, header.reshape(()), records
+
+
+# --Define a function to read the records still in a log, oldest first
+# since/until are wall clock seconds; records outside [since, until) are dropped
+def read_log(path, since=None, until=None):
+    _, header, records = _open(path, "r")
+    count = int(header["count"])
+    capacity = len(records)
+    first = max(0, count - capacity)
+    recs = records[np.arange(first, count) % capacity]  # a copy, in seq order
+    if since is not None:
+        recs = recs[recs["wall_ns"] >= int(since * 1e9)]
+    if until is not None:
+        recs = recs[recs["wall_ns"] < int(until * 1e9)]
+    return recs
+
+
+# --Define a function to write records to a CSV file, with the mode by name
+def write_csv(path, recs):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(RECORD.names)
+        for rec in recs.tolist():
+            rec = list(rec)
+            rec[-1] = MODES[rec[-1]]
+            writer.writerow(rec)
+
+
+# --Define a function to check the ring wraps and reads back in order
+def selftest(path="/tmp/emitlog_selftest.log", capacity=100):
+    if os.path.exists(path):
+        os.unlink(path)
+    log = EmitLog(path, capacity, interval=0.01)
+    for i in range(250):
+        log.emit(i % 5, 1000.0 * i, 2000.0 * i, 0.004, 17750, MODES[i % 3])
+        if i == 120:
+            time.sleep(0.05)  # let the log thread write some of it
+    log.close()
+    again = EmitLog(path)  # carries on from the count in the file
+    again.emit(1, 1.0, 2.0, 0.004, 17750, "fire")
+    again.close()
+    recs = read_log(path)
+    ok = (
+        len(recs) == capacity
+        and list(recs["seq"]) == list(range(151, 251))
+        and recs["fmin"][-2] == 249000.0
+        and MODES[recs["mode"][-1]] == "fire"
+        and bool(np.all(np.diff(recs["mono_ns"]) >= 0))
+    )
+    print("records", len(recs), "seq", recs["seq"][0], "..", recs["seq"][-1], "OK" if ok else "FAILED")
+    os.unlink(path)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export records from an emission log")
+    parser.add_argument("log", nargs="?", help="emission log file")
+    parser.add_argument("--since", type=float, help="wall clock seconds (Unix time), inclusive")
+    parser.add_argument("--until", type=float, help="wall clock seconds (Unix time), exclusive")
+    parser.add_argument("--last", type=int, help="only the last N records")
+    parser.add_argument("--csv", help="write the records to a CSV file")
+    parser.add_argument("--npy", help="write the records to a NumPy .npy file")
+    parser.add_argument("--selftest", action="store_true", help="ring wrap and read back check")
+    args = parser.parse_args()
+    if args.selftest:
+        raise SystemExit(0 if selftest() else 1)
+    if not args.log:
+        parser.error("the log file is needed")
+    recs = read_log(args.log, args.since, args.until)
+    if args.last is not None:
+        recs = recs[-args.last :]
+    if args.csv:
+        write_csv(args.csv, recs)
+    if args.npy:
+        np.save(args.npy, recs)
+    if not args.csv and not args.npy:
+        for rec in recs:
+            print("%8d %s %8.1f %8.1f %7.4f s amp %5d sweep %2d %s" % (
+                rec["seq"], time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(rec["wall_ns"] / 1e9)),
+                rec["fmin"], rec["fmax"], rec["duration"], rec["amplitude"], rec["sweep"],
+                MODES[rec["mode"]]))
+    print("%d records" % len(recs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+import argparse
+import hashlib
+
+import numpy as np
+
+from chirpgen import inst_freq
+from sweepcore import sweeps, SAMPLERATE
+
+# ----- Per-frequency amplitude equalization from a calibration table
+# The table is the measured response of the output chain (DAC, amplifier,
+# transducer) in dB at a set of frequencies, interpolated linearly in between
+# and held flat beyond the ends. The correction is the inverse response,
+# scaled so the least sensitive frequency in the table gets the full
+# amplitude: every frequency then comes out at that level, and nothing is
+# pushed past full scale.
+#
+# A chirp's frequency is a known function of time (chirpgen.inst_freq), so
+# the correction is simply a gain envelope over the sweep, applied while
+# quantizing (quantize_stereo gain=). For any other signal, or to check the
+# envelope, the same correction is available as a linear phase FIR applied by
+# FFT convolution. Envelopes and FIR taps are cached per calibration version
+# (a hash of the table), and the equalized sweeps are cached like flat ones
+# with the version in their key, so they cost nothing extra at play time.
+#
+# Calibration file: one "frequency Hz, response dB" pair per line, # comments
+#   python3 equalize.py --calibration response.csv --sweep 4
+#   python3 equalize.py --selftest
+
+FIR_TAPS = 255  # linear phase FIR length, delay FIR_TAPS // 2 samples
+
+
+class Calibration:
+    def __init__(self, freqs, response_db, method="envelope", version=None):
+        order = np.argsort(freqs)
+        self.freqs = np.asarray(freqs, dtype=float)[order]
+        self.response_db = np.asarray(response_db, dtype=float)[order]
+        if method not in ("envelope", "fir"):
+            raise ValueError("unknown equalization method: " + str(method))
+        self.method = method
+        if version is None:
+            table = np.stack((self.freqs, self.response_db)).tobytes()
+            version = hashlib.sha1(table).hexdigest()[:12]
+        self.version = version
+        self._envelopes = {}  # (fmin, fmax, T, kind, samplerate, delay) -> float32 gain per sample
+        self._taps = {}  # (samplerate, taps) -> float64 FIR
+
+    # --Return a key for caches; changes whenever the table or method does
+    def key(self):
+        return ("eq", self.version, self.method)
+
+    # --Return the linear correction gain at frequencies f (at most 1)
+    def gain(self, f):
+        response = np.interp(np.abs(f), self.freqs, self.response_db)
+        return 10.0 ** ((self.response_db.min() - response) / 20.0)
+
+    # --Return the cached gain envelope for a sweep table entry, one value per sample
+    # (of a sweep starting delay samples late, see chirpgen.chirp)
+    def envelope(self, entry, samplerate, delay=0.0):
+        fmin, fmax, T, kind = entry
+        key = (fmin, fmax, T, kind, samplerate, delay)
+        env = self._envelopes.get(key)
+        if env is None:
+            N = int(samplerate * T)
+            tau = np.linspace(0, T, N)  # the chirp time grid
+            if delay:
+                tau = np.clip((np.arange(N + int(np.ceil(delay))) - delay) * (T / (N - 1)), 0, T)
+            env = self.gain(inst_freq(kind, tau, T, fmin, fmax)).astype(np.float32)
+            self._envelopes[key] = env
+        return env
+
+    # --Return the cached linear phase FIR for the correction (frequency sampling)
+    def fir(self, samplerate, taps=FIR_TAPS):
+        h = self._taps.get((samplerate, taps))
+        if h is None:
+            nfft = 1 << int(np.ceil(np.log2(8 * taps)))
+            H = self.gain(np.fft.rfftfreq(nfft, 1.0 / samplerate))
+            h = np.roll(np.fft.irfft(H, nfft), taps // 2)[:taps] * np.hanning(taps + 2)[1:-1]
+            self._taps[(samplerate, taps)] = h
+        return h
+
+    # --Return x filtered by the FIR, aligned with x (the delay is taken out)
+    def filter(self, x, samplerate, taps=FIR_TAPS):
+        h = self.fir(samplerate, taps)
+        n = len(x) + len(h) - 1
+        nfft = 1 << int(np.ceil(np.log2(n)))
+        y = np.fft.irfft(np.fft.rfft(x, nfft) * np.fft.rfft(h, nfft), nfft)
+        delay = len(h) // 2
+        return y[delay : delay + len(x)].astype(np.float32)
+
+
+# --Define a function to read a calibration file of "frequency, response dB" lines
+def load_calibration(path, method="envelope"):
+    with open(path, "rb") as f:
+        text = f.read()
+    rows = []
+    for line in text.decode().splitlines():
+        line = line.split("#")[0].strip()
+        if line:
+            rows.append([float(v) for v in line.replace(",", " ").split()[:2]])
+    if len(rows) < 2:
+        raise ValueError(path + " needs at least two frequency, response pairs")
+    freqs, response = zip(*rows)
+    return Calibration(freqs, response, method, hashlib.sha1(text).hexdigest()[:12])
+
+
+# --Define a function to give the level in dB along a sweep after the output chain
+# The chain is simulated by its response as an FIR (the inverse of the
+# correction); levels are the STFT power of each frame, so ripple is max - min in dB.
+def chain_levels(y, samplerate, cal, nfft=128):
+    from spectro import stft_db
+
+    chain = Calibration(cal.freqs, -cal.response_db)  # gain() of this is the response
+    heard = chain.filter(y, samplerate)
+    db = 10 * np.log10((10 ** (stft_db(heard, nfft, hop=nfft // 2) / 10)).sum(axis=1))
+    return db[2:-2]  # the first and last frames are cut by the sweep edges
+
+
+# --Define a function to check the equalized sweeps come out flat through a chain
+def selftest(samplerate=SAMPLERATE):
+    from sweepcore import sweep_wave, AMPLITUDE
+
+    # a made-up chain: rolls off 30 dB from 4 to 78 kHz with a 10 dB peak at 60 kHz
+    freqs = np.linspace(2000, 90000, 45)
+    response = -30 * (freqs - 4000) / 74000 + 10 * np.exp(-(((freqs - 60000) / 6000) ** 2))
+    ok = True
+    for method in ("envelope", "fir"):
+        cal = Calibration(freqs, response, method)
+        for index, entry in sweeps.items():
+            _, flat = sweep_wave(entry, samplerate, AMPLITUDE)
+            _, eq = sweep_wave(entry, samplerate, AMPLITUDE, eq=cal)
+            before = np.ptp(chain_levels(flat[:, 0].astype(np.float32), samplerate, cal))
+            after = np.ptp(chain_levels(eq[:, 0].astype(np.float32), samplerate, cal))
+            good = after < 1.0 and after < before
+            ok = ok and good
+            print("%-8s sweep %d ripple %5.2f dB -> %5.2f dB %s"
+                  % (method, index, before, after, "OK" if good else "FAILED"))
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Equalize sweeps from a calibration table")
+    parser.add_argument("--calibration", help="file of frequency Hz, response dB lines")
+    parser.add_argument("--method", choices=("envelope", "fir"), default="envelope")
+    parser.add_argument("--sweep", type=int, default=0, help="sweeps table entry")
+    parser.add_argument("--rate", type=float, default=SAMPLERATE)
+    parser.add_argument("--selftest", action="store_true", help="flatness check on a made-up chain")
+    args = parser.parse_args()
+    if args.selftest:
+        raise SystemExit(0 if selftest(args.rate) else 1)
+    if not args.calibration:
+        parser.error("a calibration file is needed")
+    cal = load_calibration(args.calibration, args.method)
+    entry = sweeps[args.sweep]
+    env = cal.envelope(entry, args.rate)
+    print("calibration %s, sweep %d %s" % (cal.version, args.sweep, entry))
+    print("gain %.3f to %.3f (%.1f dB range)" % (env.min(), env.max(), 20 * np.log10(env.max() / env.min())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import numpy as np
+import matplotlib.backends.backend_agg as agg
+from matplotlib.figure import Figure
+
+# ----- Persistent waveform graph for the 320x240 PiTFT
+# The figure, Agg canvas and line artists are made once; a new sweep only
+# replaces the line data. The figure is not registered with pyplot, so
+# nothing keeps old figures alive.
+
+
+# --Define a function to reduce a waveform to a min/max envelope per pixel column
+# x must be increasing; y is (N,) or (N, channels). Columns are spaced on a
+# log axis when log is True (samples at x <= 0 cannot be shown there).
+# Returns x and y traced as a zig-zag (min, max per column) for a single line.
+def envelope(x, y, ncols, log=True):
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if log:
+        start = int(np.searchsorted(x, 0, side="right"))
+        if len(x) - start < 2:
+            return x[start:], y[start:]
+        edges = np.geomspace(x[start], x[-1], ncols + 1)
+    else:
+        start = 0
+        edges = np.linspace(x[0], x[-1], ncols + 1)
+    if len(x) - start <= 2 * ncols:  # already no more points than pixels
+        return x[start:], y[start:]
+    idx = np.unique(np.searchsorted(x, edges[:-1]))
+    idx = idx[idx < len(x)]
+    lo = np.minimum.reduceat(y, idx, axis=0)
+    hi = np.maximum.reduceat(y, idx, axis=0)
+    ex = np.repeat(x[idx], 2)
+    ey = np.empty((2 * len(idx),) + y.shape[1:], dtype=y.dtype)
+    ey[0::2] = lo
+    ey[1::2] = hi
+    return ex, ey
+
+
+class SweepGraph:
+    def __init__(self, width=3.2, height=2.4, dpi=100):
+        self.fig = Figure(figsize=(width, height), dpi=dpi)
+        self.canvas = agg.FigureCanvasAgg(self.fig)
+        self.fig.subplots_adjust(left=0.15, bottom=0.15, right=0.97)
+        ax = self.fig.add_subplot(1, 1, 1)
+        (self.line0,) = ax.plot([], [], "red")
+        (self.line1,) = ax.plot([], [], "g")
+        ax.set_xscale("log")
+        ax.set_xlabel("Time", fontsize=6)
+        ax.xaxis.set_label_coords(0.5, -0.12)
+        ax.set_ylabel("Amplitude", fontsize=6)
+        ax.yaxis.set_label_coords(-0.13, 0.5)
+        ax.tick_params(labelsize=6)
+        ax.grid(which="both", linestyle="--")
+        ax.grid(which="minor", alpha=0.2)
+        self.title = self.fig.suptitle("", fontsize=8, color="blue", y=0.95)
+        self.ax = ax
+        # pixel columns covered by the axes
+        self.ncols = int(round(width * dpi * (0.97 - 0.15)))
+        self.key = None  # what the current picture shows
+        self.version = 0  # bumped on every redraw
+        self.size = self.canvas.get_width_height()
+        self.rgba = None
+
+    # --Define a function to redraw only when the sweep shown has changed
+    # Returns True if a new picture was rendered
+    def update(self, key, x, y, title):
+        if key == self.key and self.rgba is not None:
+            return False
+        y = np.asarray(y)
+        if y.ndim == 1:
+            y = y[:, None]
+        ex, ey = envelope(x, y, self.ncols, log=True)
+        self.line0.set_data(ex, ey[:, 0])
+        self.line1.set_data(ex, ey[:, -1])
+        if len(ex):
+            self.ax.set_xlim(ex[0], ex[-1])
+            lo, hi = float(ey.min()), float(ey.max())
+            pad = (hi - lo) * 0.05 or 1.0
+            self.ax.set_ylim(lo - pad, hi + pad)
+        self.title.set_text(title)
+        self.canvas.draw()
+        self.rgba = bytes(self.canvas.buffer_rgba())
+        self.key = key
+        self.version += 1
+        return True
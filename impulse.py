@@ -0,0 +1,164 @@
+#!/usr/bin/python3
+import argparse
+
+import numpy as np
+
+from matched import reference, next_pow2
+from sweepcore import sweeps, sweep_key, sweep_wave, SAMPLERATE, AMPLITUDE
+
+# ----- Impulse and frequency response measurement by sweep deconvolution
+# A sweep from the sweeps table is played, the response recorded and divided
+# by the sweep in the frequency domain:
+#  - linear and hyperbolic sweeps: regularized deconvolution
+#      Hinv = conj(X) / (|X|^2 + eps * max|X|^2)
+#  - log sweeps: the time reversed sweep with a -6 dB/octave envelope
+#    (Farina's inverse filter), normalized to unit gain across the sweep band.
+# Inverse filters are cached per sweep and FFT size. Repetitions are averaged
+# by summing their spectra, so only one spectrum is held however many are taken.
+#
+#   python3 impulse.py --sweep 4 --repeats 8 -o response.npz
+#   python3 impulse.py --sweep 4 --selftest
+
+_inverses = {}  # (sweep key, nfft, eps) -> inverse filter spectrum
+
+
+# --Define a function to give the cached inverse filter spectrum of a sweep
+def inverse_filter(entry, samplerate, nfft, eps=1e-3):
+    key = (sweep_key(entry, samplerate, 1), nfft, eps)
+    Hinv = _inverses.get(key)
+    if Hinv is not None:
+        return Hinv
+    fmin, fmax, T, kind = entry
+    x = reference(entry, samplerate).astype(np.float64)
+    if kind == "log":
+        N = len(x)
+        t = np.arange(N) / samplerate
+        L = T / np.log(fmax / fmin)
+        inv = x[::-1] * np.exp(-t / L)
+        Hinv = np.fft.rfft(inv, nfft)
+        # the reversed sweep delays the result by N - 1 samples: take it out
+        k = np.arange(len(Hinv))
+        Hinv *= np.exp(2j * np.pi * k * (N - 1) / nfft)
+        # unit gain across the sweep band
+        f = np.fft.rfftfreq(nfft, 1 / samplerate)
+        band = (f >= fmin) & (f <= fmax)
+        Hinv /= np.median(np.abs(np.fft.rfft(x, nfft)[band] * Hinv[band]))
+    else:
+        X = np.fft.rfft(x, nfft)
+        power = np.abs(X) ** 2
+        Hinv = np.conj(X) / (power + eps * power.max())
+    _inverses[key] = Hinv
+    return Hinv
+
+
+# --Accumulate recordings of one sweep and deconvolve their average
+class ResponseAverager:
+    def __init__(self, entry, samplerate=SAMPLERATE, length=None, eps=1e-3):
+        self.entry = entry
+        self.samplerate = samplerate
+        self.M = int(samplerate * entry[2])
+        length = length if length is not None else 4 * self.M
+        self.nfft = next_pow2(length + self.M)
+        self.length = length  # samples kept from each recording
+        self.Hinv = inverse_filter(entry, samplerate, self.nfft, eps)
+        self.sum = np.zeros(self.nfft // 2 + 1, dtype=complex)
+        self.count = 0
+
+    # --Add one recording (sweep start at sample 0), int16 or float
+    def add(self, recording):
+        rec = np.asarray(recording)
+        if rec.ndim > 1:
+            rec = rec[:, 0]
+        y = rec[: self.length].astype(np.float64)
+        if rec.dtype == np.int16:
+            y /= 32768.0
+        self.sum += np.fft.rfft(y, self.nfft)
+        self.count += 1
+
+    # --Return (impulse response, frequencies, complex frequency response)
+    # The response is only meaningful inside the sweep band.
+    def result(self, ir_length=None):
+        if not self.count:
+            raise ValueError("no recordings added")
+        H = self.sum / self.count * self.Hinv
+        ir = np.fft.irfft(H, self.nfft)[: ir_length or self.length]
+        freqs = np.fft.rfftfreq(self.nfft, 1 / self.samplerate)
+        return ir, freqs, H
+
+    # --Return the sweep band (frequencies and response in dB) for reporting
+    def band_response(self):
+        _, freqs, H = self.result()
+        fmin, fmax = sorted(self.entry[:2])
+        band = (freqs >= fmin) & (freqs <= fmax)
+        return freqs[band], 20 * np.log10(np.abs(H[band]) + 1e-12)
+
+
+# --Define a function to play a sweep and record the response, repeats times
+# Needs the sounddevice package, which is only imported here
+def measure(entry, repeats=4, samplerate=SAMPLERATE, amplitude=AMPLITUDE, tail=0.05,
+            device=None):
+    import sounddevice
+
+    _, out = sweep_wave(entry, samplerate, amplitude)
+    pad = int(tail * samplerate)
+    play = np.concatenate((out, np.zeros((pad, 2), dtype=np.int16)))
+    avg = ResponseAverager(entry, samplerate, length=len(play))
+    for _ in range(repeats):
+        rec = sounddevice.playrec(play, samplerate=samplerate, channels=1, dtype="int16",
+                                  device=device, blocking=True)
+        avg.add(rec)
+    return avg
+
+
+# --Define a function to check the deconvolution on a synthetic system
+# Two reflections at known delays and gains plus noise, averaged over repeats;
+# both must be found at the right sample with the right relative gain.
+def selftest(entry, samplerate=SAMPLERATE, repeats=8):
+    rng = np.random.default_rng(2)
+    x = reference(entry, samplerate).astype(np.float64)
+    taps = {40: 0.8, 140: -0.4}
+    avg = ResponseAverager(entry, samplerate)
+    for _ in range(repeats):
+        y = np.zeros(avg.length)
+        for d, g in taps.items():
+            y[d : d + len(x)] += g * x[: avg.length - d]
+        y += rng.normal(0, 0.05, len(y))
+        avg.add(y)
+    ir, _, _ = avg.result()
+    # compare against the same taps seen through the sweep band only
+    h = np.zeros(avg.nfft)
+    for d, g in taps.items():
+        h[d] = g
+    expect = np.fft.irfft(np.fft.rfft(h) * np.fft.rfft(x, avg.nfft) * avg.Hinv, avg.nfft)[: avg.length]
+    peaks = [int(np.argmax(np.abs(ir[d - 10 : d + 10]))) + d - 10 for d in taps]
+    ratio = ir[peaks[1]] / ir[peaks[0]]
+    err = np.max(np.abs(ir - expect)) / np.max(np.abs(expect))
+    ok = peaks == list(taps) and abs(ratio - (-0.5)) < 0.05 and err < 0.05
+    print("peaks at", peaks, "expected", list(taps))
+    print("gain ratio %.3f (expected -0.5), residual %.3f" % (ratio, err))
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Impulse response by sweep deconvolution")
+    parser.add_argument("--sweep", type=int, default=0, help="sweeps table entry")
+    parser.add_argument("--rate", type=float, default=SAMPLERATE)
+    parser.add_argument("--repeats", type=int, default=4)
+    parser.add_argument("--amplitude", type=int, default=AMPLITUDE)
+    parser.add_argument("-o", "--output", default="response.npz")
+    parser.add_argument("--selftest", action="store_true", help="synthetic system check")
+    args = parser.parse_args()
+    entry = sweeps[args.sweep]
+    if args.selftest:
+        raise SystemExit(0 if selftest(entry, args.rate) else 1)
+    avg = measure(entry, args.repeats, args.rate, args.amplitude)
+    ir, freqs, H = avg.result()
+    np.savez(args.output, ir=ir, freqs=freqs, H=H, samplerate=args.rate, repeats=avg.count)
+    bf, db = avg.band_response()
+    print("saved %s: %d repeats, band %.0f-%.0f Hz, %.1f to %.1f dB"
+          % (args.output, avg.count, bf[0], bf[-1], db.min(), db.max()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+import argparse
+import time
+import wave
+
+import numpy as np
+
+from chirpgen import chirp
+from sweepcore import sweeps, sweep_key, SAMPLERATE
+
+# ----- Streaming matched filter (pulse compression) for echo ranging
+# Input blocks of any size are correlated with the current sweep by overlap-save
+# FFT convolution: each FFT of nfft samples yields nfft - M + 1 new outputs
+# (M = sweep length). The conjugate reference spectrum is cached per sweep and
+# FFT size. Peaks above a threshold are reported once the M samples after them
+# have been seen, with the sample index and time of the echo start.
+#
+#   python3 matched.py --sweep 1 --wav capture.wav
+#   python3 matched.py --sweep 1 --selftest
+
+_spectra = {}  # (sweep key, nfft) -> conjugate reference spectrum
+
+
+# --Define a function to give the reference waveform for a sweep table entry
+def reference(entry, samplerate=SAMPLERATE):
+    fmin, fmax, T, kind = entry
+    N = int(samplerate * T)
+    return chirp(N, tmin=0, tmax=T, fmin=fmin, fmax=fmax, kind=kind, zero_phase_tmin=True, cos=False)
+
+
+# --Define a function to give the cached conjugate reference spectrum
+def reference_spectrum(entry, samplerate, nfft):
+    key = (sweep_key(entry, samplerate, 1), nfft)
+    H = _spectra.get(key)
+    if H is None:
+        ref = reference(entry, samplerate).astype(np.float64)
+        ref /= np.dot(ref, ref)  # a perfect full-scale echo correlates to 1.0
+        H = np.conj(np.fft.rfft(ref, nfft))
+        _spectra[key] = H
+    return H
+
+
+def next_pow2(n):
+    return 1 << int(np.ceil(np.log2(max(n, 1))))
+
+
+class MatchedFilter:
+    def __init__(self, entry, samplerate=SAMPLERATE, nfft=None, threshold=0.3):
+        self.samplerate = samplerate
+        self.M = int(samplerate * entry[2])
+        self.nfft = nfft if nfft is not None else max(4096, next_pow2(4 * self.M))
+        if self.nfft < self.M:
+            raise ValueError("nfft must be at least the sweep length %d" % self.M)
+        self.L = self.nfft - self.M + 1  # new outputs per FFT
+        self.H = reference_spectrum(entry, samplerate, self.nfft)
+        self.threshold = threshold
+        self.pending = np.zeros(0, dtype=np.float64)  # input not yet correlated
+        self.pos = 0  # sample index of pending[0]
+        self.best = None  # (index, value) of the peak being tracked
+        self.busy = []  # processing time per FFT, for the real-time report
+
+    # --Feed a block of samples; returns the peaks completed so far
+    # int16 input is scaled to +-1; other types are used as they are
+    def process(self, block):
+        block = np.asarray(block)
+        if block.ndim > 1:
+            block = block[:, 0]
+        if block.dtype == np.int16:
+            block = block / 32768.0
+        self.pending = np.concatenate((self.pending, block))
+        peaks = []
+        while len(self.pending) >= self.nfft:
+            t = time.perf_counter()
+            X = np.fft.rfft(self.pending[: self.nfft])
+            c = np.fft.irfft(X * self.H, self.nfft)[: self.L]
+            self._peaks(np.abs(c), peaks)
+            self.pending = self.pending[self.L :]
+            self.pos += self.L
+            self.busy.append(time.perf_counter() - t)
+        # a tracked peak is final once M samples past it are correlated
+        if self.best is not None and self.pos - self.best[0] > self.M:
+            peaks.append(self._report(self.best))
+            self.best = None
+        return peaks
+
+    # --Flush the end of the input (zero padded) and return the last peaks
+    def finish(self):
+        pad = self.nfft - len(self.pending) % self.L if len(self.pending) else 0
+        peaks = self.process(np.zeros(pad + self.M))
+        if self.best is not None:
+            peaks.append(self._report(self.best))
+            self.best = None
+        return peaks
+
+    def _report(self, best):
+        index, value = best
+        return (index, index / self.samplerate, value)
+
+    # --Local maxima above threshold, at least M samples apart
+    def _peaks(self, a, peaks):
+        above = np.flatnonzero(a > self.threshold)
+        if not len(above):
+            return
+        groups = np.split(above, np.flatnonzero(np.diff(above) > self.M) + 1)
+        for g in groups:
+            i = g[np.argmax(a[g])]
+            index, value = self.pos + int(i), float(a[i])
+            if self.best is not None and index - self.best[0] <= self.M:
+                if value > self.best[1]:
+                    self.best = (index, value)
+            else:
+                if self.best is not None:
+                    peaks.append(self._report(self.best))
+                self.best = (index, value)
+
+    # --Report processing time against the real-time budget per FFT
+    def stats(self):
+        if not self.busy:
+            return {"ffts": 0}
+        busy = np.array(self.busy)
+        budget = self.L / self.samplerate
+        return {
+            "ffts": len(busy),
+            "nfft": self.nfft,
+            "mean_ms": float(busy.mean() * 1e3),
+            "max_ms": float(busy.max() * 1e3),
+            "budget_ms": budget * 1e3,
+            "realtime_x": float(budget / busy.mean()),
+            # worst case wait from a sample arriving to its correlation
+            "latency_ms": float((self.nfft / self.samplerate + busy.max()) * 1e3),
+        }
+
+
+# --Define a function to read a WAV file in blocks (first channel)
+def wav_blocks(path, blocksize=4096):
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError(path + " is not 16 bit PCM")
+        channels = w.getnchannels()
+        while True:
+            data = w.readframes(blocksize)
+            if not data:
+                break
+            yield np.frombuffer(data, dtype="<i2").reshape(-1, channels)[:, 0]
+
+
+# --Define a function to read a .npy recording in blocks without loading it all
+def npy_blocks(path, blocksize=4096):
+    data = np.load(path, mmap_mode="r")
+    for start in range(0, len(data), blocksize):
+        yield data[start : start + blocksize]
+
+
+# --Define a function to capture blocks from a sound device
+# Needs the sounddevice package, which is only imported here
+def device_blocks(samplerate=SAMPLERATE, blocksize=4096, device=None, channels=1):
+    import sounddevice
+
+    with sounddevice.InputStream(
+        samplerate=samplerate, blocksize=blocksize, device=device, channels=channels, dtype="int16"
+    ) as stream:
+        while True:
+            data, overflowed = stream.read(blocksize)
+            if overflowed:
+                print("input overflow")
+            yield data[:, 0]
+
+
+# --Define a function to check the filter on a synthetic loopback signal
+# Echoes at known delays and amplitudes plus noise; every echo must be found
+# within one sample, and the run must be faster than real time.
+def selftest(entry, samplerate=SAMPLERATE, seconds=2.0, blocksize=4096):
+    rng = np.random.default_rng(1)
+    ref = reference(entry, samplerate)
+    n = int(seconds * samplerate)
+    delays = np.sort(rng.choice(np.arange(0, n - len(ref)), 8, replace=False))
+    delays = delays[np.concatenate(([True], np.diff(delays) > 2 * len(ref)))]
+    signal = rng.normal(0, 0.05, n)
+    gains = rng.uniform(0.4, 1.0, len(delays))
+    for d, g in zip(delays, gains):
+        signal[d : d + len(ref)] += g * ref
+    mf = MatchedFilter(entry, samplerate)
+    found = []
+    t = time.perf_counter()
+    for start in range(0, n, blocksize):
+        found += mf.process(signal[start : start + blocksize])
+    found += mf.finish()
+    elapsed = time.perf_counter() - t
+    got = np.array([p[0] for p in found])
+    ok = len(got) == len(delays) and np.all(np.abs(got - delays) <= 1) and elapsed < seconds
+    print("expected", list(delays))
+    print("found   ", list(got))
+    print("stats", mf.stats())
+    print("%.1f s of input in %.3f s (%.0fx real time): %s"
+          % (seconds, elapsed, seconds / elapsed, "OK" if ok else "FAILED"))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Matched filter echo detection")
+    parser.add_argument("--sweep", type=int, default=0, help="sweeps table entry")
+    parser.add_argument("--rate", type=float, default=SAMPLERATE)
+    parser.add_argument("--threshold", type=float, default=0.3)
+    parser.add_argument("--nfft", type=int)
+    parser.add_argument("--wav", help="WAV file to read")
+    parser.add_argument("--npy", help=".npy recording to read")
+    parser.add_argument("--device", action="store_true", help="capture from the sound device")
+    parser.add_argument("--selftest", action="store_true", help="synthetic loopback check")
+    args = parser.parse_args()
+    entry = sweeps[args.sweep]
+    if args.selftest:
+        raise SystemExit(0 if selftest(entry, args.rate) else 1)
+    if args.wav:
+        blocks = wav_blocks(args.wav)
+    elif args.npy:
+        blocks = npy_blocks(args.npy)
+    elif args.device:
+        blocks = device_blocks(args.rate)
+    else:
+        parser.error("give --wav, --npy, --device or --selftest")
+    mf = MatchedFilter(entry, args.rate, args.nfft, args.threshold)
+    try:
+        for block in blocks:
+            for index, t, value in mf.process(block):
+                print("echo at sample %d, %.6f s, level %.3f" % (index, t, value))
+    except KeyboardInterrupt:
+        pass
+    for index, t, value in mf.finish():
+        print("echo at sample %d, %.6f s, level %.3f" % (index, t, value))
+    print(mf.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import numpy as np
+
+from chirpgen import SWEEP_TYPES, chirp
+from sweepcore import AMPLITUDE
+
+# ----- Multi-channel sweep output for transducer arrays
+# Every channel plays the same sweep (chirpgen.chirp's time grid and end-phase
+# rule) with its own delay, gain and polarity. Delays are in samples and may
+# be fractional: chirp evaluates the sweep phase analytically at the delayed
+# time, so no interpolation filter is involved. GROUP channels at a time are
+# rendered into rows of a float32 scratch buffer, scaled, rounded and copied
+# into their columns of a C-contiguous int16 (frames, channels) matrix for a
+# multichannel sink, so the time is one chirp call per channel plus the
+# interleaving copy.
+
+GROUP = 16  # channels rendered before they are interleaved into the output
+
+
+def array_chirp(N, tmin=0, tmax=1, fmin=0, fmax=None, kind="lin", delays=(0.0,),
+                gains=None, polarity=None, amplitude=AMPLITUDE, zero_phase_tmin=True,
+                cos=False, out=None):
+    if kind not in SWEEP_TYPES:
+        raise ValueError("unknown sweep type: " + str(kind))
+    delays = np.atleast_1d(np.asarray(delays, dtype=float))
+    channels = len(delays)
+    gains = np.ones(channels) if gains is None else np.broadcast_to(gains, (channels,))
+    polarity = np.ones(channels) if polarity is None else np.broadcast_to(polarity, (channels,))
+    # only relative delays matter: the earliest channel starts at frame 0
+    delays = delays - delays.min()
+    frames = N + int(np.ceil(delays.max()))
+    if out is None:
+        out = np.empty((frames, channels), dtype=np.int16)
+    elif out.shape != (frames, channels) or out.dtype != np.int16:
+        raise ValueError("out must be an int16 array of shape %s" % ((frames, channels),))
+
+    level = (amplitude * gains * np.sign(polarity)).astype(np.float32)
+    group = min(GROUP, channels)
+    scratch = np.empty((group, frames), dtype=np.float32)
+    for first in range(0, channels, group):
+        last = min(first + group, channels)
+        rows = scratch[: last - first]
+        for row, delay in zip(rows, delays[first:last]):
+            n = N + int(np.ceil(delay))
+            chirp(N, tmin=tmin, tmax=tmax, fmin=fmin, fmax=fmax, kind=kind,
+                  zero_phase_tmin=zero_phase_tmin, cos=cos, out=row[:n], delay=delay)
+            row[n:] = 0
+        rows *= level[first:last, None]
+        np.rint(rows, out=rows)
+        np.clip(rows, -32768, 32767, out=rows)
+        out[:, first:last] = rows.T  # one transposed copy per group, not a strided write per channel
+    return out
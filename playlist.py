@@ -0,0 +1,288 @@
+#!/usr/bin/python3
+import argparse
+
+import numpy as np
+
+from chirpgen import chirp
+from quantize import quantize_stereo
+from sweepcore import sweeps, sweep_key, clamp_amplitude, SAMPLERATE, AMPLITUDE
+
+# ----- Multi-band playlist rendered into one looped buffer
+# Sweep table entries are laid end to end, each optionally followed by a gap
+# of silence or crossfaded into the next, and the last one leads back into the
+# first, so the buffer can be looped with no dead air between bands.
+#
+# Every band is rendered with zero_phase_tmin (see chirp3.lchirp): it starts
+# at phase 0 and is scaled to end on a whole number of cycles, so at every
+# band boundary (and at the loop point) the phase is continuous; only the
+# frequency steps. A crossfade overlaps the tail of one band with the head of
+# the next under complementary raised cosine windows (they sum to 1).
+#
+# Bands are cached as float32 waveforms by sweep key, and the mix is kept in
+# float32: editing one band re-renders that band and re-mixes and
+# re-quantizes only the samples it touches, as long as the layout (band
+# lengths, gaps and fades) stays the same.
+#
+#   python3 playlist.py --bands 0 1 2 3 4 --gap 0 --fade 0.0005 -o survey.wav
+#   python3 playlist.py --selftest
+
+class Playlist:
+    def __init__(self, samplerate=SAMPLERATE, amplitude=AMPLITUDE, eq=None):
+        self.samplerate = samplerate
+        self.amplitude = clamp_amplitude(amplitude)
+        self.eq = eq  # equalize.Calibration applied to every band, or None
+        self.bands = []  # [[sweep entry, gap s, fade s into the next band]]
+        self.waves = {}  # sweep key -> float32 waveform of a band in the list (see _prune)
+        self.layout = None  # (starts, lengths, gaps, fades) in samples, see _layout
+        self.mix = None  # float32 sum of the windowed bands
+        self.mixed = []  # sweep key of each band as it is in the mix
+        self.out = None  # int16 (N, 2) differential buffer
+        self.version = 0  # bumped whenever out changes
+        self.rendered = 0  # bands synthesized, for the incremental check
+
+    def __len__(self):
+        return len(self.bands)
+
+    # --Add a band at the end (or at index)
+    def add(self, entry, gap=0.0, fade=0.0, index=None):
+        band = [list(entry), gap, fade]
+        if index is None:
+            self.bands.append(band)
+        else:
+            self.bands.insert(index, band)
+
+    def remove(self, index):
+        del self.bands[index]
+        self._prune()
+
+    # --Change one band; only what changed is re-rendered on the next render()
+    def set(self, index, entry=None, gap=None, fade=None):
+        band = self.bands[index]
+        if entry is not None:
+            band[0] = list(entry)
+        if gap is not None:
+            band[1] = gap
+        if fade is not None:
+            band[2] = fade
+        self._prune()
+
+    # --Drop the cached waveforms no band uses any more, so redefining bands
+    # does not pile them up (render clears a changed band's samples, it never
+    # needs the old waveform)
+    def _prune(self):
+        used = {sweep_key(e, self.samplerate, 1, eq=self.eq) for e, _, _ in self.bands}
+        for key in [k for k in self.waves if k not in used]:
+            del self.waves[key]
+
+    # --Return the length of the looped buffer in samples, without rendering it
+    def frames(self):
+        return self._layout()[4]
+
+    # --Return a key for the rendered buffer (for caches)
+    def key(self):
+        return (
+            "playlist", self.samplerate, self.amplitude,
+            tuple((sweep_key(e, self.samplerate, 1, eq=self.eq), g, f) for e, g, f in self.bands),
+        )
+
+    # --Return the cached float32 waveform of a band
+    def _wave(self, entry):
+        key = sweep_key(entry, self.samplerate, 1, eq=self.eq)
+        w = self.waves.get(key)
+        if w is None:
+            fmin, fmax, T, kind = entry
+            N = int(self.samplerate * T)
+            w = chirp(N, tmin=0, tmax=T, fmin=fmin, fmax=fmax, kind=kind, zero_phase_tmin=True, cos=False)
+            if self.eq is not None and self.eq.method == "fir":
+                w = self.eq.filter(w, self.samplerate)
+            elif self.eq is not None:
+                w *= self.eq.envelope(entry, self.samplerate)
+            self.waves[key] = w
+            self.rendered += 1
+        return w
+
+    # --Band positions in samples: band i starts where band i-1 ends, plus its
+    # gap, minus the crossfade; the loop wraps the last band onto the first
+    def _layout(self):
+        lengths = [int(self.samplerate * e[2]) for e, _, _ in self.bands]
+        gaps = [int(round(g * self.samplerate)) for _, g, _ in self.bands]
+        fades = []
+        for i, (_, g, f) in enumerate(self.bands):
+            nxt = lengths[(i + 1) % len(lengths)]
+            # a fade needs the bands to touch and takes at most half of either
+            fades.append(0 if gaps[i] else min(int(round(f * self.samplerate)), lengths[i] // 2, nxt // 2))
+        starts = [0]
+        for i in range(len(lengths) - 1):
+            starts.append(starts[i] + lengths[i] + gaps[i] - fades[i])
+        total = starts[-1] + lengths[-1] + gaps[-1] - fades[-1]
+        return tuple(starts), tuple(lengths), tuple(gaps), tuple(fades), total
+
+    # --Return the windowed samples of band i (fade in from the band before)
+    def _windowed(self, i):
+        starts, lengths, gaps, fades, total = self.layout
+        w = self._wave(self.bands[i][0]).copy()
+        fin, fout = fades[i - 1], fades[i]
+        if fin:
+            w[:fin] *= _ramp(fin)
+        if fout:
+            w[len(w) - fout :] *= _ramp(fout)[::-1]
+        return w
+
+    # --Add band i into the mix, wrapping round the end of the loop
+    def _add(self, i, w):
+        start = self.layout[0][i]
+        total = self.layout[4]
+        n = min(len(w), total - start)
+        self.mix[start : start + n] += w[:n]
+        if n < len(w):  # the last band's crossfade runs into the start
+            self.mix[: len(w) - n] += w[n:]
+
+    # --Return the sample ranges [a, b) band i covers, split at the loop point
+    def _span(self, i):
+        start, length, total = self.layout[0][i], self.layout[1][i], self.layout[4]
+        if start + length <= total:
+            return [(start, start + length)]
+        return [(start, total), (0, start + length - total)]
+
+    # --Render the looped buffer: int16 (N, 2), left the sweep, right inverted
+    # Re-uses what it can: with the same layout only the changed bands are
+    # re-mixed and re-quantized.
+    def render(self):
+        if not self.bands:
+            raise ValueError("empty playlist")
+        layout = self._layout()
+        if layout != self.layout or self.out is None:
+            self.layout = layout
+            total = layout[4]
+            self.mix = np.zeros(total, dtype=np.float32)
+            for i in range(len(self.bands)):
+                self._add(i, self._windowed(i))
+            self.out = quantize_stereo(self.mix, self.amplitude, invert=True)
+            self.mixed = [sweep_key(e, self.samplerate, 1) for e, _, _ in self.bands]
+            self.version += 1
+            return self.out
+        changed = [
+            i for i, (e, _, _) in enumerate(self.bands)
+            if sweep_key(e, self.samplerate, 1) != self.mixed[i]
+        ]
+        if not changed:
+            return self.out
+        # clear the changed bands' samples, then re-add every band overlapping them;
+        # spans of changed bands that touch (a crossfade) are merged first, so
+        # no sample is re-added twice
+        spans = _merge([s for i in changed for s in self._span(i)])
+        for a, b in spans:
+            self.mix[a:b] = 0
+        for i in range(len(self.bands)):
+            overlaps = [
+                (max(a, ca), min(b, cb))
+                for a, b in self._span(i) for ca, cb in spans if max(a, ca) < min(b, cb)
+            ]
+            if not overlaps:
+                continue
+            w = self._windowed(i)
+            for lo, hi in overlaps:
+                # samples lo..hi of the loop are samples of w offset by its start
+                offset = (lo - self.layout[0][i]) % self.layout[4]
+                self.mix[lo:hi] += w[offset : offset + hi - lo]
+        for a, b in spans:
+            quantize_stereo(self.mix[a:b], self.amplitude, out=self.out[a:b], invert=True)
+        for i in changed:
+            self.mixed[i] = sweep_key(self.bands[i][0], self.samplerate, 1)
+        self.version += 1
+        return self.out
+
+
+# --Define a function to merge [a, b) ranges into disjoint ones, in order
+def _merge(spans):
+    merged = []
+    for a, b in sorted(spans):
+        if merged and a <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], b)
+        else:
+            merged.append([a, b])
+    return [tuple(s) for s in merged]
+
+
+_ramps = {}  # n -> raised cosine fade in of n samples
+
+
+# --Define a function to give a raised cosine fade in; ramp + ramp[::-1] == 1
+def _ramp(n):
+    r = _ramps.get(n)
+    if r is None:
+        r = (0.5 - 0.5 * np.cos(np.pi * (np.arange(n) + 0.5) / n)).astype(np.float32)
+        _ramps[n] = r
+    return r
+
+
+# --Define a function to make a playlist of sweep table entries in order
+def table_playlist(indices=None, samplerate=SAMPLERATE, amplitude=AMPLITUDE, gap=0.0, fade=0.0, eq=None):
+    playlist = Playlist(samplerate, amplitude, eq)
+    for i in indices if indices is not None else sorted(sweeps):
+        playlist.add(sweeps[i], gap, fade)
+    return playlist
+
+
+# --Define a function to check incremental renders against fresh full ones
+# Edits one band, adjacent bands, the last band crossfading into the first
+# and all of them, with crossfades and with gaps; each render must equal a new
+# Playlist of the same bands, synthesize only the edited bands, and leave
+# only the waveforms of the current bands cached.
+def selftest(samplerate=SAMPLERATE):
+    ok = True
+    for gap, fade in ((0.0, 0.0005), (0.0005, 0.0), (0.0, 0.0)):
+        for edits in ([1], [1, 2], [4], [4, 0], [0, 1, 2, 3, 4]):
+            playlist = table_playlist(samplerate=samplerate, gap=gap, fade=fade)
+            playlist.render()
+            rendered = playlist.rendered
+            for i in edits:
+                fmin, fmax, T, kind = playlist.bands[i][0]
+                playlist.set(i, [fmin + 500, fmax, T, kind])
+            out = playlist.render()
+            fresh = Playlist(samplerate)
+            for band in playlist.bands:
+                fresh.add(*band)
+            error = int(np.abs(out.astype(int) - fresh.render()).max())
+            good = (
+                error == 0
+                and playlist.rendered - rendered == len(edits)
+                and len(playlist.waves) == len(playlist)
+            )
+            ok = ok and good
+            print("gap %.4f fade %.4f edit bands %-15s max difference %d, synthesized %d, cached %d %s"
+                  % (gap, fade, edits, error, playlist.rendered - rendered, len(playlist.waves),
+                     "OK" if good else "FAILED"))
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main():
+    import wave
+
+    parser = argparse.ArgumentParser(description="Render sweep bands into one looped buffer")
+    parser.add_argument("--bands", type=int, nargs="+", help="sweeps table entries, in order")
+    parser.add_argument("--rate", type=float, default=SAMPLERATE)
+    parser.add_argument("--amplitude", type=int, default=AMPLITUDE)
+    parser.add_argument("--gap", type=float, default=0.0, help="seconds of silence after each band")
+    parser.add_argument("--fade", type=float, default=0.0, help="seconds of crossfade between bands")
+    parser.add_argument("--loops", type=int, default=1, help="copies of the loop in the WAV file")
+    parser.add_argument("-o", "--output", default="playlist.wav")
+    parser.add_argument("--selftest", action="store_true", help="incremental render check")
+    args = parser.parse_args()
+    if args.selftest:
+        raise SystemExit(0 if selftest(args.rate) else 1)
+    playlist = table_playlist(args.bands, args.rate, args.amplitude, args.gap, args.fade)
+    out = playlist.render()
+    with wave.open(args.output, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(int(args.rate))
+        for _ in range(args.loops):
+            w.writeframes(out.astype("<i2", copy=False).tobytes())
+    print("wrote %s: %d bands, %d frames per loop (%.2f ms)"
+          % (args.output, len(playlist), len(out), 1e3 * len(out) / args.rate))
+
+
+if __name__ == "__main__":
+    main()
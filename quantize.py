@@ -0,0 +1,71 @@
+import numpy as np
+
+# ----- Float waveform to interleaved int16 stereo in one pass
+# Scaling, optional gain envelope (e.g. equalize.py), optional Tukey edge
+# taper, optional TPDF dither, rounding,
+# saturation and the inverted copy for the differential right channel are
+# done chunk by chunk in one small float32 scratch buffer and written straight
+# into the (N, 2) int16 output. No full-length temporaries are made, rounding
+# replaces the truncation of astype(np.int16) and values saturate instead of
+# wrapping round (which clicked near full scale).
+
+CHUNK = 16384  # samples per chunk (64 KiB of float32 scratch)
+INT16_MIN = -32768
+INT16_MAX = 32767
+
+
+# --Define a function to give Tukey window values for samples n of an N sample sweep
+# taper is the fraction of the sweep inside the cosine edges (scipy's alpha)
+def tukey(n, N, taper):
+    w = np.ones(len(n), dtype=np.float32)
+    L = taper * (N - 1) / 2  # samples in each cosine edge
+    if L <= 0:
+        return w
+    rise = n < L
+    w[rise] = 0.5 * (1 - np.cos(np.pi * n[rise] / L))
+    fall = n > (N - 1) - L
+    w[fall] = 0.5 * (1 - np.cos(np.pi * ((N - 1) - n[fall]) / L))
+    return w
+
+
+def quantize_stereo(w, amplitude, out=None, invert=True, dither=False, taper=0.0, rng=None, gain=None):
+    N = len(w)
+    if out is None:
+        out = np.empty((N, 2), dtype=np.int16)
+    elif out.shape != (N, 2) or out.dtype != np.int16:
+        raise ValueError("out must be an int16 array of shape %s" % ((N, 2),))
+    if gain is not None and len(gain) != N:
+        raise ValueError("gain must have one value per sample")
+    if dither and rng is None:
+        rng = np.random.default_rng()
+    L = taper * (N - 1) / 2 if taper > 0 else 0
+    s_buf = np.empty(min(N, CHUNK), dtype=np.float32)
+    d_buf = np.empty(min(N, CHUNK), dtype=np.float32) if dither else None
+
+    for start in range(0, N, CHUNK):
+        stop = min(start + CHUNK, N)
+        s = s_buf[: stop - start]
+        np.multiply(w[start:stop], amplitude, out=s, casting="same_kind")
+        if gain is not None:  # a per-sample gain, e.g. an equalization envelope
+            s *= gain[start:stop]
+        # the taper only touches chunks overlapping the edges
+        if L and (start < L or stop - 1 > (N - 1) - L):
+            s *= tukey(np.arange(start, stop), N, taper)
+        if dither:
+            # triangular PDF dither of +-1 LSB: difference of two uniforms
+            d = d_buf[: stop - start]
+            rng.random(dtype=np.float32, out=d)
+            s += d
+            rng.random(dtype=np.float32, out=d)
+            s -= d
+        np.rint(s, out=s)
+        np.minimum(s, INT16_MAX, out=s)
+        np.maximum(s, INT16_MIN, out=s)
+        out[start:stop, 0] = s
+        if invert:
+            np.negative(s, out=s)
+            np.minimum(s, INT16_MAX, out=s)  # -(-32768) saturates
+            out[start:stop, 1] = s
+        else:
+            out[start:stop, 1] = out[start:stop, 0]
+    return out
@@ -0,0 +1,220 @@
+#!/usr/bin/python3
+import argparse
+import cProfile
+import gc
+import io
+import logging
+import logging.handlers
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+# ----- Opt-in profiling and memory tracking for long unattended runs
+# Three kinds of report, each to its own rotating log in one directory
+# (at most max_bytes * (backups + 1) bytes each, so days of running stay
+# within a fixed disk budget):
+#   profile.log   a cProfile window of the event loop every `every` seconds,
+#                 the top functions by cumulative time
+#   memory.log    tracemalloc snapshot diffs against the previous report, the
+#                 top growing lines, plus gauges (gc objects, figures, caches)
+#   handlers.log  per event type handler durations: count, mean, p95, max
+# The event loop calls tick() once per event and handled() after handling
+# one; both only compare times unless a report is due.
+#
+#   SWEEP_GEN_SOAK=/var/log/sweep_gen ./sweep_gen.py
+#   python3 soak.py --summary /var/log/sweep_gen
+
+EVERY = 600.0  # seconds between reports
+WINDOW = 60.0  # seconds of cProfile in each report period
+TOP = 25  # lines per profile or memory report
+MAX_BYTES = 1024 * 1024  # per log file before it rotates
+BACKUPS = 4  # rotated files kept per log
+DURATIONS = 1024  # handler durations kept per event type, for percentiles
+_RECORD = re.compile(r"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3} ", re.M)  # logging asctime
+
+
+# --Define a function to make a logger writing to a rotating file
+def rotating_logger(directory, name, max_bytes=MAX_BYTES, backups=BACKUPS):
+    logger = logging.getLogger("soak." + name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    for h in list(logger.handlers):  # a second profiler replaces the first
+        logger.removeHandler(h)
+        h.close()
+    handler = logging.handlers.RotatingFileHandler(
+        os.path.join(directory, name + ".log"), maxBytes=max_bytes, backupCount=backups)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    logger.addHandler(handler)
+    return logger
+
+
+class SoakProfiler:
+    def __init__(self, directory, every=EVERY, window=WINDOW, top=TOP, names=None, gauges=None,
+                 frames=1, max_bytes=MAX_BYTES, backups=BACKUPS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.every = every
+        self.window = min(window, every)
+        self.top = top
+        self.names = names or {}  # event type -> name in handlers.log
+        self.gauges = gauges or {}  # name -> function giving a number, logged in memory.log
+        self.frames = frames  # traceback depth tracemalloc keeps
+        self.logs = {name: rotating_logger(directory, name, max_bytes, backups)
+                     for name in ("profile", "memory", "handlers")}
+        self.profile = None  # cProfile.Profile while a window is open
+        self.window_end = None
+        self.snapshot = None  # tracemalloc snapshot of the last report
+        self.durations = {}  # event type -> [ring of ms, next slot, count, total ms, max ms]
+        self.started = None
+        self.next_window = None
+        self.next_report = None
+        self.reports = 0
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.snapshot = _snapshot()
+        now = time.monotonic()
+        self.started = now
+        self.next_window = now  # the first window starts at once
+        self.next_report = now + self.every
+        self.logs["memory"].info("start: tracing %d frames, pid %d", self.frames, os.getpid())
+
+    # --Open or close the profile window and write reports when due (event loop)
+    def tick(self, now=None):
+        now = time.monotonic() if now is None else now
+        if now >= self.next_report:  # first, so the window below does not profile it
+            if self.profile is not None:
+                self._profile_report()
+            self.report()
+            self.next_report = now + self.every
+            self.next_window = now
+        if self.profile is None and now >= self.next_window:
+            self.profile = cProfile.Profile()
+            self.profile.enable()  # profiles the calling thread, the event loop
+            self.window_end = now + self.window
+        elif self.profile is not None and now >= self.window_end:
+            self._profile_report()
+            self.next_window = self.next_report
+
+    # --Record how long the handler of an event took, from t0 (monotonic ns)
+    def handled(self, event_type, t0):
+        ms = (time.monotonic_ns() - t0) / 1e6
+        d = self.durations.get(event_type)
+        if d is None:
+            d = [np.zeros(DURATIONS), 0, 0, 0.0, 0.0]
+            self.durations[event_type] = d
+        d[0][d[1]] = ms
+        d[1] = (d[1] + 1) % DURATIONS
+        d[2] += 1
+        d[3] += ms
+        d[4] = max(d[4], ms)
+
+    def _profile_report(self):
+        self.profile.disable()
+        out = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=out)
+        stats.sort_stats("cumulative").print_stats(self.top)
+        self.profile = None
+        self.logs["profile"].info("window of %.1f s\n%s", self.window, out.getvalue())
+
+    # --Write the memory and handler reports, then start new periods
+    def report(self):
+        self.reports += 1
+        snapshot = _snapshot()
+        diffs = snapshot.compare_to(self.snapshot, "lineno")
+        self.snapshot = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        lines = ["report %d after %.0f s: traced %.1f MB (peak %.1f MB), gc objects %d, threads %d"
+                 % (self.reports, time.monotonic() - self.started, current / 1e6, peak / 1e6,
+                    len(gc.get_objects()), threading.active_count())]
+        for name, fn in self.gauges.items():
+            try:
+                lines.append("  %-16s %s" % (name, fn()))
+            except Exception as e:  # a gauge must not stop the unit
+                lines.append("  %-16s failed: %s" % (name, e))
+        lines.append("  top growth since the last report:")
+        for diff in sorted(diffs, key=lambda d: d.size_diff, reverse=True)[: self.top]:
+            lines.append("  %s" % diff)
+        self.logs["memory"].info("\n".join(lines))
+
+        lines = ["handler durations in ms, %d event types" % len(self.durations)]
+        for event_type, (ring, _, count, total, longest) in sorted(self.durations.items()):
+            recent = ring[: min(count, DURATIONS)]
+            lines.append("  %-12s n %7d mean %7.3f p95 %7.3f max %8.3f" % (
+                self.names.get(event_type, event_type), count, total / count,
+                np.percentile(recent, 95), longest))
+        self.logs["handlers"].info("\n".join(lines))
+        self.durations = {}
+
+    def stop(self):
+        if self.profile is not None:
+            self._profile_report()
+        self.report()
+        tracemalloc.stop()
+
+
+# --Define a function to snapshot the traced memory, leaving out tracemalloc's own
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+
+
+# --Define a function to print the last report of each log in a directory
+def summary(directory):
+    for name in ("handlers", "memory", "profile"):
+        path = os.path.join(directory, name + ".log")
+        if not os.path.exists(path):
+            print("no", path)
+            continue
+        with open(path) as f:
+            text = f.read()
+        starts = [m.start() for m in _RECORD.finditer(text)]  # each report starts with its time
+        print("==", path)
+        print(text[starts[-1] :] if starts else text)
+
+
+# --Define a function to check a short run writes all three logs and finds a leak
+def selftest(directory="/tmp/soak_selftest"):
+    profiler = SoakProfiler(directory, every=0.3, window=0.1, top=5,
+                            names={1: "timer1"}, gauges={"leak": lambda: len(leak)})
+    leak = []
+    profiler.start()
+    end = time.monotonic() + 0.7
+    while time.monotonic() < end:
+        t0 = time.monotonic_ns()
+        leak.append(bytearray(10000))  # 10 kB per event, never freed
+        sum(i * i for i in range(2000))
+        profiler.handled(1, t0)
+        profiler.tick()
+        time.sleep(0.005)
+    profiler.stop()
+    sizes = {n: os.path.getsize(os.path.join(directory, n + ".log")) for n in ("profile", "memory", "handlers")}
+    with open(os.path.join(directory, "memory.log")) as f:
+        found = "soak.py" in f.read()  # the leaking line is in the growth list
+    with open(os.path.join(directory, "handlers.log")) as f:
+        timed = "timer1" in f.read()
+    ok = all(sizes.values()) and found and timed
+    print(sizes, "leak found" if found else "leak NOT found", "OK" if ok else "FAILED")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak run profiling reports")
+    parser.add_argument("--summary", metavar="DIR", help="print the last report of each log")
+    parser.add_argument("--selftest", action="store_true", help="short run with a made-up leak")
+    args = parser.parse_args()
+    if args.selftest:
+        raise SystemExit(0 if selftest() else 1)
+    if args.summary:
+        summary(args.summary)
+        return
+    parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import numpy as np
+
+# ----- Spectrogram of a sweep, NumPy only, as a pygame Surface
+# All frames of the STFT are cut from the (zero padded) signal as one strided
+# view, windowed and transformed in a single batched rfft. Levels in dB are
+# mapped to colormap indices and looked up in a precomputed RGB table, then
+# written into the Surface with surfarray; no Matplotlib is involved.
+# Time runs left to right and frequency (0 to samplerate/2) bottom to top.
+
+NFFT = 128  # samples per frame: 1.5 kHz bins at 192 kHz, a 4 ms sweep has 768
+DB_RANGE = 60.0  # dB shown below the peak
+
+# colormap anchors (position, R, G, B): black through purple, red and orange to yellow
+_ANCHORS = np.array([
+    [0.00, 0, 0, 4],
+    [0.25, 87, 16, 110],
+    [0.50, 188, 55, 84],
+    [0.75, 249, 142, 9],
+    [1.00, 252, 255, 164],
+])
+COLORMAP = np.stack(
+    [np.interp(np.linspace(0, 1, 256), _ANCHORS[:, 0], _ANCHORS[:, c]) for c in (1, 2, 3)],
+    axis=1,
+).astype(np.uint8)  # 256 x RGB lookup table
+
+_windows = {}  # nfft -> Hann window
+
+
+def hann(nfft):
+    w = _windows.get(nfft)
+    if w is None:
+        w = np.hanning(nfft).astype(np.float32)
+        _windows[nfft] = w
+    return w
+
+
+# --Define a function to give STFT levels in dB, shape (frames, nfft // 2 + 1)
+# frames are hop samples apart, centred on samples 0, hop, 2*hop, ...
+def stft_db(x, nfft=NFFT, hop=None, frames=None):
+    x = np.asarray(x, dtype=np.float32)
+    pad = nfft // 2
+    padded = np.zeros(len(x) + 2 * pad, dtype=np.float32)
+    padded[pad : pad + len(x)] = x
+    if hop is None:
+        hop = max(1, len(x) // (frames or 256))
+    view = np.lib.stride_tricks.sliding_window_view(padded, nfft)[: len(x) : hop]
+    spec = np.fft.rfft(view * hann(nfft), axis=1)
+    power = spec.real**2 + spec.imag**2
+    return 10 * np.log10(power + 1e-12)
+
+
+# --Define a function to map levels to colormap indices, the peak at 255
+def db_to_index(db, db_range=DB_RANGE):
+    top = db.max()
+    scaled = (db - (top - db_range)) * (255.0 / db_range)
+    np.clip(scaled, 0, 255, out=scaled)
+    return scaled.astype(np.uint8)
+
+
+# --Define a function to give the spectrogram of x as a (width, height, 3) RGB array
+# The layout surfarray uses: first index x (time), second y (frequency, top = high)
+def spectrogram_rgb(x, size, nfft=NFFT, db_range=DB_RANGE):
+    width, height = size
+    index = db_to_index(stft_db(x, nfft, frames=width), db_range)  # (frames, bins)
+    # nearest frame for each column, nearest bin for each row (flipped: high at the top)
+    cols = np.minimum((np.arange(width) * len(index)) // width, len(index) - 1)
+    rows = ((height - 1 - np.arange(height)) * index.shape[1]) // height
+    return COLORMAP[index[np.ix_(cols, rows)]]
+
+
+# --Define a function to render the spectrogram into a new pygame Surface
+def spectrogram_surface(x, size, nfft=NFFT, db_range=DB_RANGE):
+    import pygame.surfarray
+
+    return pygame.surfarray.make_surface(spectrogram_rgb(x, size, nfft, db_range))
@@ -1,20 +1,33 @@
 #!/usr/bin/python3
-from scipy.signal import chirp
-import numpy as np
-import matplotlib.backends.backend_agg as agg
 import time
+
+Boot_t0 = time.perf_counter()  # start of the startup-time report
+import numpy as np
+from collections import OrderedDict, deque
 import os
 import sys
 from decimal import Decimal  # needed to do correct temperature adjustment
 import pygame
 from pygame.locals import *
 from pygame import event, fastevent  # fastevent is for multithreaded posts
-import RPi.GPIO as GPIO
-import matplotlib.pyplot as plt
-import matplotlib
-from chirp3 import lchirp
+from sweepcore import sweeps, sweep_key, sweep_wave, snap_delay, SAMPLERATE, AMPLITUDE
+from wavecache import WaveCache
+from sweepbank import SweepBank
+from burst import burst_buffer, JitterMeter
+from telemetry import LatencyTrace, INTERVALS
+from worker import JobWorker
+from audioout import BlockPlayer, DeviceSink
+from spectro import spectrogram_surface
+from playlist import table_playlist
+from control import ControlServer, SOCKET_PATH
+from chirpgen import SWEEP_TYPES
+from emitlog import EmitLog
+from equalize import load_calibration
+from soak import SoakProfiler
+from align import split_frame
 
-matplotlib.use("Agg")
+# RPi.GPIO is imported by the main programme and Matplotlib (graph.py) on the
+# first graph, so importing this module needs neither
 
 Debugprt = True  # if True, some debug printing will be enabled
 
@@ -50,14 +63,6 @@ splash_screen = {
     0: [(LCD_HEIGHT / 30) / 2, 25, 30, "couriernew", "Sweep Generator ..."]
 }
 
-sweeps = {
-    0: [18000, 34000, 0.004],
-    1: [7000, 17000, 0.004],
-    2: [12000, 24000, 0.004],
-    3: [4000, 10000, 0.004],
-    4: [48000, 78000, 0.004],
-}
-
 # Define the Sweep screen for normal mode
 sweep_screen = {
     0: [0.2, 28, 4, "arial", "Sweep Parameters"],
@@ -117,6 +122,27 @@ button_menu2 = {
 }
 
 
+# Define the latency statistics screen, filled in by show_stats
+# (median / 95th percentile / max in ms per stage of button 1 -> audio)
+stats_screen = {
+    0: [0.1, 20, 4, "DejavuSansMono", "Latency ms  med/p95/max"],
+    1: [1.3, 16, 4, "DejavuSansMono", ""],
+    2: [2.3, 16, 4, "DejavuSansMono", ""],
+    3: [3.3, 16, 4, "DejavuSansMono", ""],
+    4: [4.3, 16, 4, "DejavuSansMono", ""],
+    5: [5.3, 16, 4, "DejavuSansMono", ""],
+    6: [6.3, 16, 4, "DejavuSansMono", ""],
+    7: [7.6, 16, 4, "DejavuSansMono", ""],
+    8: [8.6, 16, 4, "DejavuSansMono", ""],
+    9: [9.6, 16, 4, "DejavuSansMono", ""],
+    10: [10.6, 16, 4, "DejavuSansMono", ""],
+    11: [11.6, 16, 4, "DejavuSansMono", ""],
+    12: [12.6, 16, 4, "DejavuSansMono", ""],
+    13: [13.6, 16, 4, "DejavuSansMono", ""],
+}
+stats_names = ["gpio>evt", "evt>gen", "generate", "make snd", "snd>play", "total"]
+
+
 def set_run():
     global Run, button_menu1
     if Run:
@@ -133,6 +159,14 @@ def set_brush():
         button_menu1[3][4] = "Continue->"
 
 
+def set_playlist():
+    global Playmode, button_menu1
+    if Playmode:
+        button_menu1[2][4] = "Playlist->"
+    else:
+        button_menu1[2][4] = "  Single->"
+
+
 # --Define a function to turn GPIO PiTFT button events into Pygame events using fastevent
 # Note: This function runs in a separate thread from the main programme.
 # Note: using pygame.event.post causes "video system not initialized" error
@@ -140,14 +174,15 @@ def set_brush():
 
 
 def gpiobut(channel):
+    t = time.monotonic_ns()  # when the press reached us, for latency telemetry
     if channel == 17:  # check for button 1
-        fastevent.post(pygame.event.Event(pygame.USEREVENT + 3, button=1))
+        fastevent.post(pygame.event.Event(pygame.USEREVENT + 3, button=1, t=t))
     elif channel == 22:  # check for button 2
-        fastevent.post(pygame.event.Event(pygame.USEREVENT + 3, button=2))
+        fastevent.post(pygame.event.Event(pygame.USEREVENT + 3, button=2, t=t))
     elif channel == 23:  # check for button 3
-        fastevent.post(pygame.event.Event(pygame.USEREVENT + 3, button=3))
+        fastevent.post(pygame.event.Event(pygame.USEREVENT + 3, button=3, t=t))
     elif channel == 27:  # check for button 4
-        fastevent.post(pygame.event.Event(pygame.USEREVENT + 3, button=4))
+        fastevent.post(pygame.event.Event(pygame.USEREVENT + 3, button=4, t=t))
 
 
 def debug_stop():
@@ -155,88 +190,163 @@ def debug_stop():
     sys.exit()
 
 
-def make_graph():
-    global raw_graph, canvas, chirp_x, chirp_y
-    fig, ax = plt.subplots(figsize=(3.2, 2.4))
-    plt.rcParams["font.size"] = "6"
-    fig.subplots_adjust(left=0.15, bottom=0.15, right=0.97)
-    ax.plot(chirp_x, np.delete(chirp_y, 1, axis=1), "red")
-    ax.plot(chirp_x, np.delete(chirp_y, 0, axis=1), "g")
-    ax.set_xscale("log")
-    plt.xlabel("Time", fontsize=6)
-    ax.xaxis.set_label_coords(0.5, -0.12)
-    plt.ylabel("Amplitude", fontsize=6)
-    ax.yaxis.set_label_coords(-0.13, 0.5)
-    fig.suptitle(
-        "Sweep " + str(sweeps[sweep][0]) + "/" + str(sweeps[sweep][1]),
-        fontsize=8,
-        color="blue",
-        y=0.95,
-    )
-    ax.grid(which="both", linestyle="--")
-    ax.grid(which="minor", alpha=0.2)
-    canvas = agg.FigureCanvasAgg(fig)
-    canvas.draw()
-    renderer = canvas.get_renderer()
-    raw_graph = renderer.tostring_rgb()
+# --Define a function to draw the graph and return (version, RGBA bytes, size)
+# Only one thread draws at a time: the worker, or the caller of make_graph()
+def draw_graph(key, x, y, title):
+    global graph
+    if graph is None:
+        from graph import SweepGraph  # Matplotlib is only loaded when needed
+
+        graph = SweepGraph()  # built once, then only its data changes
+    graph.update(key, x, y, title)
+    return graph.version, graph.rgba, graph.size
+
+
+# --Define a function to draw the graph of the current sweep
+# With background=True it is drawn on the worker thread and job_done() shows it
+def make_graph(background=False):
+    global graph_image
+    title = "Sweep " + sweep_title()
+    key = (chirp_key, title)
+    if background:
+        worker.submit("graph", key, draw_graph, key, chirp_x, chirp_y, title)
+    else:
+        graph_image = draw_graph(key, chirp_x, chirp_y, title)
+
+
+# --Define a function to name what is playing, for graph and spectrogram titles
+def sweep_title():
+    if Playmode:
+        return "playlist of %d bands" % len(playlist)
+    return str(sweeps[sweep][0]) + "/" + str(sweeps[sweep][1]) + " " + sweeps[sweep][3]
 
 
+# --Define a function to show the graph, reusing the surface while it is unchanged
 def show_graph():
-    global raw_graph, canvas
+    global graph_surface, graph_shown, Lcd_lines
+    if graph_image is None:  # the first graph is still being drawn
+        return
+    version, rgba, size = graph_image
+    if graph_shown == version:  # already on the LCD
+        return
+    Lcd_lines = []  # the text screen is gone, redraw it all next time
+    if graph_surface is None or graph_surface[0] != version:
+        graph_surface = (version, pygame.image.fromstring(rgba, size, "RGBA"))
     Lcd.fill(BLACK)
-    size = canvas.get_width_height()
-    graph = pygame.image.fromstring(raw_graph, size, "RGB")
-    Lcd.blit(graph, (0, 0))
+    Lcd.blit(graph_surface[1], (0, 0))
     pygame.display.update()
+    graph_shown = version
+
+
+# --Define a function to show the spectrogram of the current sweep
+# The finished picture, labels included, is kept in the wave cache per sweep
+def show_spectro():
+    global graph_shown, Lcd_lines
+    key = chirp_key + ("spectro", LCD_SIZE)
+    if graph_shown == key:  # already on the LCD
+        return
+    Lcd_lines = []  # the text screen is gone, redraw it all next time
+    surface = wave_cache.get(key)
+    if surface is None:
+        surface = spectrogram_surface(chirp_y[:, 0], LCD_SIZE)
+        nyquist = "%dk" % (samplerate // 2000)
+        surface.blit(render_text(nyquist, "DejavuSansMono", 14, False), (2, 2))
+        surface.blit(render_text("0", "DejavuSansMono", 14, False), (2, LCD_HEIGHT - 16))
+        surface.blit(render_text(sweep_title(), "DejavuSansMono", 14, False), (LCD_WIDTH // 2 - 40, 2))
+        wave_cache.put(key, surface, LCD_WIDTH * LCD_HEIGHT * surface.get_bytesize())
+    Lcd.blit(surface, (0, 0))
+    pygame.display.update()
+    graph_shown = key
+
+
+# --Define a function to get a font, loading each (name, size) only once
+def get_font(name, size):
+    font = font_cache.get((name, size))
+    if font is None:
+        font = pygame.font.SysFont(name, size)
+        font_cache[(name, size)] = font
+    return font
+
+
+# --Define a function to render a line of text, reusing surfaces already rendered
+# The cache is bounded because the time line changes every second
+def render_text(text, name, size, highlite):
+    key = (text, name, size, highlite)
+    textsurface = text_cache.get(key)
+    if textsurface is None:
+        if highlite:
+            textsurface = get_font(name, size).render(text, False, BLACK, WHITE)
+        else:
+            textsurface = get_font(name, size).render(text, False, WHITE, BLACK)
+        text_cache[key] = textsurface
+        if len(text_cache) > Textcachemax:
+            text_cache.popitem(last=False)  # drop the least recently used
+    else:
+        text_cache.move_to_end(key)
+    return textsurface
 
 
 # --Define a function to show a screen of text with button labels
 # Note: text items in the screen dictionary can be changed before displaying
+# Only lines that differ from what is on the LCD are redrawn and pushed to the
+# display; a different screen layout (or anything drawn since) redraws it all.
 def show_text_menu(menuname, highlite, buttons):  # buttons can be None
-    Lcd.fill(BLACK)  # blank the display
+    global Lcd_lines, graph_shown
     # Build button labels first, so menu can overlap on leading blanks
+    items = []  # [(position, text key)] in drawing order
     if buttons != None:  # see if there are buttons to show
-        line = 0  # reset our line count for the labels
         for line in buttons:  # go through the  button line vslues
             linedata = buttons[line]
-            myfont = pygame.font.SysFont(
-                linedata[3], linedata[1]
-            )  # use the font selected
-            textsurface = myfont.render(
-                linedata[4], False, WHITE, BLACK
-            )  # write the text
-            # show the text
-            Lcd.blit(textsurface, (linedata[2], linedata[1] * linedata[0]))
-            line = line + 1  # go to the next line
-    # Build the rest of the menu
-    line = 0  # start showing at line zero
+            items.append(
+                ((linedata[2], linedata[1] * linedata[0]),
+                 (linedata[4], linedata[3], linedata[1], False))
+            )
+    # Build the rest of the menu, highlighting a line if within range
     for line in menuname:  # go through the line values
-        # get the value list from the menu dictionary
         linedata = menuname[line]
-        myfont = pygame.font.SysFont(linedata[3], linedata[1])  # use the font selected
-        # Build text and position & highlighting a line, if within range
-        if line == highlite:  # check if we should highlight this line
-            textsurface = myfont.render(
-                linedata[4], False, BLACK, WHITE
-            )  # highlight it
-        else:
-            textsurface = myfont.render(
-                linedata[4], False, WHITE, BLACK
-            )  # no highlight
-        # add the line to the screen
-        Lcd.blit(textsurface, (linedata[2], linedata[1] * linedata[0]))
-        line = line + 1
-    # Show the new screen
-    pygame.display.update()  # show it all
+        items.append(
+            ((linedata[2], linedata[1] * linedata[0]),
+             (linedata[4], linedata[3], linedata[1], line == highlite))
+        )
+    drawn = []  # [(position, text key, rect)] as now shown on the LCD
+    for position, key in items:
+        rect = render_text(*key).get_rect(topleft=position)
+        drawn.append((position, key, rect))
+
+    if [d[0] for d in drawn] != [d[0] for d in Lcd_lines]:
+        # a new screen: draw everything
+        Lcd.fill(BLACK)  # blank the display
+        graph_shown = None
+        for position, key, rect in drawn:
+            Lcd.blit(render_text(*key), position)
+        pygame.display.update()  # show it all
+    else:
+        # same screen: find the lines that changed, old and new extent
+        dirty = []
+        for old, new in zip(Lcd_lines, drawn):
+            if old[1] != new[1]:
+                dirty.append(old[2].union(new[2]))
+        if dirty:
+            for rect in dirty:
+                Lcd.fill(BLACK, rect)
+            # redraw every line touching a dirty area, in the original order
+            for position, key, rect in drawn:
+                if rect.collidelist(dirty) != -1:
+                    Lcd.blit(render_text(*key), position)
+            pygame.display.update(dirty)  # push just those areas
+    Lcd_lines = drawn
 
 
 # --Define a function to show the Sweep/times in text
 def show_menu():  # shows menu
-    Lcd.fill(BLACK)  # blank the display
     # update menu text in dictionary
+    sweep_screen[0][4] = Output_error or "Sweep Parameters"  # why the output stopped, if it did
     sweep_screen[1][4] = str.format("Start = " + "%.1f" % sweeps[sweep][0] + " Hz")
     sweep_screen[2][4] = str.format("Stop = " + "%.1f" % sweeps[sweep][1] + " Hz")
     sweep_screen[3][4] = str.format("Duration = " + str(sweeps[sweep][2]) + " s")
+    sweep_screen[4][4] = str.format("Sweep type = " + sweeps[sweep][3])
+    if Playmode:
+        sweep_screen[4][4] = "Playlist, %d bands" % len(playlist)
     sweep_screen[5][4] = str.format("%.1f" % sweeps[sweep][0] + " Hz")
     sweep_screen[6][4] = str.format("%.1f" % sweeps[sweep][1] + " Hz")
     sweep_screen[7][4] = str.format(
@@ -245,13 +355,42 @@ def show_menu():  # shows menu
     show_text_menu(sweep_screen, None, button_menu1)  # Put it on the screen
 
 
-# --Define a function to flip between temperature and graph displays
+# --Define a function to show the latency statistics and histogram
+def show_stats():
+    summary = latency.summary()
+    for line, interval in enumerate(INTERVALS):
+        if interval in summary:
+            stats_screen[line + 1][4] = "%-8s %5.2f/%5.2f/%5.2f" % ((stats_names[line],) + summary[interval])
+        else:
+            stats_screen[line + 1][4] = "%-8s  -" % stats_names[line]
+    # total latency histogram as text bars, one line per bin
+    counts, edges = latency.histogram(("gpio", "play"), bins=6)
+    top = max(1, counts.max())
+    for i in range(6):
+        bar = "#" * int(round(14 * counts[i] / top))
+        stats_screen[7 + i][4] = "%6.2f %-14s %3d" % (edges[i], bar, counts[i])
+    if player is not None:  # underruns and xruns of the block player
+        out = player.stats()
+        stats_screen[13][4] = "urun %d xrun %d %5.1fms" % (out["underruns"], out["xruns"], out["latency_ms"])
+    else:
+        stats_screen[13][4] = "output: mixer"
+    show_text_menu(stats_screen, None, None)
+
+
+# --Define a function to flip between temperature, graph and statistics displays
 def show_flip():
     global Displayshow  # make this global
     if Displayshow == Displaytemp:  # if showing the temps,
         Displayshow = Displaygraph  # switch to showing a graph
-        make_graph()  # get a current graph right now
-        show_graph()  # put it on the screen
+        make_graph(background=True)  # get a current graph drawn
+        show_graph()  # put the last one up until it arrives
+    elif Displayshow == Displaygraph:  # from the graph,
+        Displayshow = Displayspectro  # switch to the spectrogram
+        show_spectro()
+    elif Displayshow == Displayspectro:  # from the spectrogram,
+        Displayshow = Displaystats  # switch to the latency statistics
+        latency.dump(Latencyfile)  # and keep a copy of the traces
+        show_stats()
     else:  # otherwise,
         Displayshow = Displaytemp  # switch to showing temps
         show_menu()  # show the temps right now
@@ -265,21 +404,485 @@ def Do_ttimer_updates():
     Secx = Updtimex % 60  # get remainder secs elapsed
 
 
+# --Define a function to make a mixer Sound, or nothing when the block player is used
+def make_sound(samples):
+    if Backend != "mixer":
+        return None
+    return pygame.sndarray.make_sound(samples)
+
+
 def sweep_gen():
-    global chirp_x, chirp_y, g_amplitude, sound
-    T = sweeps[sweep][2]
-    N = int(samplerate * T)
-    chirp_x = np.arange(0, int(T * samplerate)) / samplerate
-    tmin = 0
-    tmax = T
-    w0 = lchirp(N, tmin=tmin, tmax=tmax, fmin=sweeps[sweep][0], fmax=sweeps[sweep][1],zero_phase_tmin=True, cos=False)
-    w180 = w0 * -1
-    chirp_y = np.column_stack((w0, w180))
-
-    chirp_y = chirp_y * g_amplitude
-    chirp_y = chirp_y.astype(np.int16)
-    # chirp_y = np.repeat(chirp_y.reshape(len(chirp_y), 1), 2, axis=1)
-    sound = pygame.sndarray.make_sound(chirp_y)
+    global chirp_x, chirp_y, chirp_key, g_amplitude, sound
+    latency.mark("gen_start")
+    if Playmode:
+        playlist_gen()
+        return
+    # Reuse the Sound and samples if this sweep was already built
+    key = sweep_key(sweeps[sweep], samplerate, g_amplitude, Dither, Taper, eq, Startdelay)
+    chirp_key = key
+    cached = wave_cache.get(key)
+    if cached is not None:
+        sound, chirp_x, chirp_y = cached
+        latency.mark("gen_end")
+        latency.mark("sound")
+        if Debugprt == True:
+            print("Sweep cache hit", wave_cache.stats())
+        return
+    chirp_y = None
+    if bank is not None and not Dither and not Taper and eq is None and not Startdelay:
+        chirp_y = bank.get(sweeps[sweep], samplerate, g_amplitude)
+    if chirp_y is not None:
+        # a view into the memory mapped bank file, given straight to the mixer
+        chirp_x = np.arange(0, len(chirp_y)) / samplerate
+        latency.mark("gen_end")
+        sound = pygame.mixer.Sound(buffer=chirp_y) if Backend == "mixer" else None
+        latency.mark("sound")
+        nbytes = chirp_y.nbytes + chirp_x.nbytes  # the bank pages are file backed
+    else:
+        chirp_x, chirp_y = sweep_wave(sweeps[sweep], samplerate, g_amplitude, Dither, Taper, eq=eq,
+                                     delay=Startdelay)
+        latency.mark("gen_end")
+        sound = make_sound(chirp_y)
+        latency.mark("sound")
+        # the Sound holds its own copy of the samples, so count both
+        nbytes = 2 * chirp_y.nbytes + chirp_x.nbytes
+    wave_cache.put(key, (sound, chirp_x, chirp_y), nbytes)
+    if Debugprt == True:
+        print("Sweep cache miss", wave_cache.stats())
+
+
+# --Define a function to install the playlist: every band in one looped buffer
+# Only bands changed since the last render are synthesized again (playlist.py)
+def playlist_gen():
+    global chirp_x, chirp_y, chirp_key, sound
+    key = playlist.key()
+    chirp_key = key
+    cached = wave_cache.get(key)
+    if cached is None:
+        y = playlist.render().copy()  # the playlist re-renders in place
+        x = np.arange(0, len(y)) / samplerate
+        cached = (make_sound(y), x, y)
+        wave_cache.put(key, cached, 2 * y.nbytes + x.nbytes)
+    sound, chirp_x, chirp_y = cached
+    latency.mark("gen_end")
+    latency.mark("sound")
+
+
+# --Define a function to tell if a sweep can be had without synthesizing it
+def sweep_ready(key):
+    if key in wave_cache:
+        return True
+    if bank is None or Dither or Taper or eq is not None or Startdelay:  # the bank holds flat sweeps
+        return False
+    return bank.get(sweeps[sweep], samplerate, g_amplitude) is not None
+
+
+# --Define a function to get the current sweep ready without blocking the event loop
+# Cache and bank hits are installed at once (returns True); otherwise the sweep
+# is synthesized on the worker thread and sweep_done() installs it (returns False).
+def sweep_prepare():
+    global sweep_wanted
+    key = sweep_key(sweeps[sweep], samplerate, g_amplitude, Dither, Taper, eq, Startdelay)
+    sweep_wanted = key
+    if Playmode or sweep_ready(key):  # a playlist of table bands renders in milliseconds
+        sweep_gen()
+        return True
+    latency.mark("gen_start")
+    if not worker.pending("prefetch", key):  # otherwise it is on its way already
+        worker.submit("sweep", key, sweep_wave, sweeps[sweep], samplerate, g_amplitude, Dither, Taper, None, eq,
+                      Startdelay)
+    return False
+
+
+# --Define a function to start synthesizing the selected sweep before it is played
+# Only the latest selection is kept in the queue, so stepping through the
+# sweeps with button 2 does not pile up work.
+def sweep_prefetch():
+    key = sweep_key(sweeps[sweep], samplerate, g_amplitude, Dither, Taper, eq, Startdelay)
+    if Playmode:
+        return
+    if not sweep_ready(key) and not worker.pending("sweep", key):
+        worker.submit("prefetch", key, sweep_wave, sweeps[sweep], samplerate, g_amplitude, Dither, Taper, None, eq,
+                      Startdelay)
+
+
+# --Define a function to take a synthesized sweep from the worker
+# The Sound is made here on the main thread and the sweep cached, wanted or not;
+# it is only installed (and played) if button 1 is still waiting for it.
+def sweep_done(key, result, error):
+    global chirp_x, chirp_y, chirp_key, sound, Pending_play, Run
+    wanted = key == sweep_wanted and Pending_play and Run
+    if error is not None:
+        print("Sweep synthesis failed:", error)
+        if wanted:
+            Pending_play = False
+            latency.cancel()
+            Run = False
+            set_run()
+            show_menu()
+        return
+    x, y = result
+    if wanted:
+        latency.mark("gen_end")
+    new_sound = make_sound(y)
+    # the Sound holds its own copy of the samples, so count both
+    wave_cache.put(key, (new_sound, x, y), 2 * y.nbytes + x.nbytes)
+    if Debugprt == True:
+        print("Sweep ready from worker", wave_cache.stats())
+    if wanted:
+        latency.mark("sound")
+        sound, chirp_x, chirp_y, chirp_key = new_sound, x, y, key
+        output_start()
+
+
+# --Define a function to take a finished job from the worker (USEREVENT+5)
+def job_done(event):
+    global graph_image
+    worker.collect(event.job, event.key)
+    if event.job == "graph":
+        if event.error is not None:
+            print("Graph drawing failed:", event.error)
+            return
+        graph_image = event.result
+        if Displayshow == Displaygraph:  # still wanted on the screen
+            show_graph()
+    else:
+        sweep_done(event.key, event.result, event.error)
+
+
+# --Define a function to hand a finished job to the event loop; runs on the worker thread
+def post_job(kind, key, result, error):
+    fastevent.post(pygame.event.Event(USEREVENT + 5, job=kind, key=key, result=result, error=error))
+
+
+# --Define a function to give the key of what button 1 or fire would play now
+def current_key():
+    if Playmode:
+        return playlist.key()
+    return sweep_key(sweeps[sweep], samplerate, g_amplitude, Dither, Taper, eq, Startdelay)
+
+
+# --Define a function to run one control socket command and return its reply
+# t is when the command arrived and t_event when the event loop took it
+def control_command(name, args, t, t_event):
+    global sweep, Fires, Startdelay
+    if name == "error":
+        raise ValueError(args[0])
+    if name == "select":
+        if args[0] not in sweeps:
+            raise ValueError("no sweep %d" % args[0])
+        sweep = args[0]
+        return {"sweep": sweep}
+    if name == "define":
+        index, fmin, fmax, T, kind = args
+        if not 0 <= index <= len(sweeps):  # button 2 steps through 0 .. len - 1
+            raise ValueError("sweep index must be 0 to %d" % len(sweeps))
+        if kind not in SWEEP_TYPES:
+            raise ValueError("unknown sweep type: " + kind)
+        if not np.all(np.isfinite((fmin, fmax, T))):
+            raise ValueError("fmin, fmax and T must be finite numbers")
+        if not 2 / samplerate <= T <= Maxsweep or min(fmin, fmax) < 0 or max(fmin, fmax) > samplerate / 2:
+            raise ValueError("need 2 samples <= T <= %g s and 0 <= f <= samplerate/2" % Maxsweep)
+        if kind != "lin" and min(fmin, fmax) <= 0:
+            raise ValueError(kind + " sweep needs fmin and fmax above 0 Hz")
+        # Brush mode repeats the sweep, or the whole playlist, every period
+        period = int(round(samplerate / Burstrate))
+        if int(samplerate * T) > period:
+            raise ValueError("a %g s sweep does not fit the %g s Brush period" % (T, period / samplerate))
+        entry = [fmin, fmax, T, kind]
+        old = sweeps.get(index)
+        if old is None:
+            playlist.add(entry)
+        else:
+            playlist.set(index, entry)  # only this band is rendered again
+        frames = playlist.frames()
+        if frames > period:  # put the playlist back as it was
+            if old is None:
+                playlist.remove(index)
+            else:
+                playlist.set(index, old)
+            raise ValueError("the playlist would be %.4f s, longer than the %g s Brush period"
+                             % (frames / samplerate, period / samplerate))
+        sweeps[index] = entry
+        return {"sweep": index}
+    if name == "arm":
+        if current_key() != chirp_key:
+            sweep_gen()
+        return {"armed": chirp_key}
+    if name == "fire":
+        if Run:
+            raise ValueError("output is on (button 1)")
+        control_latency.begin(t, t_event)
+        if current_key() != chirp_key:  # not armed: generate it now
+            sweep_gen()
+        if Backend == "mixer":
+            sound.play()
+        else:
+            player.play(chirp_y)
+        control_latency.mark("play")
+        control_latency.end()
+        log_emission("fire")
+        Fires += 1
+        return {"fired": Fires, "latency_ms": (time.monotonic_ns() - t) / 1e6}
+    if name == "offset":
+        if args[0] < 0:
+            raise ValueError("offset must be 0 or more samples")
+        Startdelay = snap_delay(args[0])
+        return {"offset": Startdelay}
+    if name == "fire_at":
+        return fire_at(args[0])
+    # state
+    summary = control_latency.summary().get(("gpio", "play"))
+    return {
+        "sweep": sweep,
+        "entry": list(sweeps[sweep]),
+        "sweeps": len(sweeps),
+        "run": Run,
+        "brush": Brush,
+        "playlist": Playmode,
+        "armed": current_key() == chirp_key,
+        "fires": Fires,
+        "offset": Startdelay,
+        "latency_ms": summary,  # (median, p95, max) receipt to play, last 256 fires
+    }
+
+
+# --Define a function to play the selected sweep once, starting at wall clock time
+# T_ns (Unix ns, see control.wall_ns). The block player turns it into a
+# fractional output frame; the whole frames are padding before the sweep and
+# the fraction (plus Startdelay) is rendered into the sweep itself to 1/64
+# sample. Units then line up as well as their wall clocks agree, give or take
+# the few tens of ns reading the wall clock against the monotonic one takes.
+def fire_at(T_ns):
+    global Fires
+    if Backend == "mixer":
+        raise ValueError("fire_at needs the stream output backend")
+    if Run:
+        raise ValueError("output is on (button 1)")
+    if Playmode:
+        raise ValueError("fire_at plays single sweeps, not the playlist")
+    # T_ns on the monotonic clock, the wall clock read between two monotonic reads
+    m0 = time.monotonic_ns()
+    wall = time.time_ns()
+    m1 = time.monotonic_ns()
+    t_ns = T_ns - wall + (m0 + m1) // 2
+    start, delay = split_frame(player.frame_at(t_ns) + Startdelay)
+    key = sweep_key(sweeps[sweep], samplerate, g_amplitude, Dither, Taper, eq, delay)
+    cached = wave_cache.get(key)
+    if cached is None:
+        x, y = sweep_wave(sweeps[sweep], samplerate, g_amplitude, Dither, Taper, eq=eq, delay=delay)
+        cached = (None, x, y)
+        wave_cache.put(key, cached, y.nbytes + x.nbytes)
+    player.play_at(cached[2], start)
+    log_emission("fire", at=t_ns)
+    Fires += 1
+    return {"fired": Fires, "frame": start, "delay": delay, "lead_ms": (t_ns - time.monotonic_ns()) / 1e6}
+
+
+# --Define a function to answer a batch of control socket commands (USEREVENT+6)
+# The screen is brought up to date once for the whole batch
+def control_batch(event, t_event):
+    replies = []
+    for name, args in event.commands:
+        try:
+            reply = {"ok": True}
+            reply.update(control_command(name, args, event.t, t_event))
+        except (ValueError, KeyError) as e:
+            reply = {"ok": False, "error": str(e)}
+        replies.append(reply)
+    event.reply.put(replies)
+    if Displayshow == Displaytemp:
+        show_menu()
+
+
+# --Define a function to hand a batch of commands to the event loop; runs on a client thread
+def post_control(commands, reply, t):
+    fastevent.post(pygame.event.Event(USEREVENT + 6, commands=commands, reply=reply, t=t))
+
+
+# --Define a function to start soak run profiling, with this programme's gauges
+def soak_start():
+    global soak
+    names = {
+        USEREVENT + 1: "graph timer", USEREVENT + 2: "1 s timer", USEREVENT + 3: "button",
+        USEREVENT + 4: "burst end", USEREVENT + 5: "worker job", USEREVENT + 6: "control",
+        MOUSEBUTTONDOWN: "touch",
+    }
+    gauges = {
+        "wave cache": lambda: wave_cache.stats(),
+        "text cache": lambda: len(text_cache),
+        # pyplot figures never closed would pile up here (graph.py uses none)
+        "figures": lambda: len(sys.modules["matplotlib.pyplot"].get_fignums())
+        if "matplotlib.pyplot" in sys.modules else 0,
+        "worker jobs": lambda: sum(len(jobs) for jobs in worker.jobs.values()),
+        "emissions": lambda: emit_log.stats() if emit_log is not None else None,
+    }
+    soak = SoakProfiler(Soakdir, names=names, gauges=gauges)
+    soak.start()
+
+
+# --Define a function to record how long startup has taken so far
+def boot_mark(stage):
+    Boot_marks.append((stage, time.perf_counter()))
+
+
+# --Define a function to report where the startup seconds went
+def boot_report(path=None):
+    lines = []
+    last = Boot_t0
+    for stage, t in Boot_marks:
+        lines.append("%-24s %7.3f s  (at %7.3f s)" % (stage, t - last, t - Boot_t0))
+        last = t
+    report = "\n".join(["Startup time by stage:"] + lines)
+    if Debugprt == True:
+        print(report)
+    if path is not None:
+        with open(path, "w") as f:
+            f.write(report + "\n")
+    return report
+
+
+# --Define a function to start Brush mode bursts at Burstrate per second
+# The bursts are looped from one buffer and the next copy is queued on the
+# channel end event, so the spacing does not depend on the event loop.
+def burst_start():
+    global burst_sound, burst_channel, burst_periods, burst_period
+    key = chirp_key + ("burst", Burstrate)
+    cached = wave_cache.get(key)
+    if cached is None:
+        buf, periods, period = burst_buffer(chirp_y, samplerate, Burstrate)
+        cached = (make_sound(buf), buf, periods, period)
+        wave_cache.put(key, cached, 2 * buf.nbytes)
+    burst_sound, buf, burst_periods, burst_period = cached
+    burst_jitter.reset(nominal=burst_period / samplerate, periods=burst_periods)
+    if Backend != "mixer":  # the player loops the buffer itself, no end events
+        player.play(buf, loop=True, marks=True)  # each pass is logged by log_passes()
+        return
+    burst_channel = burst_sound.play()
+    log_bursts(time.monotonic_ns())
+    if burst_channel is not None:
+        burst_channel.set_endevent(USEREVENT + 4)
+        burst_channel.queue(burst_sound)
+
+
+# --Define a function to keep the burst loop going on the channel end event
+def burst_next():
+    if burst_channel is not None and Brush and Run:
+        burst_jitter.mark()
+        log_bursts(time.monotonic_ns())  # the queued copy has just started
+        log_passes()
+        if burst_channel.get_queue() is None:
+            burst_channel.queue(burst_sound)
+        if Debugprt == True and len(burst_jitter.intervals) % 20 == 1:
+            print("Burst jitter", burst_jitter.stats())
+
+
+# --Define a function to give the emission log fields of the current sound:
+# (sweep, fmin, fmax, duration, amplitude)
+def emission_fields():
+    if Playmode:
+        bands = [band[0] for band in playlist.bands]
+        return -1, min(b[0] for b in bands), max(b[1] for b in bands), len(chirp_y) / samplerate, g_amplitude
+    fmin, fmax, T, kind = sweeps[sweep]
+    return sweep, fmin, fmax, T, g_amplitude
+
+
+# --Define a function to log the sweep that has just gone out (emitlog.py)
+# or that will at monotonic ns `at`; fields default to the current sound's
+def log_emission(mode, at=None, fields=None):
+    if emit_log is None:
+        return
+    emit_log.emit(*(fields or emission_fields()), mode, at)
+
+
+# --Define a function to queue the emissions of one pass of the looped sound,
+# starting at monotonic ns t. In Brush mode a pass is a buffer of burst_periods
+# bursts, each at its own time. The sound is the one output_start() started
+# (playing), whatever the buttons say since.
+def log_bursts(t):
+    brush, fields = playing
+    if not brush:
+        emissions.append((t, "continuous", fields))
+        return
+    for k in range(burst_periods):
+        emissions.append((t + int(k * burst_period * 1e9 / samplerate), "brush", fields))
+
+
+# --Define a function to log the loop passes started since the last call
+# The block player notes the frame each pass starts on; the mixer gives no
+# event per pass of a continuous loop, so those are counted from its start.
+# (Brush mode with the mixer queues each buffer on the channel end events.)
+# Only emissions already handed to the output are logged, so a stop part way
+# through a buffer leaves out the bursts that never went out.
+def log_passes():
+    global loop_clock
+    until = time.monotonic_ns()
+    if player is not None:
+        while player.passes:
+            log_bursts(player.time_at(player.passes.popleft()))
+        if player.clock is not None:
+            until = player.time_at(player.position)  # the end of what the sink has taken
+    if loop_clock is not None:
+        t0, frames, done = loop_clock
+        started = int((until - t0) * samplerate / (frames * 1e9)) + 1  # passes begun
+        for k in range(done, started):
+            emissions.append((t0 + int(k * frames * 1e9 / samplerate), "continuous", playing[1]))
+        loop_clock = (t0, frames, started)
+    while emissions and emissions[0][0] <= until:
+        t, mode, fields = emissions.popleft()
+        log_emission(mode, t, fields)
+
+
+# --Define a function to start the current sound, as a burst loop or continuously
+def output_start():
+    global Pending_play, loop_clock, playing, Output_error
+    Pending_play = False
+    playing = (Brush, emission_fields())
+    if Brush:
+        try:
+            burst_start()
+        except ValueError as e:  # the sweep (or playlist) is longer than the burst period
+            output_failed(e, "Too long for Brush")
+            return
+    elif Backend == "mixer":
+        sound.play(-1)
+        loop_clock = (time.monotonic_ns(), len(chirp_y), 0)
+    else:
+        player.play(chirp_y, loop=True, marks=True)
+    latency.mark("play")
+    latency.end()
+    Output_error = None
+    log_passes()  # the first pass, unless the player has yet to take it
+
+
+# --Define a function to turn the output off when it cannot start, and say why
+# on the sweep screen (message is short enough for its title line)
+def output_failed(error, message):
+    global Pending_play, Run, Output_error
+    print("Output failed:", error)
+    Pending_play = False
+    latency.cancel()
+    Run = False
+    set_run()
+    Output_error = message
+    if Displayshow == Displaytemp:
+        show_menu()
+
+
+# --Define a function to stop whatever is playing
+def output_stop():
+    global burst_channel, loop_clock
+    if burst_channel is not None:
+        burst_channel.set_endevent()
+        burst_channel.stop()
+        burst_channel = None
+    if Backend == "mixer":
+        sound.stop()
+    else:
+        player.stop()
+    log_passes()  # the passes begun before the stop
+    emissions.clear()  # the rest never went out
+    loop_clock = None
 
 
 # ----- Begin Main Programme
@@ -287,318 +890,447 @@ def sweep_gen():
 LCD_WIDTH = 320  # the width of the PiTFT in pixels
 LCD_HEIGHT = 240  # the height of the PiTFT in pixels
 LCD_SIZE = (LCD_WIDTH, LCD_HEIGHT)  # make it into a tuple for later
-# Setup SDL system variables to use the PiTFT
-os.putenv("SDL_FBDEV", "/dev/fb1")  # specify device as frame buffer1
-os.putenv("SDL_MOUSEDRV", "TSLIB")  # TSLIB doesn't work too well with Stretch
-# Mouse is PiTFT touchscreen
-os.putenv("SDL_MOUSEDEV", "/dev/input/touchscreen")
-os.putenv("SDL_AUDIODRIVER", "alsa")
-
 sweep = 0
 Run = False
 Brush = True
-samplerate = 192000.0
-# samplerate = 384000.0
+samplerate = SAMPLERATE
 blocksize = 1024 * 4
-g_amplitude = 17750  # 18550 - 3.3V P2P
+Backend = "mixer"  # "mixer" for pygame.mixer, "stream" for the audioout block player
+Streampreset = "lowlatency"  # block player period/buffers, see audioout.PRESETS
+player = None  # audioout.BlockPlayer when Backend is "stream"
+g_amplitude = AMPLITUDE
+Dither = False  # add TPDF dither when quantizing sweeps
+Taper = 0.0  # Tukey edge taper fraction for sweeps, 0 for none
+Eqfile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibration.csv")
+Eqmethod = "envelope"  # or "fir", see equalize.py
+eq = None  # equalize.Calibration if Eqfile exists, None for flat sweeps
+Startdelay = 0.0  # sweeps start this many samples late (fractional), to line units up
 chirp_x = 0
 chirp_y = []
 sound = []
 start_idx = 0
-canvas = 0
-raw_graph = 0
+chirp_key = None
+graph = None  # SweepGraph, made on first use
+graph_image = None  # (graph version, RGBA bytes, size) of the last graph drawn
+graph_surface = None  # (graph version, pygame Surface)
+graph_shown = None  # graph version or spectrogram key on the LCD, None if showing text
 buffer = []
+Burstrate = 1.0  # Brush mode bursts per second, independent of the display timer
+burst_sound = None
+burst_periods = 1  # bursts in the looped buffer
+burst_period = 0  # samples from one burst to the next
+loop_clock = None  # (monotonic ns, frames per pass, passes logged) of the mixer's continuous loop
+playing = (False, None)  # (Brush, emission_fields()) of the looped sound, for the emission log
+emissions = deque()  # (monotonic ns, mode, fields) of looped sweeps queued for the emission log
+burst_channel = None
+burst_jitter = JitterMeter(1.0 / Burstrate)
+Cachebudget = 16 * 1024 * 1024  # bytes of waveforms to keep ready to play
+wave_cache = WaveCache(Cachebudget)
+font_cache = {}  # (font name, size) -> pygame Font
+text_cache = OrderedDict()  # (text, font name, size, highlight) -> rendered Surface
+Textcachemax = 128  # rendered text surfaces to keep
+Lcd_lines = []  # text lines currently on the LCD, see show_text_menu
+worker = JobWorker(post_job)  # sweep synthesis and graph drawing off the event loop
+sweep_wanted = None  # sweep key button 1 is waiting for
+Pending_play = False  # True while button 1 waits for its sweep from the worker
+Playmode = False  # True to loop every sweep table band in turn (button 3)
+playlist = table_playlist(samplerate=samplerate, amplitude=g_amplitude)  # bands in table order
 
-# --Initialize Pygame
-pygame.mixer.pre_init(frequency=int(samplerate), size=-16, channels=2, buffer=blocksize)
-pygame.init()
-pygame.mouse.set_visible(False)
-Lcd = pygame.display.set_mode(LCD_SIZE)
-fastevent.init()  # Initialize fastevents for multithreaded GPIO detect
-pygame.event.set_blocked(pygame.MOUSEMOTION)
-pygame.event.set_blocked(pygame.MOUSEBUTTONUP)
-pygame.font.init()
-
-sweep_gen()
-
-# -Initialize pygame timer events
-# Initialize the pygame time event and variables for recording purposes
-Timeval = 0  # start sample rate at first entry in list
-Tinterval = Timevals[Timeval]  # set the timer interval in msec
-# Define  a pygame user event for the recording timer
-pygame.time.set_timer(USEREVENT + 1, Tinterval * 1000)  # create a timer event #1
-
-# -Initialize a pygame timer event to update the time/temperature display
-Updinterval = 1  # Update interval in sec (may be longer for easier save/hold)
-Updtimex = 0  # Initialize update timer value since start
-pygame.time.set_timer(USEREVENT + 2, Updinterval * 1000)  # create timer event #2
-
-# Show the splash screen - no buttons
-show_text_menu(splash_screen, None, None)
-
-GPIO.setmode(GPIO.BCM)  # use BCM chip's numbering scheme vs. pin numbers
-GPIO.setup(17, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # PiTFT button 1
-GPIO.setup(22, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # PiTFT button 2
-GPIO.setup(23, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # PiTFT button 3
-GPIO.setup(27, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # PiTFT button 4
-# Define GPIO button event handlers for the PiTFT 2423
-GPIO.add_event_detect(17, GPIO.FALLING, callback=gpiobut, bouncetime=300)
-GPIO.add_event_detect(22, GPIO.FALLING, callback=gpiobut, bouncetime=300)
-GPIO.add_event_detect(23, GPIO.FALLING, callback=gpiobut, bouncetime=300)
-GPIO.add_event_detect(27, GPIO.FALLING, callback=gpiobut, bouncetime=300)
-
-# --Initialize main variables
-Minx = 0  # total time since execution started in minutes
-Secx = 0  # leftover seconds for Minx:Secx display
-
+Lcd = None  # the PiTFT display Surface, set up by the main programme
+Bankfile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sweeps.bank")
+bank = None  # SweepBank of pre-rendered sweeps, if Bankfile exists
+Boot_marks = []  # [(stage, perf_counter)] for boot_report
+Bootreport = "/tmp/sweep_gen_startup.txt"  # where the startup-time report goes
 Displaytemp = 1  # value if we're showing temperature
 Displaygraph = 2  # value if we're showing a graph
+Displaystats = 3  # value if we're showing latency statistics
+Displayspectro = 4  # value if we're showing the spectrogram
 Displayshow = Displaytemp  # default to show temperature initially
+latency = LatencyTrace(256)  # button 1 to first audio sample, last 256 presses
+Latencyfile = "/tmp/sweep_gen_latency.csv"  # traces are dumped here from the stats screen
+Control = True  # take commands on the control socket (control.py)
+Controlpath = SOCKET_PATH  # UNIX socket the control server listens on
+Controlport = None  # or a TCP port on localhost instead
+control = None  # ControlServer, started by the main programme
+control_latency = LatencyTrace(256)  # control command receipt to play, last 256 fires
+Fires = 0  # sweeps fired from the control socket
+Output_error = None  # short reason the output last failed to start, shown on the sweep screen
+Maxsweep = 1.0  # longest sweep the control socket may define, s (a stereo int16 sweep is 768 kB/s)
+Emitlogfile = "/tmp/sweep_gen_emissions.log"  # ring of emission records, None for no log
+emit_log = None  # EmitLog, opened by the main programme
+Soakdir = os.environ.get("SWEEP_GEN_SOAK")  # directory for soak run reports (soak.py), None for off
+soak = None  # SoakProfiler when Soakdir is set
+Minx = 0  # total time since execution started in minutes
+Secx = 0  # leftover seconds for Minx:Secx display
+
+# The hardware set up and event loop only run when started as a programme,
+# so the functions and state above can be imported (e.g. by bench.py)
+if __name__ == "__main__":
+    # Setup SDL system variables to use the PiTFT
+    os.putenv("SDL_FBDEV", "/dev/fb1")  # specify device as frame buffer1
+    os.putenv("SDL_MOUSEDRV", "TSLIB")  # TSLIB doesn't work too well with Stretch
+    # Mouse is PiTFT touchscreen
+    os.putenv("SDL_MOUSEDEV", "/dev/input/touchscreen")
+    os.putenv("SDL_AUDIODRIVER", "alsa")
+
+    boot_mark("imports")
+
+    # --Initialize Pygame
+    if Backend == "mixer":
+        pygame.mixer.pre_init(frequency=int(samplerate), size=-16, channels=2, buffer=blocksize)
+    pygame.init()
+    if Backend != "mixer":  # the block player has the sound device to itself
+        pygame.mixer.quit()
+        player = BlockPlayer.preset(DeviceSink(samplerate), Streampreset)
+        player.start()  # fire_at needs the device clock running
+    pygame.mouse.set_visible(False)
+    Lcd = pygame.display.set_mode(LCD_SIZE)
+    fastevent.init()  # Initialize fastevents for multithreaded GPIO detect
+    pygame.event.set_blocked(pygame.MOUSEMOTION)
+    pygame.event.set_blocked(pygame.MOUSEBUTTONUP)
+    pygame.font.init()
+    boot_mark("pygame init")
+
+    # Show the splash screen - no buttons
+    show_text_menu(splash_screen, None, None)
+    boot_mark("splash screen")
+
+    # Map the pre-rendered sweep bank, if one has been built (see sweepbank.py)
+    if os.path.exists(Bankfile):
+        bank = SweepBank(Bankfile)
+        boot_mark("sweep bank")
+
+    # Log every sweep that goes out, to line up with receivers' logs
+    if Emitlogfile is not None:
+        emit_log = EmitLog(Emitlogfile)
+        boot_mark("emission log")
+
+    # Equalize the sweeps for the output chain, if it has been measured
+    if os.path.exists(Eqfile):
+        eq = load_calibration(Eqfile, Eqmethod)
+        playlist = table_playlist(samplerate=samplerate, amplitude=g_amplitude, eq=eq)
+        boot_mark("calibration")
+
+    # Pre-render the first sweep while the splash is up
+    sweep_gen()
+    boot_mark("first sweep")
+
+    # -Initialize pygame timer events
+    # Initialize the pygame time event and variables for recording purposes
+    Timeval = 0  # start sample rate at first entry in list
+    Tinterval = Timevals[Timeval]  # set the timer interval in msec
+    # Define  a pygame user event for the recording timer
+    pygame.time.set_timer(USEREVENT + 1, Tinterval * 1000)  # create a timer event #1
 
-# init timer (sec) for mouse/touch debounce
-Mousetimer = pygame.time.get_ticks() / 1000
-Mousewait = 2  # choose 2 sec between MOUSEDOWN events for touch debounce
-Menumode = False  # Start without a menu
-Mmenuline = 1  # start with line 1 on main menu
-
-################################################
-while True:
-    # ----- Handle events in non-menu mode
-    while Menumode == False:  # loops waiting for events in 'normal' mode
-        event = pygame.fastevent.wait()  # wait for an event object to check
-        # --Handle the recording timer pop 1 event
-        if event.type == pygame.USEREVENT + 1:  # using literal here for timer pop 1
-            # Show graph, if that's the mode we're in
-            if Displayshow == Displaygraph:  # show a graph, if required
-                make_graph()  # build the graph
-                show_graph()  # show the graph
-        # --Handle the time/ display update for timer pop event 2
-        elif event.type == pygame.USEREVENT + 2:  # using literal here for timer pop 2
-            Do_ttimer_updates()  # Update the time/temp display values
-            if Brush and Run:
-                sound.play()
-            if Displayshow == Displaytemp:  # if we're supposed to be showing the temp
-                show_menu()  # Show the new time/temp screen
-        # --Handle a PiTFT button is press - driven by the gpiobut GPIO callback function thread
-        elif (
-            event.type == USEREVENT + 3
-        ):  # check for a PiTFT button press, literal value
-            if Debugprt == True:
-                print("button =", event.button)
-            # --Check for button 1 Output ON/OFF
-            if event.button == 1:  # button 1 = GPIO 17
-                Run = not Run
+    # -Initialize a pygame timer event to update the time/temperature display
+    Updinterval = 1  # Update interval in sec (may be longer for easier save/hold)
+    Updtimex = 0  # Initialize update timer value since start
+    pygame.time.set_timer(USEREVENT + 2, Updinterval * 1000)  # create timer event #2
+
+    import RPi.GPIO as GPIO  # only the real programme needs the PiTFT buttons
+
+    GPIO.setmode(GPIO.BCM)  # use BCM chip's numbering scheme vs. pin numbers
+    GPIO.setup(17, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # PiTFT button 1
+    GPIO.setup(22, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # PiTFT button 2
+    GPIO.setup(23, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # PiTFT button 3
+    GPIO.setup(27, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # PiTFT button 4
+    # Define GPIO button event handlers for the PiTFT 2423
+    GPIO.add_event_detect(17, GPIO.FALLING, callback=gpiobut, bouncetime=300)
+    GPIO.add_event_detect(22, GPIO.FALLING, callback=gpiobut, bouncetime=300)
+    GPIO.add_event_detect(23, GPIO.FALLING, callback=gpiobut, bouncetime=300)
+    GPIO.add_event_detect(27, GPIO.FALLING, callback=gpiobut, bouncetime=300)
+    boot_mark("GPIO")
+
+    # Scripts can select, define, arm and fire sweeps through the control socket
+    if Control:
+        control = ControlServer(post_control, Controlpath, Controlport)
+        control.start()
+        boot_mark("control socket")
+
+    # init timer (sec) for mouse/touch debounce
+    Mousetimer = pygame.time.get_ticks() / 1000
+    Mousewait = 2  # choose 2 sec between MOUSEDOWN events for touch debounce
+    Menumode = False  # Start without a menu
+    Mmenuline = 1  # start with line 1 on main menu
+    set_playlist()
+
+    # Ready: replace the splash with the sweep screen
+    show_menu()
+    boot_mark("ready")
+    if Soakdir:  # profile the event loop for long unattended runs
+        soak_start()
+    boot_report(Bootreport)
+
+    ################################################
+    while True:
+        # ----- Handle events in non-menu mode
+        while Menumode == False:  # loops waiting for events in 'normal' mode
+            event = pygame.fastevent.wait()  # wait for an event object to check
+            t_event = time.monotonic_ns()  # when we got it, for latency telemetry
+            # --Handle the recording timer pop 1 event
+            if event.type == pygame.USEREVENT + 1:  # using literal here for timer pop 1
+                # Show graph, if that's the mode we're in
+                if Displayshow == Displaygraph:  # show a graph, if required
+                    make_graph(background=True)  # job_done() shows it when drawn
+                elif Displayshow == Displayspectro:  # the sweep may have changed
+                    show_spectro()
+            # --Handle the end of a looped burst buffer in Brush mode
+            elif event.type == pygame.USEREVENT + 4:
+                burst_next()
+            # --Handle a finished worker job (a synthesized sweep or a drawn graph)
+            elif event.type == USEREVENT + 5:
+                job_done(event)
+            # --Handle a batch of commands from the control socket
+            elif event.type == USEREVENT + 6:
+                control_batch(event, t_event)
+            # --Handle the time/ display update for timer pop event 2
+            elif event.type == pygame.USEREVENT + 2:  # using literal here for timer pop 2
+                Do_ttimer_updates()  # Update the time/temp display values
+                log_passes()  # the loop passes played since the last pop
+                if Displayshow == Displaytemp:  # if we're supposed to be showing the temp
+                    show_menu()  # Show the new time/temp screen
+                elif Displayshow == Displaystats:
+                    show_stats()
+            # --Handle a PiTFT button is press - driven by the gpiobut GPIO callback function thread
+            elif (
+                event.type == USEREVENT + 3
+            ):  # check for a PiTFT button press, literal value
                 if Debugprt == True:
-                    print("Button 1 Output ", Run)
-                set_run()
-                show_menu()  # show the Output ON/OFF
-                if Run:
-                    sweep_gen()
-                    if Brush:
-                        sound.play(0)
+                    print("button =", event.button)
+                # --Check for button 1 Output ON/OFF
+                if event.button == 1:  # button 1 = GPIO 17
+                    latency.begin(getattr(event, "t", None), t_event)
+                    Run = not Run
+                    if Debugprt == True:
+                        print("Button 1 Output ", Run)
+                    set_run()
+                    show_menu()  # show the Output ON/OFF
+                    if Run:
+                        Pending_play = True
+                        if sweep_prepare():  # otherwise sweep_done() starts it
+                            output_start()
                     else:
-                        sound.play(-1)
-                else:
-                    sound.stop()
-            # --Check for button 2 - Set Sweep parameter
-            elif event.button == 2:  # button 2 = GPIO 22
-                sweep += 1
-                sweep = sweep % len(sweeps)
-                if Debugprt == True:
-                    print("Button 2 set Sweep")
-                    print(sweeps[sweep])
-                if Displayshow == Displaytemp:
+                        Pending_play = False
+                        latency.cancel()
+                        output_stop()
+                # --Check for button 2 - Set Sweep parameter
+                elif event.button == 2:  # button 2 = GPIO 22
+                    sweep += 1
+                    sweep = sweep % len(sweeps)
+                    if Debugprt == True:
+                        print("Button 2 set Sweep")
+                        print(sweeps[sweep])
+                    if Displayshow == Displaytemp:
+                        show_menu()
+                    sweep_prefetch()  # have it ready before button 1 asks for it
+                # --Check for button 3 - one sweep or the playlist of all of them
+                elif event.button == 3:  # button 3 = GPIO 23
+                    if Debugprt == True:
+                        print("Button 3 Playlist ", not Playmode)
+                    if Run and not Pending_play:
+                        output_stop()  # stop the old sound before it is replaced
+                    Playmode = not Playmode
+                    set_playlist()
                     show_menu()
-            # --Check for button 3 - switch to Menu mode
-            elif event.button == 3:  # button 3 = GPIO 23
-                if Debugprt == True:
-                    print("Button 3 switches to Menu mode")
-                # Menumode = True  # Turn on Menu Mode for future events
-                # Mmenuline = 1  # start main menu with line 1 highlighted
-                # # Note: Menunow is just a reference to a menu and not the contents of the menu itself
-                # # This makes for easy, efficient checks for the current menu
-                # Menunow = main_menu  # set the current menu, for the record
-                # # Show the main menu, 1st line highlighted
-                # show_text_menu(main_menu, Mmenuline, button_menu2)
-            # --Check for button 4 --- Brush mode
-            elif event.button == 4:  # button 3 = GPIO 27
-                Brush = not Brush
+                    if Run:  # carry on with the new sound, as button 1 would
+                        Pending_play = True
+                        if sweep_prepare():  # otherwise sweep_done() starts it
+                            output_start()
+                    # Button 3 used to switch to Menu mode:
+                    # Menumode = True  # Turn on Menu Mode for future events
+                    # Mmenuline = 1  # start main menu with line 1 highlighted
+                    # # Note: Menunow is just a reference to a menu and not the contents of the menu itself
+                    # # This makes for easy, efficient checks for the current menu
+                    # Menunow = main_menu  # set the current menu, for the record
+                    # # Show the main menu, 1st line highlighted
+                    # show_text_menu(main_menu, Mmenuline, button_menu2)
+                # --Check for button 4 --- Brush mode
+                elif event.button == 4:  # button 3 = GPIO 27
+                    Brush = not Brush
+                    if Debugprt == True:
+                        print("Button 4 Brush ", Brush)
+                    set_brush()
+                    show_menu()  # show the Brush ON/OFF
+                    if Run and not Pending_play:  # restart in the new mode
+                        output_stop()
+                        output_start()
+            # --Handle touchscreen events in non-menu mode ------
+            # Switches display show type (graph or temp) if the screen is clicked/touched
+            #   because it frees up a GPIO button for other uses
+            elif event.type == pygame.MOUSEBUTTONDOWN:  # check for mouse click/touch
+                # -Cleanup for noisy MOUSEBUTTON events on PiTFT, which causes problems
+                # Note: Mouse position info for the touchscreen is currently useless on Stretch.
+                # SDL TSLIB support used to do this stuff
+                if event.button == 1:  # only watch for button 1 - touch screen filter #1
+                    mousetime = (
+                        pygame.time.get_ticks() / 1000
+                    )  # get the relative time in sec
+                    # Ignore too many MOUSEDOWN events together - touch screen filter #2
+                    if (
+                        mousetime - Mousetimer > Mousewait
+                    ):  # check if enough time has passed
+                        Mousetimer = mousetime  # if so, record this last touch/click
+                        show_flip()  # switch between temp and latest graph display
+                        if Debugprt == True:
+                            if Displayshow == Displaygraph:
+                                displayshow = "Graph"
+                            elif Displayshow == Displayspectro:
+                                displayshow = "Spectrogram"
+                            elif Displayshow == Displaystats:
+                                displayshow = "Statistics"
+                            else:
+                                displayshow = "Settings"
+                        print("Touch to flip display selected. Now", displayshow)
+            # --Time the handler and keep the soak run reports going
+            if soak is not None:
+                soak.handled(event.type, t_event)
+                soak.tick()
+
+        #############################################
+        # ----- Menu Mode Event handler
+        #############################################
+        while Menumode == True:  # loop forever, waiting for events in 'menu' mode
+            event = pygame.fastevent.wait()  # wait for an event object to check
+            # --Handle the time display update timer pop event 2 in menu mode
+            if event.type == pygame.USEREVENT + 2:  # using literal here for timer pop
+                Do_ttimer_updates()  # Update the LED & time/temp display values
+                log_passes()
+            # --Handle PiTFT button presses in menu mode driven by gpiobut GPIO callback function thread
+            elif (
+                event.type == USEREVENT + 3
+            ):  # check for a PiTFT button press, literal value
                 if Debugprt == True:
-                    print("Button 4 Brush ", Brush)
-                set_brush()
-                show_menu()  # show the Brush ON/OFF
-                if Brush and Run:
-                    sound.stop()
-                    sound.play(0)
-                if not Brush and Run:
-                    sound.stop()
-                    sound.play(-1)
-        # --Handle touchscreen events in non-menu mode ------
-        # Switches display show type (graph or temp) if the screen is clicked/touched
-        #   because it frees up a GPIO button for other uses
-        elif event.type == pygame.MOUSEBUTTONDOWN:  # check for mouse click/touch
-            # -Cleanup for noisy MOUSEBUTTON events on PiTFT, which causes problems
-            # Note: Mouse position info for the touchscreen is currently useless on Stretch.
-            # SDL TSLIB support used to do this stuff
-            if event.button == 1:  # only watch for button 1 - touch screen filter #1
-                mousetime = (
-                    pygame.time.get_ticks() / 1000
-                )  # get the relative time in sec
-                # Ignore too many MOUSEDOWN events together - touch screen filter #2
-                if (
-                    mousetime - Mousetimer > Mousewait
-                ):  # check if enough time has passed
-                    Mousetimer = mousetime  # if so, record this last touch/click
-                    show_flip()  # switch between temp and latest graph display
+                    print("menu button =", event.button)  # debug
+                # --Check for button 2 - Menu mode - Up
+                if event.button == 2:  # button 2 = GPIO 22
                     if Debugprt == True:
-                        if Displayshow == Displaygraph:
-                            displayshow = "Graph"
+                        print("Button 2 is Up")
+                    # -Handle Up on the main menu
+                    if Menunow == main_menu:  # Check if we're on the main menu
+                        if Mmenuline == 1:  # if we're at the top
+                            Mmenuline = Mmenumax  # roll to the bottom line
                         else:
-                            displayshow = "Settings"
-                    print("Touch to flip display selected. Now", displayshow)
-
-    #############################################
-    # ----- Menu Mode Event handler
-    #############################################
-    while Menumode == True:  # loop forever, waiting for events in 'menu' mode
-        event = pygame.fastevent.wait()  # wait for an event object to check
-        # --Handle the time display update timer pop event 2 in menu mode
-        if event.type == pygame.USEREVENT + 2:  # using literal here for timer pop
-            Do_ttimer_updates()  # Update the LED & time/temp display values
-        # --Handle PiTFT button presses in menu mode driven by gpiobut GPIO callback function thread
-        elif (
-            event.type == USEREVENT + 3
-        ):  # check for a PiTFT button press, literal value
-            if Debugprt == True:
-                print("menu button =", event.button)  # debug
-            # --Check for button 2 - Menu mode - Up
-            if event.button == 2:  # button 2 = GPIO 22
-                if Debugprt == True:
-                    print("Button 2 is Up")
-                # -Handle Up on the main menu
-                if Menunow == main_menu:  # Check if we're on the main menu
-                    if Mmenuline == 1:  # if we're at the top
-                        Mmenuline = Mmenumax  # roll to the bottom line
-                    else:
-                        Mmenuline = Mmenuline - 1  # otherwise, just go up a line
-                    # show the new highlighted menu line
-                    show_text_menu(main_menu, Mmenuline, button_menu2)
-                # -End of Up for the main menu
-
-                # -Handle Up in the Temperature Adjustment menu
-                # Note: the following is a reference comparison and not a content comparison
-                # i.e. Even if the contents of the tempadj_menu have changed it can be True
-                elif Menunow == tempadj_menu:  # check if we're in the temp adjust menu
-                    if Ttempadj < 10:  # upper limit is 10 for now
-                        # increment Temperature adjustment
-                        Ttempadj = round(Decimal(Ttempadj) + Decimal(0.1), 1)
-                    tempadj_menu[2][4] = str(Ttempadj)
-                    show_text_menu(tempadj_menu, 2, button_menu2)
-                # -Handle Up in the Time Adjustment menu
-                # chk if we're in the time adjust menu
-                elif Menunow == timeadj_menu and Ttimeval < len(Timevals) - 1:
-                    Ttimeval = Ttimeval + 1  # move to the next highest value
-                    # show current time adjustment
-                    timeadj_menu[2][4] = str(Timevals[Ttimeval])
-                    # show new menu                    Timeval = Timeval - 1 #go up one item if not at the start value
-                    show_text_menu(timeadj_menu, 2, button_menu2)
-            # --Check for button 3 --- Down - in menu mode
-            elif event.button == 3:  # Check for Down
-                if Debugprt == True:
-                    print("Button 3 is Down")
-                # -Handle Down on main menu
-                if Menunow == main_menu:  # Check if we're on the main menu
-                    if Mmenuline == Mmenumax:  # if we're at the bottom
-                        # roll to the top line (line 0 is the title)
-                        Mmenuline = 1
-                    else:
-                        Mmenuline = Mmenuline + 1  # Otherwise just go to the next line
-                    # show the new highlighted menu line
-                    show_text_menu(main_menu, Mmenuline, button_menu2)
-                # -Handle Down on the Temperature Adjustment menu - in decimal
-                elif Menunow == tempadj_menu:  # Check if we're on the temp adjust menu
-                    if Ttempadj > -10.0:  # lower limit is -10 for now
-                        # increment Temperature adjustment
-                        Ttempadj = round(Decimal(Ttempadj) - Decimal(0.1), 1)
-                    # show current temperature adjustment
-                    tempadj_menu[2][4] = str(Ttempadj)
-                    # show new menu
-                    show_text_menu(tempadj_menu, 2, button_menu2)
-                # -Handle Down in Time adjustment menu
-                elif (
-                    Menunow == timeadj_menu and Ttimeval > 0
-                ):  # chk if we're in the time adjust menu
-                    Ttimeval = (
-                        Ttimeval - 1
-                    )  # go down one item if not at the first value
-                    # show current time adjustment
-                    timeadj_menu[2][4] = str(Timevals[Ttimeval])
-                    # show updated menu
-                    show_text_menu(timeadj_menu, 2, button_menu2)
-            # --Check for button 4 --- Select, in menu mode
-            elif event.button == 4:
-                if Debugprt == True:
-                    print("Button 4 is Select")
-                # ---- Handle Select on the main menu
-                if Menunow == main_menu:  # check if we're on the main menu
-                    # -Handle 'Exit' selected from main menu  - always first, for debugging
-                    if Mmenuline == 4:  # check for line 4 select - Exit programme
-                        if Debugprt == True:
-                            print("Exit Selected")
-                        pygame.display.quit()  # clean up
-                        sys.exit()  # exit this programme
-                    # -Handle Temp Adjust selected from main menu menu
-                    elif Mmenuline == 1:  # Check for Temp Adj
-                        if Debugprt == True:
-                            print("Selected Temp Adj menu")
-                        Menunow = tempadj_menu  # update what menu we're in now
-                        Ttempadj = Tempadj  # Get the current adjustment for the menu
+                            Mmenuline = Mmenuline - 1  # otherwise, just go up a line
+                        # show the new highlighted menu line
+                        show_text_menu(main_menu, Mmenuline, button_menu2)
+                    # -End of Up for the main menu
+
+                    # -Handle Up in the Temperature Adjustment menu
+                    # Note: the following is a reference comparison and not a content comparison
+                    # i.e. Even if the contents of the tempadj_menu have changed it can be True
+                    elif Menunow == tempadj_menu:  # check if we're in the temp adjust menu
+                        if Ttempadj < 10:  # upper limit is 10 for now
+                            # increment Temperature adjustment
+                            Ttempadj = round(Decimal(Ttempadj) + Decimal(0.1), 1)
+                        tempadj_menu[2][4] = str(Ttempadj)
+                        show_text_menu(tempadj_menu, 2, button_menu2)
+                    # -Handle Up in the Time Adjustment menu
+                    # chk if we're in the time adjust menu
+                    elif Menunow == timeadj_menu and Ttimeval < len(Timevals) - 1:
+                        Ttimeval = Ttimeval + 1  # move to the next highest value
+                        # show current time adjustment
+                        timeadj_menu[2][4] = str(Timevals[Ttimeval])
+                        # show new menu                    Timeval = Timeval - 1 #go up one item if not at the start value
+                        show_text_menu(timeadj_menu, 2, button_menu2)
+                # --Check for button 3 --- Down - in menu mode
+                elif event.button == 3:  # Check for Down
+                    if Debugprt == True:
+                        print("Button 3 is Down")
+                    # -Handle Down on main menu
+                    if Menunow == main_menu:  # Check if we're on the main menu
+                        if Mmenuline == Mmenumax:  # if we're at the bottom
+                            # roll to the top line (line 0 is the title)
+                            Mmenuline = 1
+                        else:
+                            Mmenuline = Mmenuline + 1  # Otherwise just go to the next line
+                        # show the new highlighted menu line
+                        show_text_menu(main_menu, Mmenuline, button_menu2)
+                    # -Handle Down on the Temperature Adjustment menu - in decimal
+                    elif Menunow == tempadj_menu:  # Check if we're on the temp adjust menu
+                        if Ttempadj > -10.0:  # lower limit is -10 for now
+                            # increment Temperature adjustment
+                            Ttempadj = round(Decimal(Ttempadj) - Decimal(0.1), 1)
                         # show current temperature adjustment
                         tempadj_menu[2][4] = str(Ttempadj)
                         # show new menu
                         show_text_menu(tempadj_menu, 2, button_menu2)
-                    # -Handle Time Adjust selected from main menu
-                    elif Mmenuline == 2:  # Check for Time Adj
-                        if Debugprt == True:
-                            print("Selected Time Adj menu")
-                        Menunow = timeadj_menu  # update what menu we're in now
-                        Ttimeval = Timeval  # Set a temporary index for menu purposes
+                    # -Handle Down in Time adjustment menu
+                    elif (
+                        Menunow == timeadj_menu and Ttimeval > 0
+                    ):  # chk if we're in the time adjust menu
+                        Ttimeval = (
+                            Ttimeval - 1
+                        )  # go down one item if not at the first value
                         # show current time adjustment
                         timeadj_menu[2][4] = str(Timevals[Ttimeval])
-                        # show new menu
+                        # show updated menu
                         show_text_menu(timeadj_menu, 2, button_menu2)
-                    # -Handle 'Return' selected from main menu
-                    elif Mmenuline == 3:  # check for Return selected
-                        if Debugprt == True:
-                            print("Return Selected")
-                        # Show updated display now, as appropriate to the mode we were in before menu mode
-                        if (
-                            Displayshow == Displaytemp
-                        ):  # if we were showing the temperature
-                            show_menu()  # show current temperature
-                        # Show graph, if that's the mode we were in
-                        elif Displayshow == Displaygraph:  # show a graph, if required
-                            make_graph()
-                            show_graph()
-                        Menumode = False  # Turn off menu mode for now, as if 'Return' was selected
-                # ---- Handle Select in secondary menus
-                # -Handle Select in Temperature Adjustment menu
-                elif Menunow == tempadj_menu:  # check if we're on the temp adjust menu
-                    # Put the new adjustment value into effect
-                    Tempadj = float(Ttempadj)
-                    # Note: it might be good to also reset values, but there might be a need not to do this
-                    Menunow = main_menu  # Update current menu to main_menu
-                    show_text_menu(main_menu, Mmenuline, button_menu2)  # show it
-                    if Debugprt == True:
-                        print("Temp Adjust Value Selected =", Tempadj)
-                # -Handle Select in Time Adjustment menu
-                elif Menunow == timeadj_menu:  # check if we're in the time adj menu
-                    # set the new timer interval in msec
-                    Tinterval = Timevals[Ttimeval]
-                    # Define an updated pygame user event for the new recording timer value
-                    # create a timer event
-                    pygame.time.set_timer(USEREVENT + 1, Tinterval * 1000)
-                    Menunow = main_menu  # Update current menu to the main_menu
-                    show_text_menu(main_menu, Mmenuline, button_menu2)  # show it
+                # --Check for button 4 --- Select, in menu mode
+                elif event.button == 4:
                     if Debugprt == True:
-                        print("Time Adjust Selected =", Tinterval)
\ No newline at end of file
+                        print("Button 4 is Select")
+                    # ---- Handle Select on the main menu
+                    if Menunow == main_menu:  # check if we're on the main menu
+                        # -Handle 'Exit' selected from main menu  - always first, for debugging
+                        if Mmenuline == 4:  # check for line 4 select - Exit programme
+                            if Debugprt == True:
+                                print("Exit Selected")
+                            pygame.display.quit()  # clean up
+                            if emit_log is not None:
+                                emit_log.close()  # write out what is still queued
+                            sys.exit()  # exit this programme
+                        # -Handle Temp Adjust selected from main menu menu
+                        elif Mmenuline == 1:  # Check for Temp Adj
+                            if Debugprt == True:
+                                print("Selected Temp Adj menu")
+                            Menunow = tempadj_menu  # update what menu we're in now
+                            Ttempadj = Tempadj  # Get the current adjustment for the menu
+                            # show current temperature adjustment
+                            tempadj_menu[2][4] = str(Ttempadj)
+                            # show new menu
+                            show_text_menu(tempadj_menu, 2, button_menu2)
+                        # -Handle Time Adjust selected from main menu
+                        elif Mmenuline == 2:  # Check for Time Adj
+                            if Debugprt == True:
+                                print("Selected Time Adj menu")
+                            Menunow = timeadj_menu  # update what menu we're in now
+                            Ttimeval = Timeval  # Set a temporary index for menu purposes
+                            # show current time adjustment
+                            timeadj_menu[2][4] = str(Timevals[Ttimeval])
+                            # show new menu
+                            show_text_menu(timeadj_menu, 2, button_menu2)
+                        # -Handle 'Return' selected from main menu
+                        elif Mmenuline == 3:  # check for Return selected
+                            if Debugprt == True:
+                                print("Return Selected")
+                            # Show updated display now, as appropriate to the mode we were in before menu mode
+                            if (
+                                Displayshow == Displaytemp
+                            ):  # if we were showing the temperature
+                                show_menu()  # show current temperature
+                            # Show graph, if that's the mode we were in
+                            elif Displayshow == Displaygraph:  # show a graph, if required
+                                make_graph()
+                                show_graph()
+                            Menumode = False  # Turn off menu mode for now, as if 'Return' was selected
+                    # ---- Handle Select in secondary menus
+                    # -Handle Select in Temperature Adjustment menu
+                    elif Menunow == tempadj_menu:  # check if we're on the temp adjust menu
+                        # Put the new adjustment value into effect
+                        Tempadj = float(Ttempadj)
+                        # Note: it might be good to also reset values, but there might be a need not to do this
+                        Menunow = main_menu  # Update current menu to main_menu
+                        show_text_menu(main_menu, Mmenuline, button_menu2)  # show it
+                        if Debugprt == True:
+                            print("Temp Adjust Value Selected =", Tempadj)
+                    # -Handle Select in Time Adjustment menu
+                    elif Menunow == timeadj_menu:  # check if we're in the time adj menu
+                        # set the new timer interval in msec
+                        Tinterval = Timevals[Ttimeval]
+                        # Define an updated pygame user event for the new recording timer value
+                        # create a timer event
+                        pygame.time.set_timer(USEREVENT + 1, Tinterval * 1000)
+                        Menunow = main_menu  # Update current menu to the main_menu
+                        show_text_menu(main_menu, Mmenuline, button_menu2)  # show it
+                        if Debugprt == True:
+                            print("Time Adjust Selected =", Tinterval)
\ No newline at end of file
@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+import argparse
+
+import numpy as np
+
+from quantize import quantize_stereo
+from sweepcore import sweeps, sweep_key, sweep_batch, clamp_amplitude, SAMPLERATE, AMPLITUDE
+
+# ----- Precompiled sweep bank
+# Every sweep table entry is rendered offline, at each sample rate and
+# amplitude, into one file:
+#   header  (magic, version, count, data offset)
+#   index   count records, one per block, see INDEX
+#   data    int16 interleaved stereo blocks, each starting on a 64 byte boundary
+# The player np.memmap's the file and hands slices of it to the mixer, so
+# nothing is recomputed and only the pages actually played become resident.
+#
+#   python3 sweepbank.py -o sweeps.bank --rates 192000 384000 --amplitudes 17750
+#   python3 sweepbank.py --list sweeps.bank
+
+MAGIC = b"SWPBANK1"
+VERSION = 1
+ALIGN = 64
+
+HEADER = np.dtype(
+    [("magic", "S8"), ("version", "<u4"), ("count", "<u4"), ("data_offset", "<u8")]
+)
+INDEX = np.dtype(
+    [
+        ("fmin", "<f8"),
+        ("fmax", "<f8"),
+        ("duration", "<f8"),
+        ("samplerate", "<f8"),
+        ("amplitude", "<i4"),
+        ("kind", "S4"),
+        ("offset", "<u8"),  # byte offset of the block from the start of the file
+        ("frames", "<u8"),  # stereo frames in the block
+    ]
+)
+
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+# --Define a function to render sweep table entries into a bank file
+# Each sample rate is synthesized once for all entries (sweep_batch), then
+# quantized per amplitude into a scratch block that is written in place.
+def build_bank(path, entries=None, samplerates=(SAMPLERATE,), amplitudes=(AMPLITUDE,)):
+    entries = sweeps if entries is None else entries
+    jobs_by_key = [(i, rate, amp) for i in entries for rate in samplerates for amp in amplitudes]
+    jobs = [(entries[i], rate, amp) for i, rate, amp in jobs_by_key]
+    index = np.zeros(len(jobs), dtype=INDEX)
+    data_offset = _align(HEADER.itemsize + INDEX.itemsize * len(jobs))
+    offset = data_offset
+    for rec, (entry, rate, amp) in zip(index, jobs):
+        frames = int(rate * entry[2])
+        rec["fmin"], rec["fmax"], rec["duration"], rec["kind"] = (
+            entry[0], entry[1], entry[2], entry[3].encode())
+        rec["samplerate"] = rate
+        rec["amplitude"] = amp
+        rec["offset"] = offset
+        rec["frames"] = frames
+        offset = _align(offset + frames * 2 * 2)
+
+    header = np.zeros(1, dtype=HEADER)
+    header["magic"] = MAGIC
+    header["version"] = VERSION
+    header["count"] = len(jobs)
+    header["data_offset"] = data_offset
+    scratch = np.empty((int(index["frames"].max(initial=0)), 2), dtype="<i2")
+    keys = list(entries)
+    with open(path, "wb") as f:
+        f.write(header.tobytes())
+        f.write(index.tobytes())
+        for rate in samplerates:
+            waves = dict(zip(keys, sweep_batch([entries[i] for i in keys], rate)))
+            for rec, (i, r, amp) in zip(index, jobs_by_key):
+                if r != rate:
+                    continue
+                block = scratch[: int(rec["frames"])]
+                quantize_stereo(waves[i], clamp_amplitude(amp), out=block, invert=True)
+                f.seek(int(rec["offset"]))
+                f.write(memoryview(block))
+        f.truncate(offset)
+    return len(jobs)
+
+
+class SweepBank:
+    def __init__(self, path):
+        self.path = path
+        self.mm = np.memmap(path, dtype=np.uint8, mode="r")
+        header = self.mm[: HEADER.itemsize].view(HEADER)[0]
+        if header["magic"] != MAGIC or header["version"] != VERSION:
+            raise ValueError(path + " is not a version %d sweep bank" % VERSION)
+        count = int(header["count"])
+        self.index = self.mm[HEADER.itemsize : HEADER.itemsize + count * INDEX.itemsize].view(INDEX)
+        self._lookup = {}
+        for i, rec in enumerate(self.index):
+            entry = [rec["fmin"], rec["fmax"], rec["duration"], rec["kind"].decode()]
+            key = sweep_key(entry, float(rec["samplerate"]), int(rec["amplitude"]))
+            self._lookup[key] = i
+
+    def __len__(self):
+        return len(self.index)
+
+    # --Return block i as a read-only (frames, 2) int16 view into the file
+    def block(self, i):
+        rec = self.index[i]
+        start = int(rec["offset"])
+        frames = int(rec["frames"])
+        return self.mm[start : start + frames * 4].view("<i2").reshape(frames, 2)
+
+    # --Return the block for a sweep table entry, or None if it is not in the bank
+    def get(self, entry, samplerate, amplitude):
+        i = self._lookup.get(sweep_key(entry, samplerate, amplitude))
+        return None if i is None else self.block(i)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the sweep table into a bank file")
+    parser.add_argument("-o", "--output", default="sweeps.bank", help="bank file to write")
+    parser.add_argument("--rates", type=float, nargs="+", default=[SAMPLERATE])
+    parser.add_argument("--amplitudes", type=int, nargs="+", default=[AMPLITUDE])
+    parser.add_argument("--list", metavar="BANK", help="print the index of a bank file")
+    args = parser.parse_args()
+    if args.list:
+        bank = SweepBank(args.list)
+        for i, rec in enumerate(bank.index):
+            print(
+                "%3d %8.1f %8.1f %7.4f s %-3s %8d Hz amp %5d  %8d frames @ %d"
+                % (i, rec["fmin"], rec["fmax"], rec["duration"], rec["kind"].decode(),
+                   rec["samplerate"], rec["amplitude"], rec["frames"], rec["offset"])
+            )
+        return
+    n = build_bank(args.output, samplerates=args.rates, amplitudes=args.amplitudes)
+    print("wrote %d sweeps to %s" % (n, args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import numpy as np
+
+from chirpgen import chirp, chirp_batch
+from quantize import quantize_stereo
+
+# ----- Sweep generation core, with no display, audio or GPIO dependencies
+# sweep_gen.py (the PiTFT application) and the offline tools build on this.
+
+SAMPLERATE = 192000.0  # default output sample rate
+# SAMPLERATE = 384000.0
+AMPLITUDE = 17750  # default peak amplitude in int16 counts, 18550 - 3.3V P2P
+AMPLITUDE_MAX = 32767
+DELAY_STEPS = 64  # start delays are snapped to 1/64 sample (81 ns at 192 kHz)
+
+# {sweep: [fmin Hz, fmax Hz, duration s, type]}
+# type is "lin", "log" (exponential) or "hyp" (hyperbolic), see chirpgen.py
+sweeps = {
+    0: [18000, 34000, 0.004, "lin"],
+    1: [7000, 17000, 0.004, "lin"],
+    2: [12000, 24000, 0.004, "lin"],
+    3: [4000, 10000, 0.004, "lin"],
+    4: [48000, 78000, 0.004, "log"],
+}
+
+
+# --Define a function to keep an amplitude within the int16 output range
+def clamp_amplitude(amplitude):
+    return max(0, min(AMPLITUDE_MAX, int(amplitude)))
+
+
+# --Define a function to snap a start delay in samples to the DELAY_STEPS grid
+# so nearly equal delays share one cached sweep
+def snap_delay(delay):
+    return round(delay * DELAY_STEPS) / DELAY_STEPS
+
+
+# --Define a function to give the key identifying a rendered sweep
+# eq is an equalize.Calibration or None and delay a start delay in samples;
+# flat, undelayed sweeps keep their old keys
+def sweep_key(entry, samplerate, amplitude, dither=False, taper=0.0, eq=None, delay=0.0):
+    fmin, fmax, T, kind = entry
+    key = (fmin, fmax, T, samplerate, amplitude, kind, "zero_phase_tmin", dither, taper)
+    if eq is not None:
+        key += eq.key()
+    if delay:
+        key += ("delay", round(delay * DELAY_STEPS))
+    return key
+
+
+# --Define a function to render a sweep table entry for differential output
+# Returns the sample times (s) and an (N, 2) int16 array: the sweep on the
+# left channel and its inverse on the right. dither adds TPDF dither and taper
+# is the Tukey edge fraction, see quantize.py. eq (an equalize.Calibration)
+# corrects the level per frequency, by gain envelope or FIR. delay starts the
+# sweep that many samples (snapped to 1/DELAY_STEPS) later, analytically; the
+# output is then N + ceil(delay) frames long.
+def sweep_wave(entry, samplerate, amplitude, dither=False, taper=0.0, out=None, eq=None, delay=0.0):
+    fmin, fmax, T, kind = entry
+    N = int(samplerate * T)
+    delay = snap_delay(delay)
+    chirp_x = np.arange(0, N + int(np.ceil(delay))) / samplerate
+    tmin = 0
+    tmax = T
+    w0 = chirp(N, tmin=tmin, tmax=tmax, fmin=fmin, fmax=fmax, kind=kind, zero_phase_tmin=True, cos=False,
+               delay=delay)
+    gain = None
+    if eq is not None and eq.method == "fir":
+        w0 = eq.filter(w0, samplerate)
+    elif eq is not None:
+        gain = eq.envelope(entry, samplerate, delay)
+    chirp_y = quantize_stereo(
+        w0, clamp_amplitude(amplitude), out=out, invert=True, dither=dither, taper=taper, gain=gain
+    )
+    return chirp_x, chirp_y
+
+
+# --Define a function to synthesize many sweep table entries at one sample rate
+# One chirp_batch call per sweep type instead of a chirp call per entry.
+# Returns the float32 waveforms (views of the batch rows) in entry order,
+# ready for quantize_stereo at any amplitude; each is bit-identical to the
+# waveform sweep_wave would make.
+def sweep_batch(entries, samplerate):
+    waves = [None] * len(entries)
+    for kind in sorted(set(entry[3] for entry in entries)):
+        rows = [i for i, entry in enumerate(entries) if entry[3] == kind]
+        views = chirp_batch(
+            [int(samplerate * entries[i][2]) for i in rows], tmin=0,
+            tmax=[entries[i][2] for i in rows], fmin=[entries[i][0] for i in rows],
+            fmax=[entries[i][1] for i in rows], kind=kind, zero_phase_tmin=True, cos=False,
+            ragged=True,
+        )
+        for i, w in zip(rows, views):
+            waves[i] = w
+    return waves
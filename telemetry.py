@@ -0,0 +1,97 @@
+import time
+
+import numpy as np
+
+# ----- Button-to-audio latency telemetry
+# Each traced action (e.g. button 1 turning output on) records a monotonic
+# nanosecond timestamp at every stage it passes through. Traces are kept in a
+# fixed-size ring, so memory stays constant however long the unit runs; the
+# intervals between stages are summarized as percentiles and histograms.
+
+STAGES = ("gpio", "dequeue", "gen_start", "gen_end", "sound", "play")
+INTERVALS = (
+    ("gpio", "dequeue"),  # GPIO thread to the event loop
+    ("dequeue", "gen_start"),  # event handling before generation
+    ("gen_start", "gen_end"),  # synthesis (or cache/bank lookup)
+    ("gen_end", "sound"),  # Sound object creation
+    ("sound", "play"),  # up to the play call
+    ("gpio", "play"),  # the whole path
+)
+
+
+class LatencyTrace:
+    def __init__(self, size=256):
+        self.stamps = np.zeros((size, len(STAGES)), dtype=np.int64)  # 0 = not reached
+        self.size = size
+        self.next = 0  # ring row the next trace goes in
+        self.count = 0  # completed traces, up to size
+        self.current = None  # row of the trace in progress
+
+    # --Start a trace; stamps taken before the event loop can be passed in
+    def begin(self, t_gpio=None, t_dequeue=None):
+        row = self.next
+        self.stamps[row] = 0
+        now = time.monotonic_ns()
+        self.stamps[row, 0] = t_gpio if t_gpio is not None else now
+        self.stamps[row, 1] = t_dequeue if t_dequeue is not None else now
+        self.current = row
+
+    # --Stamp a stage of the trace in progress (ignored if there is none)
+    def mark(self, stage):
+        if self.current is not None:
+            self.stamps[self.current, STAGES.index(stage)] = time.monotonic_ns()
+
+    # --Finish the trace in progress; stages not reached copy the one before
+    def end(self):
+        if self.current is None:
+            return
+        row = self.stamps[self.current]
+        for i in range(1, len(STAGES)):
+            if row[i] == 0:
+                row[i] = row[i - 1]
+        self.current = None
+        self.next = (self.next + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    # --Drop the trace in progress (the action did not play anything)
+    def cancel(self):
+        self.current = None
+
+    # --Return the completed traces, oldest first
+    def traces(self):
+        if self.count < self.size:
+            return self.stamps[: self.count]
+        return np.roll(self.stamps, -self.next, axis=0)
+
+    # --Return latencies in ms for an interval (a pair of stage names)
+    def latencies(self, interval):
+        a, b = (STAGES.index(s) for s in interval)
+        t = self.traces()
+        return (t[:, b] - t[:, a]) / 1e6
+
+    # --Return {interval: (median, p95, max)} in ms
+    def summary(self):
+        result = {}
+        for interval in INTERVALS:
+            ms = self.latencies(interval)
+            if len(ms):
+                result[interval] = (
+                    float(np.median(ms)),
+                    float(np.percentile(ms, 95)),
+                    float(ms.max()),
+                )
+        return result
+
+    # --Return (counts, bin edges in ms) of an interval
+    def histogram(self, interval=("gpio", "play"), bins=8):
+        ms = self.latencies(interval)
+        if not len(ms):
+            return np.zeros(bins, dtype=int), np.zeros(bins + 1)
+        return np.histogram(ms, bins=bins)
+
+    # --Write the completed traces as CSV, nanoseconds per stage
+    def dump(self, path):
+        with open(path, "w") as f:
+            f.write(",".join(STAGES) + "\n")
+            for row in self.traces():
+                f.write(",".join(str(int(v)) for v in row) + "\n")
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+# ----- Bounded LRU cache for ready-to-play waveforms
+# Each entry is keyed by the sweep parameters that produced it, e.g.
+# (fmin, fmax, duration, samplerate, amplitude, phase mode), and holds
+# whatever the caller wants to keep (Sound object, int16 array, ...).
+# The memory budget is in bytes; the size of an entry is given by the caller
+# (normally the nbytes of its sample array).
+
+
+class WaveCache:
+    def __init__(self, budget=32 * 1024 * 1024):
+        self.budget = budget  # memory budget in bytes
+        self.used = 0  # bytes currently held
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, nbytes), oldest first
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    # --Look up a key, counting a hit or a miss; a hit becomes most recently used
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    # --Store a value, then evict least recently used entries until within budget
+    # An entry larger than the whole budget is not kept at all
+    def put(self, key, value, nbytes):
+        if key in self._entries:
+            self.used -= self._entries.pop(key)[1]
+        if nbytes > self.budget:
+            return value
+        self._entries[key] = (value, nbytes)
+        self.used += nbytes
+        while self.used > self.budget:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.used -= size
+            self.evictions += 1
+        return value
+
+    # --Change the memory budget, evicting as needed
+    def resize(self, budget):
+        self.budget = budget
+        while self.used > self.budget and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.used -= size
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.used = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "used": self.used,
+            "budget": self.budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
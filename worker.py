@@ -0,0 +1,59 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ----- Background jobs for the event loop
+# Sweep synthesis and graph rendering run on a worker thread (NumPy and Agg
+# release the GIL for most of their work) and hand their result back through
+# post(), normally fastevent.post of a pygame event, so the event loop never
+# waits on them. Jobs are grouped by kind ("sweep", "graph", ...): submitting a
+# job cancels the queued jobs of the same kind that have not started yet.
+# A job that is already running cannot be interrupted; its result is still
+# posted and the receiver decides whether it is still wanted. A job counts as
+# pending until the receiver collects it, so a result already posted but not
+# yet handled is not asked for a second time.
+
+
+class JobWorker:
+    def __init__(self, post, workers=1):
+        self.post = post  # post(kind, key, result, error), called on the worker thread
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="synth")
+        self.lock = threading.Lock()
+        self.jobs = {}  # kind -> {key: Future} of jobs not yet collected
+        self.cancelled = 0
+
+    # --Queue fn(*args) as job key of a kind, unless that job is already pending
+    def submit(self, kind, key, fn, *args):
+        with self.lock:
+            pending = self.jobs.setdefault(kind, {})
+            for other, future in list(pending.items()):
+                if other == key:
+                    continue
+                if future.cancel():  # stale: a newer request of this kind came in
+                    del pending[other]
+                    self.cancelled += 1
+            if key in pending:
+                return pending[key]
+            future = self.pool.submit(self._run, kind, key, fn, args)
+            pending[key] = future
+            return future
+
+    # --Return True if a job is queued, running or posted but not collected
+    def pending(self, kind, key):
+        with self.lock:
+            return key in self.jobs.get(kind, {})
+
+    # --Forget a job once its posted result has been handled
+    def collect(self, kind, key):
+        with self.lock:
+            self.jobs.get(kind, {}).pop(key, None)
+
+    def _run(self, kind, key, fn, args):
+        result = error = None
+        try:
+            result = fn(*args)
+        except Exception as e:  # reported to the event loop, not lost in the thread
+            error = e
+        self.post(kind, key, result, error)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)